@@ -1,8 +1,78 @@
 # frontend.py -- Streamlit UI for demo chatbot
+import json
 import streamlit as st
 import requests
 
 API_URL = "http://127.0.0.1:8000"  # backend FastAPI
+PAGE_SIZE = 50
+
+@st.cache_resource
+def http() -> requests.Session:
+    """One pooled keep-alive session for every backend call, shared across reruns."""
+    session = requests.Session()
+    adapter = requests.adapters.HTTPAdapter(pool_connections=2, pool_maxsize=16)
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    return session
+
+def sync_history():
+    """
+    Bring st.session_state.chat_history up to date without re-downloading it: the first
+    load fetches the newest page, later reruns ask only for entries after the last id
+    seen, with If-None-Match so an unchanged history costs a bodiless 304.
+    """
+    ss = st.session_state
+    url = f"{API_URL}/memory/{ss.email}"
+    if ss.last_id is None:
+        r = http().get(url, params={"limit": PAGE_SIZE}, timeout=5)
+        r.raise_for_status()
+        body = r.json()
+        ss.chat_history = body["visible_memory"]
+        ss.last_id = body["newest_id"]
+        ss.older_cursor = body["next_before"]
+        return
+    while True:
+        headers = {"If-None-Match": ss.memory_etag} if ss.memory_etag else {}
+        r = http().get(url, params={"after": ss.last_id, "limit": PAGE_SIZE}, headers=headers, timeout=5)
+        if r.status_code == 304:
+            return
+        r.raise_for_status()
+        body = r.json()
+        ss.chat_history.extend(body["visible_memory"])
+        ss.memory_etag = r.headers.get("ETag")
+        if not body["visible_memory"]:
+            return
+        ss.last_id = body["visible_memory"][-1]["id"]
+        if body["newest_id"] <= ss.last_id:
+            return
+
+def load_older():
+    ss = st.session_state
+    r = http().get(f"{API_URL}/memory/{ss.email}", params={"before": ss.older_cursor, "limit": PAGE_SIZE}, timeout=5)
+    r.raise_for_status()
+    body = r.json()
+    ss.chat_history = body["visible_memory"] + ss.chat_history
+    ss.older_cursor = body["next_before"]
+
+def stream_reply(payload: dict, placeholder) -> dict:
+    """POST to /chat/stream and render the reply into `placeholder` as tokens arrive.
+    Returns the `done` event (reply plus its memory id), or just the reply if it was cut off."""
+    parts, event, done = [], None, None
+    with http().post(f"{API_URL}/chat/stream", json=payload, stream=True, timeout=(5, 120)) as r:
+        r.raise_for_status()
+        for line in r.iter_lines(decode_unicode=True):
+            if line.startswith("event:"):
+                event = line[6:].strip()
+            elif line.startswith("data:"):
+                data = json.loads(line[5:])
+                if event == "token":
+                    parts.append(data["t"])
+                    placeholder.markdown("".join(parts) + "▌")
+                elif event == "done":
+                    done = data
+    done = done or {"reply": "".join(parts)}
+    placeholder.markdown(done["reply"])
+    return done
 
 st.set_page_config(page_title="Virtual Friend", page_icon="🤖", layout="centered")
 
@@ -12,6 +82,9 @@ if "name" not in st.session_state:
     st.session_state.name = None
 if "chat_history" not in st.session_state:
     st.session_state.chat_history = []
+    st.session_state.last_id = None       # id of the newest entry we hold
+    st.session_state.older_cursor = None  # `before` cursor for the previous page, if any
+    st.session_state.memory_etag = None
 
 st.title("🤖 Virtual Friend")
 
@@ -34,14 +107,18 @@ if not st.session_state.email:
 # Step 2: Chat UI
 else:
     st.subheader(f"Chatting as {st.session_state.name}")
-    # load history from backend
+    # sync history from backend (only what is new since the last rerun)
     try:
-        resp = requests.get(f"{API_URL}/memory/{st.session_state.email}")
-        if resp.status_code == 200:
-            st.session_state.chat_history = resp.json().get("visible_memory", [])
+        sync_history()
     except Exception as e:
         st.error("Backend not running. Start FastAPI first.")
-    
+
+    if st.session_state.older_cursor and st.button("Load earlier messages"):
+        try:
+            load_older()
+        except Exception as e:
+            st.error("Could not load earlier messages.")
+
     # display chat history
     for entry in st.session_state.chat_history:
         with st.chat_message("user"):
@@ -56,17 +133,25 @@ else:
             "name": st.session_state.name,
             "text": prompt
         }
+        with st.chat_message("user"):
+            st.write(prompt)
         try:
-            r = requests.post(f"{API_URL}/chat", json=payload)
-            if r.status_code == 200:
-                reply = r.json()["reply"]
-                # add to local history for instant feedback
+            # stream the reply token by token (Server-Sent Events from /chat/stream)
+            with st.chat_message("assistant"):
+                placeholder = st.empty()
+                done = stream_reply(payload, placeholder)
+            # add to local history for instant feedback; if it isn't the next entry
+            # (e.g. another tab also chatted) the next sync fetches everything in order
+            if done.get("id") == (st.session_state.last_id or 0) + 1:
                 st.session_state.chat_history.append({
+                    "id": done["id"],
                     "text": prompt,
-                    "reply": reply
+                    "reply": done["reply"],
+                    "ts": done.get("ts")
                 })
-                st.experimental_rerun()
-            else:
-                st.error("Failed to send message")
+                st.session_state.last_id = done["id"]
+            st.experimental_rerun()
+        except requests.HTTPError:
+            st.error("Failed to send message")
         except Exception as e:
             st.error("Backend not reachable. Make sure FastAPI is running.")
@@ -0,0 +1,414 @@
+# backend/archive.py
+"""
+Tiered retention for chat history.
+
+Messages older than ARCHIVE_AFTER_DAYS move out of the hot chat_messages table into
+compressed, append-only segment files, so the table (and its indexes) stays small
+enough to live in the page cache:
+
+    python -m backend.archive run --older-than-days 90 [--vacuum]
+    python -m backend.archive read --user 42 --start 2026-01-01
+    python -m backend.archive stats
+
+Layout, partitioned by the message's UTC day:
+
+    ARCHIVE_DIR/2026-03-14/seg-<ms>-<n>.seg   one compressed block per student
+    ARCHIVE_DIR/2026-03-14/seg-<ms>-<n>.idx   JSON index: codec, blocks sorted by user_id
+                                              [user_id, offset, length, count, min_ts, max_ts]
+
+Each block is an independently compressed JSONL run of one student's messages in
+(ts, id) order (gzip, or zstd with ARCHIVE_CODEC=zstd and the zstandard package).
+Segments are never modified; every archive run adds new ones. Readers memory-map a
+segment and decompress only the blocks they need: a student's history is a binary
+search in each index of the days asked for, and a bulk scan (rescore.py --source
+archive) streams block by block.
+
+Crash safety: a run writes a segment with its index as "<name>.idx.pending", deletes
+the archived rows in one transaction, and then renames the index into place. A
+leftover pending index is resolved on the next run: if its messages are still in
+the table, the segment is discarded; otherwise it is committed.
+
+Messages whose scoring job is still pending or running stay in the table until the
+job finishes; finished jobs are deleted with their message. RiskScore rows are kept:
+their message_id refers to the archived message (or becomes NULL where the
+foreign key's ON DELETE SET NULL is enforced).
+"""
+import argparse
+import bisect
+import heapq
+import json
+import mmap
+import os
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime, timedelta
+from typing import Iterator, List, Optional
+
+from sqlalchemy import func, select
+
+from . import db
+from .models import ChatMessage, ScoringJob
+
+ARCHIVE_DIR = os.environ.get("ARCHIVE_DIR", "./chat_archive")
+AFTER_DAYS = float(os.environ.get("ARCHIVE_AFTER_DAYS", "90"))
+CODEC = os.environ.get("ARCHIVE_CODEC", "gzip")  # gzip | zstd
+BATCH = int(os.environ.get("ARCHIVE_BATCH", "20000"))
+MAX_OPEN = int(os.environ.get("ARCHIVE_MAX_OPEN_SEGMENTS", "64"))  # mapped segments kept per reader
+
+SEG_EXT, IDX_EXT, PENDING_EXT = ".seg", ".idx", ".idx.pending"
+
+
+def _codec(name: str):
+    """(compress, decompress) for a codec name."""
+    if name == "gzip":
+        import gzip
+        return (lambda b: gzip.compress(b, compresslevel=6)), gzip.decompress
+    if name == "zstd":
+        import zstandard
+        return zstandard.ZstdCompressor(level=10).compress, zstandard.ZstdDecompressor().decompress
+    raise ValueError(f"unknown archive codec {name!r}")
+
+
+def _ts(value: datetime) -> str:
+    # fixed width, so ISO strings order like the datetimes
+    return value.isoformat(timespec="microseconds")
+
+
+def _fsync_write(path: str, data: bytes):
+    with open(path, "wb") as f:
+        f.write(data)
+        f.flush()
+        os.fsync(f.fileno())
+
+
+# --- writing ---
+
+def write_segment(day_dir: str, records: List[dict], codec: str = CODEC) -> str:
+    """Write one segment (+ pending index) for records of a single day; returns the pending index path."""
+    compress, _ = _codec(codec)
+    os.makedirs(day_dir, exist_ok=True)
+    records = sorted(records, key=lambda r: (r["user_id"], r["ts"], r["id"]))
+    blob, blocks, i = bytearray(), [], 0
+    while i < len(records):
+        j = i
+        while j < len(records) and records[j]["user_id"] == records[i]["user_id"]:
+            j += 1
+        run = records[i:j]
+        data = compress("".join(json.dumps(r, ensure_ascii=False) + "\n" for r in run).encode())
+        blocks.append([run[0]["user_id"], len(blob), len(data), len(run), run[0]["ts"], run[-1]["ts"]])
+        blob += data
+        i = j
+    base = os.path.join(day_dir, f"seg-{int(time.time() * 1000)}-{os.getpid()}-{len(os.listdir(day_dir))}")
+    _fsync_write(base + SEG_EXT, bytes(blob))
+    index = {"codec": codec, "count": len(records), "bytes": len(blob), "blocks": blocks,
+             "min_ts": min(r["ts"] for r in records), "max_ts": max(r["ts"] for r in records)}
+    _fsync_write(base + PENDING_EXT, json.dumps(index).encode())
+    return base + PENDING_EXT
+
+
+def _commit(pending: str):
+    os.replace(pending, pending[:-len(PENDING_EXT)] + IDX_EXT)
+
+
+def _discard(pending: str):
+    base = pending[:-len(PENDING_EXT)]
+    for path in (base + SEG_EXT, pending):
+        if os.path.exists(path):
+            os.unlink(path)
+
+
+def _pending_indexes(root: str) -> List[str]:
+    if not os.path.isdir(root):
+        return []
+    return [os.path.join(root, day, name) for day in sorted(os.listdir(root))
+            if os.path.isdir(os.path.join(root, day))
+            for name in sorted(os.listdir(os.path.join(root, day))) if name.endswith(PENDING_EXT)]
+
+
+def recover(conn, root: str = ARCHIVE_DIR) -> int:
+    """Resolve segments left pending by an interrupted run; returns how many were committed."""
+    t = ChatMessage.__table__
+    committed = 0
+    for pending in _pending_indexes(root):
+        seg = Segment(pending[:-len(PENDING_EXT)], index_path=pending)
+        ids = [r["id"] for r in seg.scan()]
+        seg.close()
+        still_hot = any(conn.execute(select(t.c.id).where(t.c.id.in_(ids[k:k + 500])).limit(1)).first()
+                        for k in range(0, len(ids), 500))
+        if still_hot:
+            _discard(pending)  # the delete never committed: the rows are still the source of truth
+        else:
+            _commit(pending)
+            committed += 1
+    return committed
+
+
+def archive(older_than_days: float = AFTER_DAYS, root: str = ARCHIVE_DIR, batch: int = BATCH,
+            codec: str = CODEC, vacuum: bool = False) -> dict:
+    """Move messages older than the cutoff from chat_messages into segment files."""
+    t, jobs = ChatMessage.__table__, ScoringJob.__table__
+    cutoff = datetime.utcnow() - timedelta(days=older_than_days)
+    stats = {"cutoff": _ts(cutoff), "archived": 0, "skipped_pending": 0, "segments": 0, "recovered": 0}
+    started = time.perf_counter()
+    with db.engine.connect() as conn:
+        stats["recovered"] = recover(conn, root)
+        # SQLite hands out max(rowid) + 1: the newest row always stays, so archived ids are never reused
+        keep_id = conn.execute(select(func.max(t.c.id))).scalar()
+    last_id = 0
+    while True:
+        # id order is (close to) time order, so the walk stops at the first newer message
+        with db.engine.connect() as conn:
+            rows = conn.execute(select(t.c.id, t.c.user_id, t.c.role, t.c.text, t.c.timestamp)
+                                .where(t.c.id > last_id).order_by(t.c.id).limit(batch)).all()
+            if not rows:
+                break
+            last_id = rows[-1].id
+            old = [r for r in rows if r.timestamp is not None and r.timestamp < cutoff and r.id != keep_id]
+            reached_cutoff = len(old) < len(rows)
+            old_ids = [r.id for r in old]
+            busy = set()
+            for k in range(0, len(old_ids), 500):
+                busy.update(conn.execute(select(jobs.c.message_id).where(
+                    jobs.c.message_id.in_(old_ids[k:k + 500]), jobs.c.status.in_(("pending", "running")))).scalars())
+        stats["skipped_pending"] += len(busy)
+        old = [r for r in old if r.id not in busy]
+        if old:
+            by_day = {}
+            for r in old:
+                rec = {"id": r.id, "user_id": r.user_id, "role": r.role, "text": r.text, "ts": _ts(r.timestamp)}
+                by_day.setdefault(rec["ts"][:10], []).append(rec)
+            pending = [write_segment(os.path.join(root, day), recs, codec) for day, recs in sorted(by_day.items())]
+            ids = [r.id for r in old]
+            with db.sync_writer(), db.engine.begin() as conn:
+                for k in range(0, len(ids), 500):
+                    part = ids[k:k + 500]
+                    conn.execute(jobs.delete().where(jobs.c.message_id.in_(part)))
+                    conn.execute(t.delete().where(t.c.id.in_(part)))
+            for p in pending:
+                _commit(p)
+            stats["archived"] += len(old)
+            stats["segments"] += len(pending)
+            print(f"  archived {stats['archived']} messages (last id {last_id}) into {stats['segments']} segments")
+        if reached_cutoff:
+            break
+    if vacuum and db.IS_SQLITE:
+        with db.sync_writer(), db.engine.connect() as conn:
+            conn.exec_driver_sql("VACUUM")  # give the freed pages back so the file shrinks
+    stats["seconds"] = round(time.perf_counter() - started, 2)
+    return stats
+
+
+# --- reading ---
+
+def _end_bound(end: Optional[str]) -> Optional[str]:
+    # a bare date as the end of a range means the whole day
+    return end + "T23:59:59.999999" if end is not None and len(end) == 10 else end
+
+
+def _segment_order(day: str, name: str):
+    # creation order: seg-<ms>-<pid>-<n>. A later archive run sorts after every existing
+    # segment, even when it writes into an older day directory.
+    parts = name.split("-")
+    ms = int(parts[1]) if len(parts) > 1 and parts[1].isdigit() else 0
+    return ms, day, name
+
+
+class _OpenSegments:
+    """LRU of mapped segments; the least recently read is unmapped past `max_open`."""
+
+    def __init__(self, max_open: int = MAX_OPEN):
+        self.max_open = max_open
+        self._lock = threading.Lock()
+        self._open = OrderedDict()  # base -> Segment
+
+    def touch(self, seg: "Segment"):
+        with self._lock:
+            self._open[seg.base] = seg
+            self._open.move_to_end(seg.base)
+            evicted = [self._open.popitem(last=False)[1] for _ in range(len(self._open) - self.max_open)]
+        for old in evicted:
+            old.close()
+
+    def discard(self, seg: "Segment"):
+        with self._lock:
+            self._open.pop(seg.base, None)
+
+
+class Segment:
+    def __init__(self, base: str, index_path: str = None, lru: _OpenSegments = None):
+        self.base = base
+        self.day = os.path.basename(os.path.dirname(base))
+        self.name = os.path.basename(base)
+        self.id = f"{self.day}/{self.name}"
+        self.order = _segment_order(self.day, self.name)
+        with open(index_path or base + IDX_EXT) as f:
+            self.index = json.load(f)
+        self.blocks = self.index["blocks"]
+        self._user_ids = [b[0] for b in self.blocks]
+        self._decompress = _codec(self.index["codec"])[1]
+        self._lru = lru
+        self._lock = threading.Lock()  # mapping, slicing and closing: threadpool requests share segments
+        self._file = None
+        self._mm = None
+
+    def _read(self, offset: int, length: int) -> bytes:
+        with self._lock:
+            if self._mm is None:
+                self._file = open(self.base + SEG_EXT, "rb")
+                self._mm = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+            data = self._mm[offset:offset + length]  # a copy: safe after an eviction unmaps
+        if self._lru is not None:
+            self._lru.touch(self)  # outside our lock: evicting takes other segments' locks
+        return data
+
+    def read_block(self, block) -> Iterator[dict]:
+        _, offset, length = block[:3]
+        for line in self._decompress(self._read(offset, length)).splitlines():
+            yield json.loads(line)
+
+    def user_block(self, user_id: int):
+        i = bisect.bisect_left(self._user_ids, user_id)
+        return self.blocks[i] if i < len(self.blocks) and self.blocks[i][0] == user_id else None
+
+    def scan(self) -> Iterator[dict]:
+        for block in self.blocks:
+            yield from self.read_block(block)
+
+    def close(self):
+        with self._lock:
+            if self._mm is not None:
+                self._mm.close()
+                self._file.close()
+                self._mm = self._file = None
+
+
+class ArchiveReader:
+    """
+    Streaming, memory-mapped reads over the committed segments under `root`. Thread-safe;
+    at most `max_open` segments stay mapped (least recently read are closed first).
+    """
+
+    def __init__(self, root: str = ARCHIVE_DIR, max_open: int = MAX_OPEN):
+        self.root = root
+        self._lock = threading.Lock()
+        self._segments = {}  # base path -> Segment (indexes are immutable once committed)
+        self._open = _OpenSegments(max_open)
+
+    def days(self, start: Optional[str] = None, end: Optional[str] = None) -> List[str]:
+        if not os.path.isdir(self.root):
+            return []
+        return [d for d in sorted(os.listdir(self.root))
+                if os.path.isdir(os.path.join(self.root, d))
+                and (start is None or d >= start[:10]) and (end is None or d <= end[:10])]
+
+    def segments(self, day: str) -> List[Segment]:
+        day_dir = os.path.join(self.root, day)
+        out = []
+        for name in sorted(os.listdir(day_dir)):
+            if name.endswith(IDX_EXT):
+                base = os.path.join(day_dir, name[:-len(IDX_EXT)])
+                with self._lock:
+                    seg = self._segments.get(base)
+                    if seg is None:
+                        seg = self._segments[base] = Segment(base, lru=self._open)
+                out.append(seg)
+        return out
+
+    def read_user(self, user_id: int, start: Optional[str] = None, end: Optional[str] = None) -> Iterator[dict]:
+        """One student's archived messages in time order, within [start, end] (ISO strings)."""
+        end = _end_bound(end)
+        for day in self.days(start, end):
+            runs = []
+            for seg in self.segments(day):
+                block = seg.user_block(user_id)
+                if block is None or (start and block[5] < start) or (end and block[4] > end):
+                    continue
+                runs.append(seg.read_block(block))
+            # a day can hold several segments (one per archive run); each block is sorted
+            for rec in heapq.merge(*runs, key=lambda r: (r["ts"], r["id"])):
+                if (start is None or rec["ts"] >= start) and (end is None or rec["ts"] <= end):
+                    yield rec
+
+    def scan(self, start: Optional[str] = None, end: Optional[str] = None) -> Iterator[dict]:
+        """Every archived message, day by day and block by block (bulk jobs)."""
+        end = _end_bound(end)
+        for day in self.days(start, end):
+            for seg in self.segments(day):
+                for block in seg.blocks:
+                    for rec in seg.read_block(block):
+                        if (start is None or rec["ts"] >= start) and (end is None or rec["ts"] <= end):
+                            yield rec
+
+    def scan_from(self, after: Optional[dict] = None) -> Iterator[tuple]:
+        """
+        (position, record) for every archived message, segment by segment in creation
+        order; `position` ({"segment", "offset"}) resumes right after that record. Stable
+        across archive runs: segments are immutable and new ones sort after existing
+        ones, so a resumed bulk job (rescore.py) neither skips nor repeats messages.
+        """
+        start, skip = None, 0
+        if after:
+            start = _segment_order(*after["segment"].split("/", 1))
+            skip = after["offset"]
+        segs = sorted((s for d in self.days() for s in self.segments(d)), key=lambda s: s.order)
+        for seg in segs:
+            if start is not None and seg.order < start:
+                continue
+            done = skip if seg.order == start else 0
+            i = 0
+            for block in seg.blocks:
+                if i + block[3] <= done:
+                    i += block[3]  # whole block already done: don't decompress it
+                    continue
+                for rec in seg.read_block(block):
+                    i += 1
+                    if i > done:
+                        yield {"segment": seg.id, "offset": i}, rec
+
+    def stats(self) -> dict:
+        days = self.days()
+        segs = [s for d in days for s in self.segments(d)]
+        return {"root": self.root, "days": len(days), "segments": len(segs),
+                "messages": sum(s.index["count"] for s in segs), "bytes": sum(s.index["bytes"] for s in segs),
+                "oldest": days[0] if days else None, "newest": days[-1] if days else None}
+
+    def close(self):
+        with self._lock:
+            segs = list(self._segments.values())
+            self._segments.clear()
+        for seg in segs:
+            self._open.discard(seg)
+            seg.close()
+
+
+reader = ArchiveReader()
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Archive cold chat history into compressed segment files.")
+    sub = ap.add_subparsers(dest="cmd", required=True)
+    run = sub.add_parser("run", help="move old messages out of chat_messages")
+    run.add_argument("--older-than-days", type=float, default=AFTER_DAYS)
+    run.add_argument("--batch", type=int, default=BATCH)
+    run.add_argument("--codec", default=CODEC, choices=["gzip", "zstd"])
+    run.add_argument("--vacuum", action="store_true", help="SQLite: VACUUM afterwards to shrink the file")
+    read = sub.add_parser("read", help="print a student's archived messages as JSONL")
+    read.add_argument("--user", type=int, required=True)
+    read.add_argument("--start")
+    read.add_argument("--end")
+    sub.add_parser("stats")
+    ap.add_argument("--dir", default=ARCHIVE_DIR)
+    args = ap.parse_args()
+
+    if args.cmd == "run":
+        print(json.dumps(archive(args.older_than_days, args.dir, args.batch, args.codec, args.vacuum)))
+    elif args.cmd == "read":
+        for rec in ArchiveReader(args.dir).read_user(args.user, args.start, args.end):
+            print(json.dumps(rec, ensure_ascii=False))
+    else:
+        print(json.dumps(ArchiveReader(args.dir).stats()))
+
+
+if __name__ == "__main__":
+    main()
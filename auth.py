@@ -1,18 +1,24 @@
 # backend/auth.py
-from passlib.context import CryptContext
 from jose import JWTError, jwt
 from datetime import datetime, timedelta
 from typing import Optional
+from collections import OrderedDict
+import hashlib
+import os
+import threading
+import time
 from fastapi import HTTPException, Depends, status
 from fastapi.security import OAuth2PasswordBearer
-from sqlalchemy.orm import Session
-from . import models, db
+from sqlalchemy import event, select
+from sqlalchemy.orm import Session, object_session
+from sqlalchemy.ext.asyncio import AsyncSession
+from . import models, db, passwords
 
 SECRET_KEY = "changeme-please-set-a-secure-secret"
 ALGORITHM = "HS256"
 ACCESS_TOKEN_EXPIRE_MINUTES = 60 * 24 * 7  # 7 days
 
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+pwd_context = passwords.pwd_context  # work factor from BCRYPT_ROUNDS
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/token")
 
 def get_password_hash(password):
@@ -21,6 +27,10 @@ def get_password_hash(password):
 def verify_password(plain, hashed):
     return pwd_context.verify(plain, hashed)
 
+# request handlers use these: hashing runs on the bounded hashing executor
+hash_password_async = passwords.hash_password
+verify_and_update_async = passwords.verify_and_update
+
 def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
     to_encode = data.copy()
     if expires_delta:
@@ -31,6 +41,123 @@ def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
     encoded = jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
     return encoded
 
+# --- authenticated principal cache ---
+# Avoids a users-table lookup on every authenticated request. Entries live at most
+# PRINCIPAL_CACHE_TTL seconds (and never past the token's exp) and are dropped as soon
+# as an update to the user row commits in this process.
+PRINCIPAL_CACHE_TTL = float(os.environ.get("PRINCIPAL_CACHE_TTL", "60"))
+PRINCIPAL_CACHE_SIZE = int(os.environ.get("PRINCIPAL_CACHE_SIZE", "10000"))
+
+class Principal:
+    """Session-independent snapshot of the authenticated user (what handlers need)."""
+    __slots__ = ("id", "email", "role", "full_name", "college", "enrollment")
+
+    def __init__(self, id, email, role, full_name=None, college=None, enrollment=None):
+        self.id = id
+        self.email = email
+        self.role = role
+        self.full_name = full_name
+        self.college = college
+        self.enrollment = enrollment
+
+    @classmethod
+    def from_user(cls, user: models.User) -> "Principal":
+        return cls(user.id, user.email, user.role, user.full_name, user.college, user.enrollment)
+
+
+class PrincipalCache:
+    def __init__(self, max_entries: int = PRINCIPAL_CACHE_SIZE, ttl_seconds: float = PRINCIPAL_CACHE_TTL):
+        self.max_entries = max_entries
+        self.ttl = ttl_seconds
+        self._data = OrderedDict()  # token key -> (expires_at, principal)
+        self._by_user = {}          # user id -> set(token key)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+        self._epoch = 0  # bumped by every invalidation
+
+    def epoch(self) -> int:
+        """Take before loading a user; pass to put() so a load racing an update isn't cached."""
+        with self._lock:
+            return self._epoch
+
+    @staticmethod
+    def key(token: str) -> str:
+        return hashlib.sha256(token.encode("utf-8")).hexdigest()
+
+    def get(self, key: str) -> Optional[Principal]:
+        with self._lock:
+            item = self._data.get(key)
+            if item is None or item[0] <= time.time():
+                if item is not None:
+                    self._drop(key)
+                self.misses += 1
+                return None
+            self._data.move_to_end(key)
+            self.hits += 1
+            return item[1]
+
+    def put(self, key: str, principal: Principal, token_exp: float = None, epoch: int = None):
+        expires_at = time.time() + self.ttl
+        if token_exp:
+            expires_at = min(expires_at, token_exp)
+        with self._lock:
+            if epoch is not None and epoch != self._epoch:
+                return  # a user changed while this one was loaded: it may be the old row
+            self._data[key] = (expires_at, principal)
+            self._data.move_to_end(key)
+            self._by_user.setdefault(principal.id, set()).add(key)
+            while len(self._data) > self.max_entries:
+                self._drop(next(iter(self._data)))
+                self.evictions += 1
+
+    def _drop(self, key: str):
+        _, principal = self._data.pop(key)
+        keys = self._by_user.get(principal.id)
+        if keys is not None:
+            keys.discard(key)
+            if not keys:
+                del self._by_user[principal.id]
+
+    def invalidate_user(self, user_id: int):
+        with self._lock:
+            self._epoch += 1
+            for key in list(self._by_user.get(user_id, ())):
+                self._drop(key)
+                self.invalidations += 1
+
+    def stats(self) -> dict:
+        with self._lock:
+            total = self.hits + self.misses
+            return {"size": len(self._data), "hits": self.hits, "misses": self.misses,
+                    "hit_rate": round(self.hits / total, 4) if total else 0.0,
+                    "evictions": self.evictions, "invalidations": self.invalidations}
+
+
+principal_cache = PrincipalCache()
+
+# Updates are collected at flush and invalidated after commit: invalidating at flush
+# would let a concurrent request cache the still-committed old row (a demoted admin)
+# for the whole TTL.
+@event.listens_for(models.User, "after_update")
+@event.listens_for(models.User, "after_delete")
+def _collect_changed_user(mapper, connection, target):
+    session = object_session(target)
+    if session is not None:
+        session.info.setdefault("changed_user_ids", set()).add(target.id)
+
+@event.listens_for(Session, "after_commit")
+def _invalidate_principals(session):
+    # role/profile changed (link_portal, role update, ...): next request reloads the user
+    for user_id in session.info.pop("changed_user_ids", ()):
+        principal_cache.invalidate_user(user_id)
+
+@event.listens_for(Session, "after_rollback")
+def _forget_changed_users(session):
+    session.info.pop("changed_user_ids", None)
+
 def get_db():
     db_sess = db.SessionLocal()
     try:
@@ -38,11 +165,16 @@ def get_db():
     finally:
         db_sess.close()
 
-def get_current_user(token: str = Depends(oauth2_scheme), db: Session = Depends(get_db)):
+async def get_current_user(token: str = Depends(oauth2_scheme), db_session: AsyncSession = Depends(db.get_async_db)) -> Principal:
     credentials_exception = HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
         detail="Could not validate credentials",
     )
+    key = PrincipalCache.key(token)
+    principal = principal_cache.get(key)
+    if principal is not None:
+        return principal
+    epoch = principal_cache.epoch()
     try:
         payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
         email: str = payload.get("sub")
@@ -51,13 +183,17 @@ def get_current_user(token: str = Depends(oauth2_scheme), db: Session = Depends(
             raise credentials_exception
     except JWTError:
         raise credentials_exception
-    user = db.query(models.User).filter(models.User.email == email).first()
+    result = await db_session.execute(select(models.User).where(models.User.email == email))
+    user = result.scalars().first()
     if user is None:
         raise credentials_exception
-    return user
+    principal = Principal.from_user(user)
+    principal_cache.put(key, principal, payload.get("exp"), epoch)
+    return principal
 
 def require_role(role: str):
-    def inner(user: models.User = Depends(get_current_user)):
+    # authorizes from the cached principal; no DB access on a cache hit
+    def inner(user: Principal = Depends(get_current_user)):
         if user.role != role:
             raise HTTPException(status_code=403, detail="Insufficient permissions")
         return user
@@ -0,0 +1,104 @@
+# backend/batching.py
+import collections
+import threading
+import time
+from concurrent.futures import Future
+from typing import Any, Callable, List
+
+
+class MicroBatcher:
+    """
+    Collects concurrent single-item calls into batches and runs `fn` once per batch.
+    `fn` takes a list of inputs and must return a list of outputs in the same order.
+    A batch is dispatched as soon as it holds `max_batch_size` items or the oldest
+    queued item has waited `max_wait_ms`. Callers block only on their own result.
+    """
+
+    def __init__(self, fn: Callable[[List[Any]], List[Any]], max_batch_size: int = 16,
+                 max_wait_ms: float = 5.0, name: str = "batcher"):
+        self.fn = fn
+        self.max_batch_size = max(1, int(max_batch_size))
+        self.max_wait = max(0.0, float(max_wait_ms)) / 1000.0
+        self.name = name
+        self._queue = collections.deque()  # (item, future, enqueued_at)
+        self._cond = threading.Condition()
+        self._thread = None
+        self._closed = False
+        # counters (read via stats())
+        self._batches = 0
+        self._items = 0
+        self._max_seen = 0
+
+    def submit(self, item) -> Future:
+        fut = Future()
+        with self._cond:
+            if self._closed:
+                raise RuntimeError(f"{self.name} is closed")
+            self._queue.append((item, fut, time.monotonic()))
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name=self.name, daemon=True)
+                self._thread.start()
+            self._cond.notify()
+        return fut
+
+    def __call__(self, item, timeout: float = None):
+        return self.submit(item).result(timeout)
+
+    def _next_batch(self):
+        with self._cond:
+            while not self._queue and not self._closed:
+                self._cond.wait()
+            if not self._queue:
+                return None
+            deadline = self._queue[0][2] + self.max_wait
+            while len(self._queue) < self.max_batch_size and not self._closed:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                self._cond.wait(remaining)
+            n = min(len(self._queue), self.max_batch_size)
+            return [self._queue.popleft() for _ in range(n)]
+
+    def _run(self):
+        while True:
+            batch = self._next_batch()
+            if batch is None:
+                return
+            self._dispatch(batch)
+
+    def _dispatch(self, batch):
+        inputs = [b[0] for b in batch]
+        try:
+            outputs = self.fn(inputs)
+            if len(outputs) != len(inputs):
+                raise RuntimeError(f"{self.name}: got {len(outputs)} results for {len(inputs)} inputs")
+        except BaseException as e:
+            for _, fut, _ in batch:
+                fut.set_exception(e)
+            return
+        with self._cond:
+            self._batches += 1
+            self._items += len(batch)
+            self._max_seen = max(self._max_seen, len(batch))
+        for (_, fut, _), out in zip(batch, outputs):
+            fut.set_result(out)
+
+    def stats(self) -> dict:
+        with self._cond:
+            return {
+                "name": self.name,
+                "batches": self._batches,
+                "items": self._items,
+                "avg_batch_size": (self._items / self._batches) if self._batches else 0.0,
+                "max_batch_size_seen": self._max_seen,
+                "queued": len(self._queue),
+            }
+
+    def close(self, timeout: float = None):
+        """Stop accepting work; already queued items are still dispatched."""
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+            thread = self._thread
+        if thread is not None:
+            thread.join(timeout)
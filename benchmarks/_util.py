@@ -0,0 +1,43 @@
+# backend/benchmarks/_util.py
+import json
+import math
+import statistics
+import time
+
+
+def percentile(values, p: float) -> float:
+    """Nearest-rank percentile, p in [0, 100]."""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    # rank ceil(p/100 * n), 1-based (round() would round half to even); the epsilon
+    # keeps float noise (0.07 * 100 = 7.000000000000001) from bumping an exact rank
+    k = max(0, min(len(ordered) - 1, math.ceil(p * len(ordered) / 100.0 - 1e-9) - 1))
+    return ordered[k]
+
+
+def summarize(name: str, latencies_s, wall_s: float) -> dict:
+    """Throughput + latency summary (milliseconds) for one benchmark case."""
+    ms = [x * 1000.0 for x in latencies_s]
+    return {
+        "name": name,
+        "n": len(ms),
+        "wall_s": round(wall_s, 4),
+        "throughput_per_s": round(len(ms) / wall_s, 2) if wall_s > 0 else 0.0,
+        "mean_ms": round(statistics.fmean(ms), 3) if ms else 0.0,
+        "p50_ms": round(percentile(ms, 50), 3),
+        "p95_ms": round(percentile(ms, 95), 3),
+        "p99_ms": round(percentile(ms, 99), 3),
+    }
+
+
+def print_table(rows):
+    cols = ["name", "n", "throughput_per_s", "p50_ms", "p95_ms", "p99_ms"]
+    print("  ".join(f"{c:>18}" for c in cols))
+    for r in rows:
+        print("  ".join(f"{str(r.get(c, '')):>18}" for c in cols))
+
+
+def write_json(path: str, rows, **meta):
+    with open(path, "w") as f:
+        json.dump({"created_at": time.time(), "meta": meta, "results": rows}, f, indent=2)
@@ -0,0 +1,93 @@
+# backend/benchmarks/bench_batching.py
+"""
+Throughput/latency of per-call pipeline inference vs. the MicroBatcher.
+
+    python -m backend.benchmarks.bench_batching --clients 32 --requests 20
+    python -m backend.benchmarks.bench_batching --real   # use risk.py's transformer pipelines
+
+Without --real a fake pipeline is used whose cost is a fixed per-call overhead plus a
+small per-item cost (roughly how a CPU forward pass behaves), so it runs anywhere.
+"""
+import argparse
+import threading
+import time
+
+from ..batching import MicroBatcher
+from ._util import print_table, summarize, write_json
+
+
+class FakePipe:
+    def __init__(self, overhead_ms: float, per_item_ms: float):
+        self.overhead = overhead_ms / 1000.0
+        self.per_item = per_item_ms / 1000.0
+        self._lock = threading.Lock()  # one forward pass at a time, like a single model
+
+    def __call__(self, texts, **kwargs):
+        items = [texts] if isinstance(texts, str) else list(texts)
+        with self._lock:
+            time.sleep(self.overhead + self.per_item * len(items))
+        return [{"label": "NEGATIVE", "score": 0.5} for _ in items]
+
+
+def run(call, clients: int, per_client: int, text: str):
+    latencies = []
+    lock = threading.Lock()
+
+    def worker():
+        local = []
+        for _ in range(per_client):
+            t0 = time.perf_counter()
+            call(text)
+            local.append(time.perf_counter() - t0)
+        with lock:
+            latencies.extend(local)
+
+    threads = [threading.Thread(target=worker) for _ in range(clients)]
+    t0 = time.perf_counter()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    return latencies, time.perf_counter() - t0
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--clients", type=int, default=32)
+    ap.add_argument("--requests", type=int, default=20, help="requests per client")
+    ap.add_argument("--max-batch-size", type=int, default=16)
+    ap.add_argument("--max-wait-ms", type=float, default=5.0)
+    ap.add_argument("--overhead-ms", type=float, default=20.0)
+    ap.add_argument("--per-item-ms", type=float, default=2.0)
+    ap.add_argument("--real", action="store_true")
+    ap.add_argument("--json", help="write results to this file")
+    args = ap.parse_args()
+
+    text = "i have three assignments due and i feel completely overwhelmed"
+    if args.real:
+        from .. import risk
+        if not risk.warm_up(block=True):
+            raise SystemExit("transformers pipelines unavailable")
+        pipe = risk.sentiment_pipe
+    else:
+        pipe = FakePipe(args.overhead_ms, args.per_item_ms)
+
+    rows = []
+    lat, wall = run(lambda t: pipe(t), args.clients, args.requests, text)
+    rows.append(summarize("per-call", lat, wall))
+
+    batcher = MicroBatcher(lambda texts: pipe(texts, batch_size=len(texts)),
+                           max_batch_size=args.max_batch_size, max_wait_ms=args.max_wait_ms)
+    lat, wall = run(batcher, args.clients, args.requests, text)
+    rows.append(summarize("micro-batched", lat, wall))
+    stats = batcher.stats()
+    batcher.close()
+
+    print_table(rows)
+    print(f"avg batch size: {stats['avg_batch_size']:.1f} (max {stats['max_batch_size_seen']})")
+    if args.json:
+        write_json(args.json, rows, bench="batching", args=vars(args), batcher=stats)
+
+
+if __name__ == "__main__":
+    main()
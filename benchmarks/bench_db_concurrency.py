@@ -0,0 +1,148 @@
+# backend/benchmarks/bench_db_concurrency.py
+"""
+/chat persistence throughput at 50-500 concurrent clients, before and after the async
+DB layer.
+
+    python -m backend.benchmarks.bench_db_concurrency --clients 50 100 250 500
+    python -m backend.benchmarks.bench_db_concurrency --url http://localhost:8000 --clients 50 200
+
+Default (in-process, temp SQLite files) compares:
+  before: sync engine, default rollback journal, sync handlers in a 40-thread pool,
+          three commits per /chat (user message, bot message, risk score)
+  after:  async engine, WAL + synchronous=NORMAL + busy_timeout, single writer,
+          two commits per /chat (message + scoring job, bot message)
+With --url, real /chat requests are sent to a running server; start it once with
+DB_SQLITE_TUNING=0 and once without to compare.
+"""
+import argparse
+import asyncio
+import os
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from .. import db, models
+from ._util import print_table, summarize, write_json
+
+
+def _fresh_url(tag: str) -> str:
+    path = os.path.join(tempfile.mkdtemp(prefix=f"bench_{tag}_"), "bench.db")
+    return f"sqlite:///{path}"
+
+
+async def run_before(clients: int, per_client: int):
+    url = _fresh_url("before")
+    engine = db.make_engine(url, tuned=False)
+    models.Base.metadata.create_all(bind=engine)
+    Session = db.sessionmaker(bind=engine, autoflush=False, autocommit=False)
+    pool = ThreadPoolExecutor(max_workers=40)  # FastAPI's default threadpool size
+    loop = asyncio.get_running_loop()
+
+    def chat_tx(i):
+        s = Session()
+        try:
+            s.add(models.ChatMessage(user_id=1, role="user", text=f"message {i}"))
+            s.commit()
+            s.add(models.ChatMessage(user_id=1, role="bot", text="reply"))
+            s.commit()
+            s.add(models.RiskScore(user_id=1, score=5, reason="bench"))
+            s.commit()
+        finally:
+            s.close()
+
+    latencies = []
+
+    async def client(c):
+        for k in range(per_client):
+            t0 = time.perf_counter()
+            await loop.run_in_executor(pool, chat_tx, c * per_client + k)
+            latencies.append(time.perf_counter() - t0)
+
+    t0 = time.perf_counter()
+    await asyncio.gather(*(client(c) for c in range(clients)))
+    wall = time.perf_counter() - t0
+    pool.shutdown()
+    engine.dispose()
+    return summarize(f"before-{clients}", latencies, wall)
+
+
+async def run_after(clients: int, per_client: int):
+    from sqlalchemy.ext.asyncio import async_sessionmaker
+    url = _fresh_url("after")
+    models.Base.metadata.create_all(bind=db.make_engine(url))
+    engine = db.make_async_engine(url, tuned=True)
+    Session = async_sessionmaker(engine, autoflush=False, expire_on_commit=False)
+    lock = asyncio.Lock()  # what db.writer() does for SQLite
+    latencies = []
+
+    async def client(c):
+        for k in range(per_client):
+            t0 = time.perf_counter()
+            async with Session() as s:
+                msg = models.ChatMessage(user_id=1, role="user", text=f"message {c * per_client + k}")
+                s.add(msg)
+                s.add(models.ScoringJob(user_id=1, message=msg))
+                async with lock:
+                    await s.commit()
+                s.add(models.ChatMessage(user_id=1, role="bot", text="reply"))
+                async with lock:
+                    await s.commit()
+            latencies.append(time.perf_counter() - t0)
+
+    t0 = time.perf_counter()
+    await asyncio.gather(*(client(c) for c in range(clients)))
+    wall = time.perf_counter() - t0
+    await engine.dispose()
+    return summarize(f"after-{clients}", latencies, wall)
+
+
+async def run_http(url: str, clients: int, per_client: int):
+    import httpx
+    limits = httpx.Limits(max_connections=clients, max_keepalive_connections=clients)
+    async with httpx.AsyncClient(base_url=url, limits=limits, timeout=60) as http:
+        # one account per bench run; registration is not what we measure
+        email = f"bench-{int(time.time() * 1000)}@example.com"
+        await http.post("/register", json={"email": email, "password": "bench-pass", "phone": None,
+                                           "full_name": "Bench", "college": "Bench", "enrollment": "0"})
+        r = await http.post("/token", data={"username": email, "password": "bench-pass"})
+        headers = {"Authorization": f"Bearer {r.json()['access_token']}"}
+        latencies, errors = [], 0
+
+        async def client(c):
+            nonlocal errors
+            for k in range(per_client):
+                t0 = time.perf_counter()
+                resp = await http.post("/chat", json={"text": f"deadline stress {c}-{k}"}, headers=headers)
+                if resp.status_code != 200:
+                    errors += 1
+                latencies.append(time.perf_counter() - t0)
+
+        t0 = time.perf_counter()
+        await asyncio.gather(*(client(c) for c in range(clients)))
+        row = summarize(f"http-{clients}", latencies, time.perf_counter() - t0)
+        row["errors"] = errors
+        return row
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--clients", type=int, nargs="+", default=[50, 100, 250, 500])
+    ap.add_argument("--requests", type=int, default=10, help="requests per client")
+    ap.add_argument("--url", help="drive a running server instead of the in-process comparison")
+    ap.add_argument("--json", help="write results to this file")
+    args = ap.parse_args()
+
+    rows = []
+    for c in args.clients:
+        if args.url:
+            rows.append(asyncio.run(run_http(args.url, c, args.requests)))
+        else:
+            rows.append(asyncio.run(run_before(c, args.requests)))
+            rows.append(asyncio.run(run_after(c, args.requests)))
+    print_table(rows)
+    if args.json:
+        write_json(args.json, rows, bench="db_concurrency", args=vars(args))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,87 @@
+# backend/benchmarks/bench_lexicon.py
+"""
+Per-message cost of the old multi-scan lexicon checks vs. the single-pass
+LexiconMatcher as the lexicons grow.
+
+    python -m backend.benchmarks.bench_lexicon --sizes 10 100 1000 5000
+"""
+import argparse
+import random
+import re
+import string
+import time
+
+from ..lexicon import ABSOLUTIST_WORDS, NEGATIVE_WORDS, SUICIDAL_PHRASES, LexiconMatcher
+from ._util import write_json
+
+MESSAGES = [
+    "ok",
+    "thanks, that helps a lot",
+    "i have three assignments due friday and i feel completely overwhelmed",
+    "nobody ever listens to me and i always mess everything up, i feel worthless",
+    "i can't go on like this, some days i just want to end it all",
+    "can you help me make a study plan for my database systems exam next week?",
+]
+
+
+def synthetic_lexicons(size: int, rng: random.Random):
+    """Real entries padded with random words/phrases up to `size` entries per list."""
+    def word():
+        return "".join(rng.choice(string.ascii_lowercase) for _ in range(rng.randint(4, 10)))
+
+    phrases = list(SUICIDAL_PHRASES)
+    while len(phrases) < size:
+        phrases.append(" ".join(word() for _ in range(rng.randint(2, 4))))
+    neg = list(NEGATIVE_WORDS)
+    while len(neg) < size:
+        neg.append(word())
+    absol = set(ABSOLUTIST_WORDS)
+    while len(absol) < size:
+        absol.add(word())
+    return phrases, neg, absol
+
+
+def naive(text, phrases, neg, absol):
+    # what main.py / risk.py did before: one scan per list, one str.count per word
+    t = text.lower()
+    suicidal = any(p in t for p in phrases)
+    words = re.findall(r"\w+", t)
+    a = sum(1 for w in words if w in absol)
+    n = sum(t.count(w) for w in neg)
+    return suicidal, a, n
+
+
+def per_message_us(fn, reps: int) -> float:
+    t0 = time.perf_counter()
+    for _ in range(reps):
+        for m in MESSAGES:
+            fn(m)
+    return (time.perf_counter() - t0) / (reps * len(MESSAGES)) * 1e6
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--sizes", type=int, nargs="+", default=[10, 100, 1000, 5000])
+    ap.add_argument("--reps", type=int, default=200)
+    ap.add_argument("--json", help="write results to this file")
+    args = ap.parse_args()
+
+    rng = random.Random(42)
+    rows = []
+    print(f"{'entries/list':>12} {'naive us/msg':>14} {'matcher us/msg':>15} {'build ms':>9}")
+    for size in args.sizes:
+        phrases, neg, absol = synthetic_lexicons(size, rng)
+        t0 = time.perf_counter()
+        matcher = LexiconMatcher({"suicidal": phrases, "negative": neg, "absolutist": absol})
+        build_ms = (time.perf_counter() - t0) * 1000
+        naive_us = per_message_us(lambda m: naive(m, phrases, neg, absol), args.reps)
+        matcher_us = per_message_us(matcher.match, args.reps)
+        rows.append({"entries_per_list": size, "naive_us": round(naive_us, 2),
+                     "matcher_us": round(matcher_us, 2), "build_ms": round(build_ms, 2)})
+        print(f"{size:>12} {naive_us:>14.2f} {matcher_us:>15.2f} {build_ms:>9.1f}")
+    if args.json:
+        write_json(args.json, rows, bench="lexicon", args=vars(args))
+
+
+if __name__ == "__main__":
+    main()
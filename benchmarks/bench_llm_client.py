@@ -0,0 +1,140 @@
+# backend/benchmarks/bench_llm_client.py
+"""
+Load test for chatbot.LLMClient against the local mock provider (mock_llm_server.py).
+
+    python -m backend.benchmarks.bench_llm_client --users 50 --requests 4
+
+Starts the mock server in a subprocess and runs these scenarios in order on one client:
+  healthy   provider answers normally
+  slow      every request stalls past the first-token timeout
+  down      every request fails with HTTP 500
+  recovery  provider healthy again, after the breaker's reset period (one trial
+            request goes through while the breaker is half-open)
+  recovered breaker closed again
+For each scenario it reports the reply latency, the fallback mix, the breaker state and
+the mock's peak concurrency, which shows the global cap holding.
+"""
+import argparse
+import asyncio
+import json
+import os
+import socket
+import subprocess
+import sys
+import time
+import urllib.request
+
+from ._util import percentile, write_json
+
+SCENARIOS = [
+    ("healthy", {"error_rate": 0, "hang_rate": 0}),
+    ("slow", {"error_rate": 0, "hang_rate": 1, "hang_s": 30}),
+    ("down", {"error_rate": 1, "hang_rate": 0}),
+    ("recovery", {"error_rate": 0, "hang_rate": 0}),
+    ("recovered", {"error_rate": 0, "hang_rate": 0}),
+]
+
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def _post(url: str, body: dict) -> dict:
+    req = urllib.request.Request(url, data=json.dumps(body).encode(), headers={"content-type": "application/json"})
+    with urllib.request.urlopen(req, timeout=5) as r:
+        return json.loads(r.read())
+
+
+def _get(url: str) -> dict:
+    with urllib.request.urlopen(url, timeout=5) as r:
+        return json.loads(r.read())
+
+
+def start_mock(port: int, ttft_ms: float, token_ms: float):
+    pkg = __package__.rsplit(".", 1)[0]
+    proc = subprocess.Popen([sys.executable, "-m", f"{pkg}.mock_llm_server", "--port", str(port),
+                             "--ttft-ms", str(ttft_ms), "--token-ms", str(token_ms)])
+    for _ in range(100):
+        try:
+            _get(f"http://127.0.0.1:{port}/_stats")
+            return proc
+        except OSError:
+            time.sleep(0.1)
+    proc.kill()
+    raise RuntimeError("mock LLM server did not start")
+
+
+async def scenario(client, users: int, per_user: int):
+    latencies = []
+
+    async def user(u):
+        profile = {"email": f"user{u}@example.com", "college": "Bench"}
+        for _ in range(per_user):
+            t0 = time.perf_counter()
+            await client.complete(profile, "I have three deadlines this week")
+            latencies.append(time.perf_counter() - t0)
+
+    before = client.stats()["fallbacks"]
+    t0 = time.perf_counter()
+    await asyncio.gather(*(user(u) for u in range(users)))
+    wall = time.perf_counter() - t0
+    after = client.stats()
+    fallbacks = {k: after["fallbacks"][k] - before[k] for k in before if after["fallbacks"][k] - before[k]}
+    ms = [x * 1000 for x in latencies]
+    return {"n": len(ms), "wall_s": round(wall, 3),
+            "p50_ms": round(percentile(ms, 50), 1), "p95_ms": round(percentile(ms, 95), 1),
+            "p99_ms": round(percentile(ms, 99), 1), "fallbacks": fallbacks,
+            "breaker": after["breaker"]["state"]}
+
+
+async def run(args, base: str):
+    os.environ.setdefault("LLM_FIRST_TOKEN_TIMEOUT_S", str(args.first_token_timeout))
+    from .. import chatbot  # after the env override above
+    client = chatbot.LLMClient(base_url=f"{base}/v1", max_concurrency=args.max_concurrency,
+                               breaker=chatbot.CircuitBreaker(failures=5, reset_s=args.breaker_reset))
+    rows = []
+    for name, cfg in SCENARIOS:
+        if name == "recovery":
+            await asyncio.sleep(args.breaker_reset)
+        _post(f"{base}/_config", cfg)
+        mock_before = _get(f"{base}/_stats")
+        row = await scenario(client, args.users, args.requests)
+        mock = _get(f"{base}/_stats")
+        row.update(name=name, provider_requests=mock["requests"] - mock_before["requests"],
+                   provider_max_in_flight=mock["max_in_flight"])
+        rows.append(row)
+        print(f"{name:>9}  n={row['n']:<5} p50={row['p50_ms']:>8}ms p95={row['p95_ms']:>8}ms "
+              f"p99={row['p99_ms']:>8}ms  provider_reqs={row['provider_requests']:<5} "
+              f"peak_in_flight={row['provider_max_in_flight']:<3} breaker={row['breaker']:<9} "
+              f"fallbacks={row['fallbacks']}")
+    await client.aclose()
+    return rows
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--users", type=int, default=50)
+    ap.add_argument("--requests", type=int, default=4, help="requests per user")
+    ap.add_argument("--max-concurrency", type=int, default=32)
+    ap.add_argument("--ttft-ms", type=float, default=200)
+    ap.add_argument("--token-ms", type=float, default=10)
+    ap.add_argument("--first-token-timeout", type=float, default=1.0)
+    ap.add_argument("--breaker-reset", type=float, default=2.0)
+    ap.add_argument("--json", help="write results to this file")
+    args = ap.parse_args()
+
+    port = _free_port()
+    proc = start_mock(port, args.ttft_ms, args.token_ms)
+    try:
+        rows = asyncio.run(run(args, f"http://127.0.0.1:{port}"))
+    finally:
+        proc.kill()  # stalled "slow" requests would hold up a graceful shutdown
+        proc.wait()
+    if args.json:
+        write_json(args.json, rows, bench="llm_client", args=vars(args))
+
+
+if __name__ == "__main__":
+    main()
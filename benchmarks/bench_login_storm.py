@@ -0,0 +1,73 @@
+# backend/benchmarks/bench_login_storm.py
+"""
+Login storm: many concurrent bcrypt verifications while "/chat-like" requests keep
+arriving, comparing the old inline path (bcrypt in the request threadpool) with the
+bounded hashing executor from passwords.py.
+
+    python -m backend.benchmarks.bench_login_storm --logins 200 --rounds 12
+
+The chat probe is a tiny blocking task sent to the same default threadpool that
+FastAPI uses for sync handlers; its latency shows how much the storm starves /chat.
+"""
+import argparse
+import asyncio
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from .. import passwords
+from ._util import print_table, summarize, write_json
+
+
+async def storm(mode: str, logins: int, hashed: str, probes: int, threadpool_size: int):
+    loop = asyncio.get_running_loop()
+    # stand-in for the anyio threadpool (40 threads by default)
+    request_pool = ThreadPoolExecutor(max_workers=threadpool_size)
+    login_lat, probe_lat = [], []
+
+    async def login():
+        t0 = time.perf_counter()
+        if mode == "inline":
+            await loop.run_in_executor(request_pool, passwords.pwd_context.verify, "hunter2", hashed)
+        else:
+            await passwords.verify_and_update("hunter2", hashed)
+        login_lat.append(time.perf_counter() - t0)
+
+    async def probe():
+        for _ in range(probes):
+            t0 = time.perf_counter()
+            await loop.run_in_executor(request_pool, time.sleep, 0.001)
+            probe_lat.append(time.perf_counter() - t0)
+            await asyncio.sleep(0.01)
+
+    t0 = time.perf_counter()
+    await asyncio.gather(probe(), *(login() for _ in range(logins)))
+    wall = time.perf_counter() - t0
+    request_pool.shutdown()
+    return summarize(f"{mode}-logins", login_lat, wall), summarize(f"{mode}-chat-probe", probe_lat, wall)
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--logins", type=int, default=200)
+    ap.add_argument("--rounds", type=int, default=passwords.ROUNDS)
+    ap.add_argument("--probes", type=int, default=50)
+    ap.add_argument("--threadpool", type=int, default=40)
+    ap.add_argument("--json", help="write results to this file")
+    args = ap.parse_args()
+
+    os.environ["BCRYPT_ROUNDS"] = str(args.rounds)  # picked up by the spawned hash workers
+    passwords.pwd_context = passwords.make_context(args.rounds)
+    hashed = passwords.pwd_context.hash("hunter2")
+    rows = []
+    for mode in ("inline", "executor"):
+        rows.extend(asyncio.run(storm(mode, args.logins, hashed, args.probes, args.threadpool)))
+    passwords.hasher.shutdown()
+    print_table(rows)
+    print(passwords.hasher.stats())
+    if args.json:
+        write_json(args.json, rows, bench="login_storm", args=vars(args))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,105 @@
+# backend/benchmarks/bench_model_server.py
+"""
+Risk analysis through the shared model server vs. in-process, across worker processes.
+
+    python -m backend.benchmarks.bench_model_server --workers 4 --threads 8 --requests 50
+    python -m backend.benchmarks.bench_model_server --real   # load the real models in the server
+
+Simulates `uvicorn --workers N`: N processes with T threads each call
+risk.analyze_text_simple on distinct messages (cache misses). "inprocess" loads the
+models in every worker; "server" starts model_server.py once and points the workers at
+it with RISK_MODEL_SERVER. Without --real, models are disabled and the numbers show the
+socket round-trip cost on top of the heuristics.
+"""
+import argparse
+import multiprocessing
+import os
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+from ._util import print_table, summarize, write_json
+
+
+def worker(env: dict, threads: int, per_thread: int, wid: int, out):
+    os.environ.update(env)
+    from .. import risk
+    risk.warm_up(block=True)
+    latencies = []
+    lock = threading.Lock()
+
+    def run(t):
+        local = []
+        for i in range(per_thread):
+            text = f"worker {wid} thread {t} message {i}: I can't sleep before exams"
+            t0 = time.perf_counter()
+            risk.analyze_text_simple(text)
+            local.append(time.perf_counter() - t0)
+        with lock:
+            latencies.extend(local)
+
+    ts = [threading.Thread(target=run, args=(t,)) for t in range(threads)]
+    for t in ts:
+        t.start()
+    for t in ts:
+        t.join()
+    out.put(latencies)
+
+
+def run_case(name: str, env: dict, args):
+    ctx = multiprocessing.get_context("spawn")  # fresh interpreters, like separate uvicorn workers
+    out = ctx.Queue()
+    procs = [ctx.Process(target=worker, args=(env, args.threads, args.requests, w, out)) for w in range(args.workers)]
+    t0 = time.perf_counter()
+    for p in procs:
+        p.start()
+    latencies = []
+    for _ in procs:
+        latencies.extend(out.get())
+    wall = time.perf_counter() - t0
+    for p in procs:
+        p.join()
+    return summarize(name, latencies, wall)
+
+
+def start_server(path: str, env: dict):
+    pkg = __package__.rsplit(".", 1)[0]
+    proc = subprocess.Popen([sys.executable, "-m", f"{pkg}.model_server", "--socket", path],
+                            env=dict(os.environ, **env))
+    for _ in range(6000):  # model load can take a while with --real
+        if os.path.exists(path):
+            return proc
+        if proc.poll() is not None:
+            break
+        time.sleep(0.1)
+    proc.kill()
+    raise RuntimeError("model server did not start")
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--workers", type=int, default=4)
+    ap.add_argument("--threads", type=int, default=8, help="concurrent requests per worker")
+    ap.add_argument("--requests", type=int, default=50, help="requests per thread")
+    ap.add_argument("--real", action="store_true", help="use the transformer models")
+    ap.add_argument("--json", help="write results to this file")
+    args = ap.parse_args()
+
+    base = {"RISK_USE_MODELS": "1" if args.real else "0", "RISK_CACHE": "off"}
+    rows = [run_case("inprocess", dict(base, RISK_MODEL_SERVER=""), args)]
+    path = os.path.join(tempfile.mkdtemp(), "models.sock")
+    server = start_server(path, base)
+    try:
+        rows.append(run_case("server", dict(base, RISK_MODEL_SERVER=path), args))
+    finally:
+        server.terminate()
+        server.wait()
+    print_table(rows)
+    if args.json:
+        write_json(args.json, rows, bench="model_server", args=vars(args))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,99 @@
+# backend/benchmarks/bench_onnx.py
+"""
+CPU latency and memory of the risk models: transformers (torch) vs. quantized ONNX.
+
+    python -m backend.benchmarks.bench_onnx --batch-sizes 1 8 32 --repeats 20
+
+Each backend is measured in a fresh subprocess so the resident set size reflects only
+that backend: RSS after loading, then for every batch size the per-batch forward
+latency (sentiment + emotion, the work one micro-batch does) and the per-message cost.
+"""
+import argparse
+import json
+import os
+import resource
+import subprocess
+import sys
+import time
+
+from ._util import percentile, write_json
+
+TEXTS = [
+    "I have three deadlines this week and I can't sleep",
+    "I always mess everything up, nothing ever works out for me",
+    "thanks, that helped a lot",
+    "it's 3am and I'm still awake thinking about everything",
+]
+
+
+def _rss_mb() -> float:
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) / 1024.0
+    except OSError:
+        pass
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024.0  # peak, KiB on Linux
+
+
+def measure(batch_sizes, repeats: int):
+    """Child process: time one forward pass of both models per batch, as the batcher would run it."""
+    from .. import risk
+    rss_before = _rss_mb()
+    risk._load_pipelines()
+    if not risk.HAS_PIPELINES:
+        raise SystemExit(f"{risk.BACKEND} backend failed to load: {risk.model_status()['error']}")
+    if risk.combined_batcher is not None:
+        forward = risk.combined_batcher.fn
+    else:
+        def forward(texts):
+            return risk.sentiment_batcher.fn(texts), risk.emotion_batcher.fn(texts)
+    row = {"name": risk.BACKEND, "load_s": round(risk.model_status()["load_seconds"], 2),
+           "rss_loaded_mb": round(_rss_mb() - rss_before, 1)}
+    for bs in batch_sizes:
+        batch = [TEXTS[i % len(TEXTS)] for i in range(bs)]
+        forward(batch)  # warm-up
+        latencies = []
+        for _ in range(repeats):
+            t0 = time.perf_counter()
+            forward(batch)
+            latencies.append((time.perf_counter() - t0) * 1000.0)
+        row[f"b{bs}_p50_ms"] = round(percentile(latencies, 50), 2)
+        row[f"b{bs}_p95_ms"] = round(percentile(latencies, 95), 2)
+        row[f"b{bs}_per_msg_ms"] = round(percentile(latencies, 50) / bs, 2)
+    row["rss_peak_mb"] = round(_rss_mb(), 1)
+    print(json.dumps(row))
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--measure", action="store_true", help=argparse.SUPPRESS)
+    ap.add_argument("--backends", nargs="+", default=["torch", "onnx"])
+    ap.add_argument("--batch-sizes", type=int, nargs="+", default=[1, 8, 32])
+    ap.add_argument("--repeats", type=int, default=20)
+    ap.add_argument("--json", help="write results to this file")
+    args = ap.parse_args()
+    if args.measure:
+        return measure(args.batch_sizes, args.repeats)
+
+    pkg = __package__.rsplit(".", 1)[0]
+    rows = []
+    for backend in args.backends:
+        env = dict(os.environ, RISK_BACKEND=backend)
+        proc = subprocess.run([sys.executable, "-m", f"{pkg}.benchmarks.bench_onnx", "--measure",
+                               "--batch-sizes", *map(str, args.batch_sizes), "--repeats", str(args.repeats)],
+                              env=env, capture_output=True, text=True)
+        if proc.returncode != 0:
+            sys.stderr.write(proc.stderr)
+            print(f"{backend}: failed")
+            continue
+        rows.append(json.loads(proc.stdout.strip().splitlines()[-1]))
+    for r in rows:
+        print("  ".join(f"{k}={v}" for k, v in r.items()))
+    if args.json:
+        write_json(args.json, rows, bench="onnx", args=vars(args))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,81 @@
+# backend/benchmarks/bench_ttft.py
+"""
+Time-to-first-token: /chat (whole reply in one JSON body) vs /chat/stream (SSE).
+
+Start the demo app with the fake LLM pacing a provider, then run the bench:
+
+    FAKE_LLM_ENABLED=1 FAKE_LLM_TTFT_MS=400 FAKE_LLM_TOKEN_MS=40 uvicorn main:app --port 8000
+    python -m backend.benchmarks.bench_ttft --url http://127.0.0.1:8000 --clients 1 20
+
+For /chat the first byte arrives with the complete reply, so ttft == total. For
+/chat/stream ttft is the arrival of the first `token` event.
+"""
+import argparse
+import asyncio
+import time
+
+from ._util import percentile, print_table, write_json
+
+
+async def one(http, path: str, i: int):
+    payload = {"email": f"ttft-{i % 50}@example.com", "name": "Bench", "text": "I have a deadline tomorrow"}
+    t0 = time.perf_counter()
+    ttft = None
+    async with http.stream("POST", path, json=payload) as r:
+        r.raise_for_status()
+        if path.endswith("/stream"):
+            async for line in r.aiter_lines():
+                if ttft is None and line.startswith("event: token"):
+                    ttft = time.perf_counter() - t0
+        else:
+            await r.aread()
+    total = time.perf_counter() - t0
+    return ttft if ttft is not None else total, total
+
+
+async def run(url: str, path: str, clients: int, per_client: int) -> dict:
+    import httpx
+    limits = httpx.Limits(max_connections=clients, max_keepalive_connections=clients)
+    async with httpx.AsyncClient(base_url=url, limits=limits, timeout=120) as http:
+        ttfts, totals = [], []
+
+        async def client(c):
+            for k in range(per_client):
+                a, b = await one(http, path, c * per_client + k)
+                ttfts.append(a)
+                totals.append(b)
+
+        t0 = time.perf_counter()
+        await asyncio.gather(*(client(c) for c in range(clients)))
+        wall = time.perf_counter() - t0
+    ms = lambda xs, p: round(percentile([x * 1000 for x in xs], p), 2)
+    return {
+        "name": f"{path}-c{clients}", "n": len(totals),
+        "throughput_per_s": round(len(totals) / wall, 2) if wall else 0.0,
+        "ttft_p50_ms": ms(ttfts, 50), "ttft_p95_ms": ms(ttfts, 95),
+        "p50_ms": ms(totals, 50), "p95_ms": ms(totals, 95), "p99_ms": ms(totals, 99),
+    }
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--url", default="http://127.0.0.1:8000")
+    ap.add_argument("--clients", type=int, nargs="+", default=[1, 20])
+    ap.add_argument("--requests", type=int, default=10, help="requests per client")
+    ap.add_argument("--json", help="write results to this file")
+    args = ap.parse_args()
+
+    rows = []
+    for c in args.clients:
+        for path in ("/chat", "/chat/stream"):
+            rows.append(asyncio.run(run(args.url, path, c, args.requests)))
+    print_table(rows)
+    print()
+    for r in rows:
+        print(f"{r['name']:>24}  ttft p50={r['ttft_p50_ms']}ms p95={r['ttft_p95_ms']}ms")
+    if args.json:
+        write_json(args.json, rows, bench="ttft", args=vars(args))
+
+
+if __name__ == "__main__":
+    main()
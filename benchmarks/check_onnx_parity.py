@@ -0,0 +1,137 @@
+# backend/benchmarks/check_onnx_parity.py
+"""
+Parity check: transformers (torch) vs. quantized ONNX risk models.
+
+    python -m backend.benchmarks.check_onnx_parity
+    python -m backend.benchmarks.check_onnx_parity --max-prob-diff 0.1 --min-score-agreement 0.95
+
+Each backend runs in its own subprocess (RISK_BACKEND=torch|onnx, cache off) over the
+same sample messages. Reported per model: max/mean absolute probability difference
+and top-label agreement; for the whole scorer: how often the 1-10 risk score and the
+escalate flag match. Exits 1 when a tolerance is exceeded, so it can gate a deploy.
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+
+from ._util import write_json
+
+SAMPLES = [
+    "ok",
+    "thanks, that helped a lot",
+    "I'm stressed about my exams",
+    "I have three deadlines this week and I can't sleep",
+    "I always mess everything up, nothing ever works out for me",
+    "my roommate is great and we went hiking today",
+    "I feel so alone since I moved here",
+    "I'm angry at my professor for failing me",
+    "honestly I don't see the point of anything anymore",
+    "I am scared I will be kicked out of the hostel",
+    "the lecture was boring but fine",
+    "I can't stop crying and I don't know why",
+    "I want to end my life",
+    "looking forward to the weekend!",
+    "everyone hates me and I will never be good enough",
+    "my parents keep fighting and I have nowhere to go",
+    "I got the internship!!",
+    "I haven't eaten properly in days because of the pressure",
+    "it's 3am and I'm still awake thinking about everything",
+    "I'm fine I guess",
+]
+
+
+def dump(texts):
+    """Child process: load the backend selected by RISK_BACKEND and print its outputs as JSON."""
+    from .. import risk
+    risk._load_pipelines()
+    if not risk.HAS_PIPELINES:
+        raise SystemExit(f"{risk.BACKEND} backend failed to load: {risk.model_status()['error']}")
+    out = []
+    for text in texts:
+        if risk.combined_batcher is not None:
+            sent, emo = risk.combined_batcher(text[:512])
+        else:
+            sent, emo = risk.sentiment_batcher(text[:512]), risk.emotion_batcher(text[:512])
+        # P(negative) so both label orders compare directly
+        p_neg = sent["score"] if sent["label"].lower().startswith("negative") else 1.0 - sent["score"]
+        result = risk.compute_risk_score(text)
+        out.append({"p_negative": p_neg, "emotions": {e["label"]: e["score"] for e in emo},
+                    "score": result["score"], "escalate": result["escalate"]})
+    print(json.dumps(out))
+
+
+def run_backend(backend: str, texts):
+    pkg = __package__.rsplit(".", 1)[0]
+    env = dict(os.environ, RISK_BACKEND=backend, RISK_CACHE="off")
+    proc = subprocess.run([sys.executable, "-m", f"{pkg}.benchmarks.check_onnx_parity", "--dump"],
+                          input=json.dumps(texts), env=env, capture_output=True, text=True)
+    if proc.returncode != 0:
+        sys.stderr.write(proc.stderr)
+        raise SystemExit(f"{backend} run failed")
+    return json.loads(proc.stdout.strip().splitlines()[-1])
+
+
+def compare(ref, cand):
+    n = len(ref)
+    sent_diffs = [abs(a["p_negative"] - b["p_negative"]) for a, b in zip(ref, cand)]
+    emo_diffs = [abs(a["emotions"][k] - b["emotions"].get(k, 0.0))
+                 for a, b in zip(ref, cand) for k in a["emotions"]]
+
+    def top(emotions):
+        return max(emotions, key=emotions.get)
+
+    return {
+        "n": n,
+        "sentiment_max_diff": round(max(sent_diffs), 4),
+        "sentiment_mean_diff": round(sum(sent_diffs) / n, 4),
+        "sentiment_label_agreement": sum((a["p_negative"] > 0.5) == (b["p_negative"] > 0.5)
+                                         for a, b in zip(ref, cand)) / n,
+        "emotion_max_diff": round(max(emo_diffs), 4),
+        "emotion_mean_diff": round(sum(emo_diffs) / len(emo_diffs), 4),
+        "emotion_label_agreement": sum(top(a["emotions"]) == top(b["emotions"]) for a, b in zip(ref, cand)) / n,
+        "score_agreement": sum(a["score"] == b["score"] for a, b in zip(ref, cand)) / n,
+        "score_max_diff": max(abs(a["score"] - b["score"]) for a, b in zip(ref, cand)),
+        "escalate_agreement": sum(a["escalate"] == b["escalate"] for a, b in zip(ref, cand)) / n,
+    }
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--dump", action="store_true", help=argparse.SUPPRESS)
+    ap.add_argument("--texts", help="file with one message per line (default: built-in samples)")
+    ap.add_argument("--max-prob-diff", type=float, default=0.1)
+    ap.add_argument("--min-label-agreement", type=float, default=0.95)
+    ap.add_argument("--min-score-agreement", type=float, default=0.9)
+    ap.add_argument("--json", help="write results to this file")
+    args = ap.parse_args()
+    if args.dump:
+        return dump(json.loads(sys.stdin.read()))
+
+    texts = SAMPLES
+    if args.texts:
+        with open(args.texts) as f:
+            texts = [line.strip() for line in f if line.strip()]
+    row = compare(run_backend("torch", texts), run_backend("onnx", texts))
+    for k, v in row.items():
+        print(f"{k:>26}  {v}")
+
+    failures = []
+    if max(row["sentiment_max_diff"], row["emotion_max_diff"]) > args.max_prob_diff:
+        failures.append("probability diff")
+    if min(row["sentiment_label_agreement"], row["emotion_label_agreement"]) < args.min_label_agreement:
+        failures.append("label agreement")
+    if min(row["score_agreement"], row["escalate_agreement"]) < args.min_score_agreement:
+        failures.append("risk score agreement")
+    row["failures"] = failures
+    if args.json:
+        write_json(args.json, [row], bench="onnx_parity", args=vars(args))
+    if failures:
+        print("FAIL:", ", ".join(failures))
+        sys.exit(1)
+    print("OK")
+
+
+if __name__ == "__main__":
+    main()
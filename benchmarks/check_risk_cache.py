@@ -0,0 +1,64 @@
+# backend/benchmarks/check_risk_cache.py
+"""
+Regression check: the risk result cache never changes an analysis.
+
+    python -m backend.benchmarks.check_risk_cache
+
+Texts that share a cache key (same words, different case or spacing) are analyzed
+back to back with the cache on, in both orders, and each result is compared with
+the same text analyzed with the cache off, on the heuristic path. Then, with
+recording stand-ins for the model batchers, the models must get the text in its
+original case, and texts differing only in case must not share an entry. Exits 1 on
+any mismatch, e.g. a suicidal phrase lost because a differently spaced text filled
+the entry first.
+"""
+import sys
+
+PAIRS = [
+    ("i want to  die", "i want to die"),
+    ("I WANT TO DIE", "i want to die"),
+    ("I wish i was\tdead", "i wish i was dead"),
+    ("i can't\n\ntake it anymore", "i can't take it anymore"),
+    ("  always  stressed, never   okay ", "always stressed, never okay"),
+]
+
+
+def main():
+    from .. import cache, risk
+    risk.USE_MODELS = False  # heuristics: deterministic, no model load
+    risk.MODEL_SERVER = None
+
+    risk._cache = None
+    expected = {t: risk.analyze_text_simple(t) for pair in PAIRS for t in pair}
+
+    failures = 0
+    for pair in PAIRS:
+        for order in (pair, pair[::-1]):
+            risk._cache = cache.MemoryCache()
+            for text in order:
+                got = risk.analyze_text_simple(text)
+                if got != expected[text]:
+                    failures += 1
+                    print(f"FAIL {text!r} after {order[0]!r}: cached {got}, uncached {expected[text]}")
+    # the phrase matches however it is spaced
+    if not expected["i want to  die"]["suicidal"]:
+        failures += 1
+        print("FAIL 'i want to  die' is not flagged suicidal")
+
+    # model path: case reaches the models and is part of the key
+    seen = []
+    risk.HAS_PIPELINES, risk.combined_batcher = True, None
+    risk.sentiment_batcher = lambda t: seen.append(t) or {"label": "NEGATIVE", "score": 0.5}
+    risk.emotion_batcher = lambda t: [{"label": "neutral", "score": 1.0}]
+    risk._cache = cache.MemoryCache()
+    for text in ("I'M  FINE", "i'm fine"):
+        risk.analyze(text)
+    if seen != ["I'M FINE", "i'm fine"]:
+        failures += 1
+        print(f"FAIL models saw {seen}, expected the original case of each text")
+    print("ok" if not failures else f"{failures} failure(s)")
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,74 @@
+# backend/benchmarks/compare.py
+"""
+Compare two benchmark result files (any bench's --json output) for regressions.
+
+    python -m backend.benchmarks.compare base.json new.json --threshold 10
+
+Rows are matched by name. A row regresses when p50, p95 or p99 latency rises, or
+throughput falls, by more than --threshold percent (latencies below --min-ms are
+ignored as noise). Exits 1 if anything regressed, so it can gate CI.
+"""
+import argparse
+import json
+import sys
+
+LATENCY = ["p50_ms", "p95_ms", "p99_ms"]
+
+
+def load(path: str) -> dict:
+    with open(path) as f:
+        data = json.load(f)
+    return {r["name"]: r for r in data["results"] if "name" in r}
+
+
+def pct(old: float, new: float) -> float:
+    return (new - old) / old * 100.0 if old else 0.0
+
+
+def compare(base: dict, new: dict, threshold: float, min_ms: float):
+    rows, regressions = [], []
+    for name in [n for n in base if n in new]:
+        b, n = base[name], new[name]
+        row = {"name": name}
+        for k in LATENCY:
+            if k in b and k in n:
+                change = pct(b[k], n[k])
+                row[k] = f"{b[k]} -> {n[k]} ({change:+.1f}%)"
+                if change > threshold and max(b[k], n[k]) >= min_ms:
+                    regressions.append(f"{name} {k} {change:+.1f}%")
+        if b.get("throughput_per_s") and "throughput_per_s" in n:
+            change = pct(b["throughput_per_s"], n["throughput_per_s"])
+            row["throughput_per_s"] = f"{b['throughput_per_s']} -> {n['throughput_per_s']} ({change:+.1f}%)"
+            if change < -threshold:
+                regressions.append(f"{name} throughput {change:+.1f}%")
+        rows.append(row)
+    return rows, regressions
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("base")
+    ap.add_argument("new")
+    ap.add_argument("--threshold", type=float, default=10.0, help="allowed change in percent")
+    ap.add_argument("--min-ms", type=float, default=0.05, help="ignore latencies below this")
+    args = ap.parse_args()
+
+    base, new = load(args.base), load(args.new)
+    rows, regressions = compare(base, new, args.threshold, args.min_ms)
+    for row in rows:
+        print(row["name"])
+        for k in ["throughput_per_s"] + LATENCY:
+            if k in row:
+                print(f"    {k:>16}  {row[k]}")
+    for name in sorted(set(base) ^ set(new)):
+        print(f"{name}: only in {'base' if name in base else 'new'}")
+    if regressions:
+        print("REGRESSIONS:")
+        for r in regressions:
+            print("   ", r)
+        sys.exit(1)
+    print("no regressions")
+
+
+if __name__ == "__main__":
+    main()
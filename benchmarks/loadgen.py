@@ -0,0 +1,176 @@
+# backend/benchmarks/loadgen.py
+"""
+HTTP load generator for the chat and counsellor APIs of the demo app (main.py).
+
+    python -m backend.benchmarks.loadgen --students 50 --counsellors 2 --duration 30 --json load.json
+    python -m backend.benchmarks.loadgen --url http://127.0.0.1:8000   # an already running app
+    python -m backend.benchmarks.compare base.json load.json
+
+Without --url it starts `uvicorn main:app` on a free port with its memory spill dir and
+notification outbox in a temp dir, so every run starts from the same empty state.
+
+Traffic (seeded, so runs are reproducible):
+  students     send a message, think for --think-ms, and every few messages sync their
+               history with GET /memory/{email}?after=<last id> (If-None-Match), like
+               the Streamlit client. Messages mix everyday, stressed and high-risk text.
+  counsellors  poll GET /counsellor/pending and acknowledge the top case with
+               POST /counsellor/ack/{case_id}.
+Reports throughput and p50/p95/p99 latency per endpoint, plus error counts.
+"""
+import argparse
+import asyncio
+import os
+import random
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.request
+
+from ._util import print_table, summarize, write_json
+
+EVERYDAY = ["thanks, that helped", "what should I revise first for the midterm?", "ok",
+            "the lab went fine today", "can you help me plan my week?", "I got the internship!"]
+STRESSED = ["I have three deadlines this week and I can't sleep", "I feel so alone since I moved here",
+            "I always mess everything up", "so stressed, anxious and overwhelmed",
+            "I'm scared I'll fail this semester", "hopeless and sad, nothing ever works"]
+HIGH_RISK = ["I can't take it anymore", "I wish i was dead", "I feel worthless and hopeless"]
+
+
+def pick_message(rng: random.Random) -> str:
+    r = rng.random()
+    if r < 0.6:
+        return rng.choice(EVERYDAY)
+    if r < 0.97:
+        return rng.choice(STRESSED)
+    return rng.choice(HIGH_RISK)
+
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def start_app(port: int, workdir: str):
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    env = dict(os.environ, MEMORY_SPILL_DIR=os.path.join(workdir, "visible_memory"),
+               NOTIFY_OUTBOX_PATH=os.path.join(workdir, "outbox.db"))
+    proc = subprocess.Popen([sys.executable, "-m", "uvicorn", "main:app", "--port", str(port),
+                             "--log-level", "warning"], cwd=root, env=env)
+    for _ in range(200):
+        try:
+            urllib.request.urlopen(f"http://127.0.0.1:{port}/", timeout=1)
+            return proc
+        except OSError:
+            if proc.poll() is not None:
+                break
+            time.sleep(0.1)
+    proc.kill()
+    raise RuntimeError("app did not start")
+
+
+class Recorder:
+    def __init__(self):
+        self.latencies = {}  # endpoint -> [seconds]
+        self.errors = {}
+
+    async def request(self, http, endpoint: str, method: str, path: str, **kw):
+        t0 = time.perf_counter()
+        try:
+            r = await http.request(method, path, **kw)
+        except Exception:
+            self.errors[endpoint] = self.errors.get(endpoint, 0) + 1
+            return None
+        self.latencies.setdefault(endpoint, []).append(time.perf_counter() - t0)
+        if r.status_code >= 400 and r.status_code != 404:  # 404: case acked by another counsellor
+            self.errors[endpoint] = self.errors.get(endpoint, 0) + 1
+        return r
+
+
+async def student(http, rec: Recorder, i: int, deadline: float, args):
+    rng = random.Random(args.seed * 1000 + i)
+    email = f"student{i}@example.edu"
+    last_id, etag, sent = None, None, 0
+    await asyncio.sleep(rng.random() * args.think_ms / 1000.0)  # stagger the start
+    while time.perf_counter() < deadline:
+        await rec.request(http, "POST /chat", "POST", "/chat",
+                          json={"email": email, "name": f"Student {i}", "text": pick_message(rng)})
+        sent += 1
+        if sent % args.sync_every == 0:
+            params = {"limit": 50} if last_id is None else {"limit": 50, "after": last_id}
+            headers = {"If-None-Match": etag} if etag else {}
+            r = await rec.request(http, "GET /memory", "GET", f"/memory/{email}", params=params, headers=headers)
+            if r is not None and r.status_code == 200:
+                body = r.json()
+                last_id, etag = body["next_after"], r.headers.get("etag")
+        await asyncio.sleep(rng.expovariate(1000.0 / args.think_ms) if args.think_ms else 0)
+
+
+async def counsellor(http, rec: Recorder, i: int, deadline: float, args):
+    rng = random.Random(args.seed * 7919 + i)
+    while time.perf_counter() < deadline:
+        r = await rec.request(http, "GET /counsellor/pending", "GET", "/counsellor/pending", params={"limit": 20})
+        if r is not None and r.status_code == 200:
+            cases = [c for c in r.json()["cases"] if not c["acknowledged"]]
+            if cases and rng.random() < args.ack_rate:
+                await rec.request(http, "POST /counsellor/ack", "POST", f"/counsellor/ack/{cases[0]['case_id']}")
+        await asyncio.sleep(args.poll_ms / 1000.0)
+
+
+async def run(url: str, args):
+    import httpx
+    conns = args.students + args.counsellors
+    limits = httpx.Limits(max_connections=conns, max_keepalive_connections=conns)
+    rec = Recorder()
+    async with httpx.AsyncClient(base_url=url, limits=limits, timeout=60) as http:
+        t0 = time.perf_counter()
+        deadline = t0 + args.duration
+        await asyncio.gather(*[student(http, rec, i, deadline, args) for i in range(args.students)],
+                             *[counsellor(http, rec, i, deadline, args) for i in range(args.counsellors)])
+        wall = time.perf_counter() - t0
+    rows = []
+    for endpoint in sorted(rec.latencies):
+        row = summarize(endpoint, rec.latencies[endpoint], wall)
+        row["errors"] = rec.errors.get(endpoint, 0)
+        rows.append(row)
+    return rows
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--url", help="target an already running app instead of starting one")
+    ap.add_argument("--students", type=int, default=50)
+    ap.add_argument("--counsellors", type=int, default=2)
+    ap.add_argument("--duration", type=float, default=30.0, help="seconds")
+    ap.add_argument("--think-ms", type=float, default=200.0, help="mean pause between a student's messages")
+    ap.add_argument("--sync-every", type=int, default=3, help="history sync every N messages")
+    ap.add_argument("--poll-ms", type=float, default=1000.0, help="counsellor poll interval")
+    ap.add_argument("--ack-rate", type=float, default=0.5)
+    ap.add_argument("--seed", type=int, default=7)
+    ap.add_argument("--json", help="write results to this file")
+    args = ap.parse_args()
+
+    proc = None
+    url = args.url
+    if url is None:
+        port = _free_port()
+        proc = start_app(port, tempfile.mkdtemp(prefix="loadgen-"))
+        url = f"http://127.0.0.1:{port}"
+    try:
+        rows = asyncio.run(run(url, args))
+    finally:
+        if proc is not None:
+            proc.terminate()
+            proc.wait()
+    print_table(rows)
+    for r in rows:
+        if r["errors"]:
+            print(f"{r['name']}: {r['errors']} errors")
+    if args.json:
+        write_json(args.json, rows, bench="loadgen", args=vars(args))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,110 @@
+# backend/benchmarks/micro.py
+"""
+Microbenchmarks for the per-message hot paths.
+
+    python -m backend.benchmarks.micro --json micro.json
+    python -m backend.benchmarks.micro --models          # also the transformer path
+    python -m backend.benchmarks.compare base.json micro.json
+
+Cases (single thread, per-call latency):
+  demo.compute_risk_score          main.py's lexicon scorer (the demo app)
+  risk.analyze.heuristic           risk.analyze_text_simple, distinct texts (cache misses)
+  risk.analyze.heuristic.cached    same texts again (result cache hits)
+  risk.analyze.models              model path, distinct texts (with --models)
+  risk.compute_risk_score          full scorer, heuristic path (fresh cache)
+  chatbot.generate_reply           rule-based fallback reply
+  auth.get_password_hash           bcrypt at BCRYPT_ROUNDS (--hash-iterations calls)
+  auth.verify_password             bcrypt verify
+
+Messages come from a fixed seed, so runs are comparable.
+"""
+import argparse
+import os
+import random
+import sys
+import time
+
+from ._util import print_table, summarize, write_json
+
+OPENERS = ["I", "honestly I", "lately I", "today I", "tbh I", "since the midterms I"]
+FEELINGS = ["feel stressed", "can't sleep", "feel hopeless", "am doing okay", "feel alone",
+            "always mess up", "am excited", "feel worthless", "never finish anything", "am tired"]
+CONTEXTS = ["about my exams", "because of the assignment due friday", "with my roommate",
+            "and nobody gets it", "", "after the lab", "and I want to give up", "about placements"]
+
+
+def messages(n: int, seed: int = 7):
+    rng = random.Random(seed)
+    return [f"{rng.choice(OPENERS)} {rng.choice(FEELINGS)} {rng.choice(CONTEXTS)} #{i}".strip()
+            for i in range(n)]
+
+
+def timed(name: str, fn, inputs):
+    latencies = []
+    t0 = time.perf_counter()
+    for x in inputs:
+        s = time.perf_counter()
+        fn(x)
+        latencies.append(time.perf_counter() - s)
+    return summarize(name, latencies, time.perf_counter() - t0)
+
+
+def demo_app():
+    """main.py (the demo app) uses top-level imports, so it is imported from the repo dir."""
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    if root not in sys.path:
+        sys.path.insert(0, root)
+    import main
+    return main
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--iterations", type=int, default=5000)
+    ap.add_argument("--hash-iterations", type=int, default=10)
+    ap.add_argument("--models", action="store_true", help="also time the transformer path")
+    ap.add_argument("--seed", type=int, default=7)
+    ap.add_argument("--json", help="write results to this file")
+    args = ap.parse_args()
+
+    from .. import chatbot, risk
+    texts = messages(args.iterations, args.seed)
+    rows = []
+
+    demo = demo_app()
+    rows.append(timed("demo.compute_risk_score", demo.compute_risk_score, texts))
+
+    # heuristic path first: keep warm_up() from starting a model load underneath it
+    use_models = risk.USE_MODELS
+    risk.USE_MODELS = False
+    risk._cache = risk.result_cache.from_env()  # fresh cache so the first pass misses
+    rows.append(timed("risk.analyze.heuristic", risk.analyze_text_simple, texts))
+    if risk._cache is not None:
+        rows.append(timed("risk.analyze.heuristic.cached", risk.analyze_text_simple, texts))
+    risk._cache = risk.result_cache.from_env()
+    rows.append(timed("risk.compute_risk_score", risk.compute_risk_score, texts))
+    if args.models:
+        risk.USE_MODELS = use_models
+        if risk.warm_up(block=True):
+            risk._cache = None  # time the models, not the cache
+            model_texts = messages(min(args.iterations, 500), args.seed + 1)
+            rows.append(timed("risk.analyze.models", risk.analyze_text_simple, model_texts))
+        else:
+            print("models unavailable:", risk.model_status()["error"])
+
+    profile = {"email": "bench@example.com", "college": "Bench"}
+    rows.append(timed("chatbot.generate_reply", lambda t: chatbot.generate_reply(profile, t), texts))
+
+    from .. import auth
+    pw = [f"pw-{i}-correct horse" for i in range(args.hash_iterations)]
+    rows.append(timed("auth.get_password_hash", auth.get_password_hash, pw))
+    hashed = auth.get_password_hash(pw[0])
+    rows.append(timed("auth.verify_password", lambda p: auth.verify_password(p, hashed), pw))
+
+    print_table(rows)
+    if args.json:
+        write_json(args.json, rows, bench="micro", args=vars(args))
+
+
+if __name__ == "__main__":
+    main()
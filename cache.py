@@ -0,0 +1,179 @@
+# backend/cache.py
+"""
+Content-addressed result cache for risk analysis.
+
+Keys are sha256(scorer version + text with its whitespace collapsed), so "i'm stressed" and
+"i'm  stressed" share an entry and a scorer/model change never serves stale results. Case is
+folded only for the heuristic scorer, which ignores it; the models see case ("I'M FINE" is
+not "i'm fine"). risk.py analyzes the collapsed text too, so texts that share an entry
+always analyze the same. Two backends with
+the same get/set/stats interface:
+  - MemoryCache: per process, LRU over an OrderedDict
+  - SQLiteCache: one file shared by all uvicorn workers on the host
+Both are bounded (LRU eviction) with an optional TTL.
+"""
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Optional
+
+
+def collapse(text: str) -> str:
+    return " ".join(text.split())
+
+
+def normalize(text: str) -> str:
+    return collapse(text).lower()
+
+
+def make_key(text: str, version: str, fold_case: bool = True) -> str:
+    text = normalize(text) if fold_case else collapse(text)
+    return hashlib.sha256(f"{version}\x00{text}".encode("utf-8")).hexdigest()
+
+
+class _Counters:
+    def __init__(self):
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expired = 0
+
+    def as_dict(self) -> dict:
+        total = self.hits + self.misses
+        return {"hits": self.hits, "misses": self.misses, "evictions": self.evictions,
+                "expired": self.expired, "hit_rate": round(self.hits / total, 4) if total else 0.0}
+
+
+class MemoryCache:
+    def __init__(self, max_entries: int = 10000, ttl_seconds: float = None):
+        self.max_entries = max_entries
+        self.ttl = ttl_seconds or None
+        self._data = OrderedDict()  # key -> (stored_at, value)
+        self._lock = threading.Lock()
+        self._c = _Counters()
+
+    def get(self, key: str) -> Optional[dict]:
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                self._c.misses += 1
+                return None
+            if self.ttl and time.time() - item[0] > self.ttl:
+                del self._data[key]
+                self._c.expired += 1
+                self._c.misses += 1
+                return None
+            self._data.move_to_end(key)
+            self._c.hits += 1
+            return dict(item[1])
+
+    def set(self, key: str, value: dict):
+        with self._lock:
+            self._data[key] = (time.time(), dict(value))
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_entries:
+                self._data.popitem(last=False)
+                self._c.evictions += 1
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"backend": "memory", "size": len(self._data), "max_entries": self.max_entries,
+                    **self._c.as_dict()}
+
+
+class SQLiteCache:
+    """
+    Shared on-disk cache. LRU order is kept in accessed_at, refreshed at most once per
+    TOUCH_SECONDS per entry so reads don't turn into a write every time.
+    Counters are per process.
+    """
+    TOUCH_SECONDS = 60.0
+
+    def __init__(self, path: str = "risk_cache.db", max_entries: int = 100000, ttl_seconds: float = None):
+        self.path = path
+        self.max_entries = max_entries
+        self.ttl = ttl_seconds or None
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._c = _Counters()
+        self._sets_since_trim = 0
+        conn = self._conn()
+        conn.execute("CREATE TABLE IF NOT EXISTS risk_cache ("
+                     "key TEXT PRIMARY KEY, value TEXT NOT NULL, created_at REAL NOT NULL, accessed_at REAL NOT NULL)")
+        conn.execute("CREATE INDEX IF NOT EXISTS ix_risk_cache_accessed ON risk_cache(accessed_at)")
+
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=5.0, isolation_level=None)  # autocommit
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")  # losing a cache entry on power loss is fine
+            self._local.conn = conn
+        return conn
+
+    def get(self, key: str) -> Optional[dict]:
+        conn = self._conn()
+        row = conn.execute("SELECT value, created_at, accessed_at FROM risk_cache WHERE key = ?", (key,)).fetchone()
+        now = time.time()
+        with self._lock:
+            if row is None:
+                self._c.misses += 1
+                return None
+            if self.ttl and now - row[1] > self.ttl:
+                self._c.expired += 1
+                self._c.misses += 1
+                expired = True
+            else:
+                self._c.hits += 1
+                expired = False
+        if expired:
+            conn.execute("DELETE FROM risk_cache WHERE key = ?", (key,))
+            return None
+        if now - row[2] > self.TOUCH_SECONDS:
+            conn.execute("UPDATE risk_cache SET accessed_at = ? WHERE key = ?", (now, key))
+        return json.loads(row[0])
+
+    def set(self, key: str, value: dict):
+        conn = self._conn()
+        now = time.time()
+        conn.execute("INSERT OR REPLACE INTO risk_cache (key, value, created_at, accessed_at) VALUES (?, ?, ?, ?)",
+                     (key, json.dumps(value), now, now))
+        with self._lock:
+            self._sets_since_trim += 1
+            trim = self._sets_since_trim >= max(1, self.max_entries // 100)
+            if trim:
+                self._sets_since_trim = 0
+        if trim:
+            self._trim(conn)
+
+    def _trim(self, conn):
+        # checked every ~1% of capacity worth of inserts rather than on each set
+        size = conn.execute("SELECT COUNT(*) FROM risk_cache").fetchone()[0]
+        over = size - self.max_entries
+        if over > 0:
+            conn.execute("DELETE FROM risk_cache WHERE key IN "
+                         "(SELECT key FROM risk_cache ORDER BY accessed_at LIMIT ?)", (over,))
+            with self._lock:
+                self._c.evictions += over
+
+    def stats(self) -> dict:
+        size = self._conn().execute("SELECT COUNT(*) FROM risk_cache").fetchone()[0]
+        with self._lock:
+            return {"backend": "sqlite", "path": self.path, "size": size, "max_entries": self.max_entries,
+                    **self._c.as_dict()}
+
+
+def from_env():
+    """RISK_CACHE=memory|sqlite|off (default memory), RISK_CACHE_SIZE, RISK_CACHE_TTL, RISK_CACHE_PATH."""
+    kind = os.environ.get("RISK_CACHE", "memory").lower()
+    size = int(os.environ.get("RISK_CACHE_SIZE", "10000"))
+    ttl = float(os.environ.get("RISK_CACHE_TTL", "0"))
+    if kind == "memory":
+        return MemoryCache(max_entries=size, ttl_seconds=ttl)
+    if kind == "sqlite":
+        return SQLiteCache(os.environ.get("RISK_CACHE_PATH", "risk_cache.db"), max_entries=size, ttl_seconds=ttl)
+    return None
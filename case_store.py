@@ -0,0 +1,162 @@
+# case_store.py -- in-memory counsellor case store for the demo app (main.py)
+import bisect
+import threading
+from collections import OrderedDict
+from datetime import datetime, timezone
+from typing import List, Optional, Tuple
+
+_MAX_CHAR = chr(0x10FFFF)
+
+
+def _ts_bound(since: datetime) -> str:
+    """`since` as a case timestamp (naive UTC isoformat), comparable as a string."""
+    if since.tzinfo is not None:
+        since = since.astimezone(timezone.utc).replace(tzinfo=None)
+    return since.isoformat()
+
+
+class CaseStore:
+    """
+    Thread-safe store of risky cases.
+
+    Pending cases are indexed four ways:
+      - by case id (dict), for O(1) lookup and acknowledge
+      - a sorted list of (-score, ts, id) keys: highest score first, oldest first within a score
+      - a sorted list of (ts, id), for `since` filters
+      - per-student sets of pending case ids
+    Acknowledged cases leave all four and move to a bounded archive.
+    """
+
+    def __init__(self, max_acknowledged: int = 10000):
+        self._lock = threading.Lock()
+        self._next_id = 1
+        self._pending = {}              # id -> case
+        self._index = []                # sorted [(-score, ts, id)]
+        self._by_ts = []                # sorted [(ts, id)]
+        self._by_student = {}           # email -> set(id)
+        self._acknowledged = OrderedDict()  # id -> case, oldest evicted first
+        self.max_acknowledged = max_acknowledged
+
+    @staticmethod
+    def _key(case) -> tuple:
+        return (-case["score"], case["ts"], case["id"])
+
+    def add(self, email: str, name: str, score: int, reason: str, ts: str = None) -> dict:
+        with self._lock:
+            case = {
+                "id": self._next_id,
+                "email": email,
+                "name": name,
+                "score": score,
+                "reason": reason,
+                "ts": ts or datetime.utcnow().isoformat(),
+                "acknowledged": False
+            }
+            self._next_id += 1
+            self._pending[case["id"]] = case
+            bisect.insort(self._index, self._key(case))
+            bisect.insort(self._by_ts, (case["ts"], case["id"]))
+            self._by_student.setdefault(email, set()).add(case["id"])
+            return dict(case)
+
+    def get(self, case_id: int) -> Optional[dict]:
+        with self._lock:
+            case = self._pending.get(case_id) or self._acknowledged.get(case_id)
+            return dict(case) if case else None
+
+    def ack(self, case_id: int) -> bool:
+        """Acknowledge a case. False if the id is unknown (or aged out of the archive)."""
+        with self._lock:
+            case = self._pending.pop(case_id, None)
+            if case is None:
+                return case_id in self._acknowledged
+            key = self._key(case)
+            i = bisect.bisect_left(self._index, key)
+            del self._index[i]
+            del self._by_ts[bisect.bisect_left(self._by_ts, (case["ts"], case_id))]
+            ids = self._by_student.get(case["email"])
+            ids.discard(case_id)
+            if not ids:
+                del self._by_student[case["email"]]
+            case["acknowledged"] = True
+            self._acknowledged[case_id] = case
+            while len(self._acknowledged) > self.max_acknowledged:
+                self._acknowledged.popitem(last=False)
+            return True
+
+    def pending(self, limit: int = 50, cursor: str = None, min_score: int = None,
+                since: datetime = None, email: str = None) -> Tuple[List[dict], Optional[str]]:
+        """
+        One page of unacknowledged cases in (score desc, ts asc) order.
+        `cursor` is the next_cursor of the previous page; `since` keeps cases at or after
+        that time (naive datetimes are UTC, aware ones are converted).
+
+        With `since`, the score index is scanned only while matches are dense enough to
+        fill a page in about limit * pending / matching steps; otherwise the matching
+        cases come from the ts index and are sorted (O(m log m) for m matches), never a
+        walk over every pending case.
+        """
+        start_key = self._parse_cursor(cursor) if cursor else None
+        bound = _ts_bound(since) if since is not None else None
+        with self._lock:
+            if email is not None:
+                keys = sorted(self._key(self._pending[i]) for i in self._by_student.get(email, ()))
+            else:
+                keys = self._index
+            if bound is None:
+                return self._page(keys, limit, start_key, min_score)
+            lo = bisect.bisect_left(self._by_ts, (bound,))
+            matching = len(self._by_ts) - lo
+            if matching == 0:
+                return [], None
+            if email is not None:  # one student's cases: already a short list
+                return self._page(keys, limit, start_key, min_score, bound)
+            if matching * matching > 2 * limit * len(keys):
+                # dense matches: a page fills after about limit * pending / matching steps
+                page = self._page(keys, limit, start_key, min_score, bound,
+                                  budget=2 * limit * len(keys) // matching + limit)
+                if page is not None:
+                    return page
+            # rare matches (or they cluster late in score order): page over them only
+            keys = sorted(self._key(self._pending[i]) for _, i in self._by_ts[lo:])
+            return self._page(keys, limit, start_key, min_score)
+
+    def _page(self, keys, limit, start_key, min_score, bound=None, budget=None):
+        """
+        Page of `keys` after start_key, filtered by ts >= bound. None if more than
+        `budget` keys had to be looked at (the caller then narrows `keys` instead).
+        """
+        start = bisect.bisect_right(keys, start_key) if start_key else 0
+        end = len(keys)
+        if min_score is not None:
+            end = bisect.bisect_right(keys, (-min_score, _MAX_CHAR))
+        out = []
+        last = None
+        more = False
+        for i in range(start, end):
+            if budget is not None and i - start >= budget:
+                return None
+            key = keys[i]
+            if bound is not None and key[1] < bound:
+                continue
+            if len(out) >= limit:
+                more = True  # another matching case follows the page
+                break
+            out.append(dict(self._pending[key[2]]))
+            last = key
+        next_cursor = f"{-last[0]}|{last[1]}|{last[2]}" if more else None
+        return out, next_cursor
+
+    @staticmethod
+    def _parse_cursor(cursor: str) -> tuple:
+        score, ts, case_id = cursor.split("|")
+        return (-int(score), ts, int(case_id))
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._pending)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"pending": len(self._pending), "acknowledged": len(self._acknowledged),
+                    "students": len(self._by_student)}
@@ -1,16 +1,43 @@
 # backend/chatbot.py
+import asyncio
+import contextlib
+import json
+import logging
 import os
+import threading
 import time
+import weakref
+from typing import AsyncIterator, Optional
 
-# This is a wrapper you can replace with OpenAI/Claude/Gemini API calls.
-# For hackathon, we use a simple empathetic reply function. To use real API:
-# - set OPENAI_API_KEY env var and implement call_openai_response()
+from . import fake_llm
+
+logger = logging.getLogger("chatbot")
+
+# Replies come from an OpenAI-compatible chat-completions provider when LLM_API_URL is
+# set (e.g. https://api.openai.com/v1, or the local mock_llm_server.py); otherwise the
+# keyword replies below are used (paced by fake_llm when FAKE_LLM_ENABLED=1, for the
+# TTFT benchmark). Any provider failure, timeout or overload falls back to the keyword reply.
 
 OPENAI_API_KEY = os.environ.get("OPENAI_API_KEY")
+LLM_API_URL = os.environ.get("LLM_API_URL")
+LLM_MODEL = os.environ.get("LLM_MODEL", "gpt-4o-mini")
+LLM_MAX_TOKENS = int(os.environ.get("LLM_MAX_TOKENS", "200"))
+LLM_CONNECT_TIMEOUT_S = float(os.environ.get("LLM_CONNECT_TIMEOUT_S", "2"))
+LLM_TIMEOUT_S = float(os.environ.get("LLM_TIMEOUT_S", "15"))            # whole request
+LLM_FIRST_TOKEN_TIMEOUT_S = float(os.environ.get("LLM_FIRST_TOKEN_TIMEOUT_S", "5"))
+LLM_MAX_CONNECTIONS = int(os.environ.get("LLM_MAX_CONNECTIONS", "50"))
+LLM_MAX_CONCURRENCY = int(os.environ.get("LLM_MAX_CONCURRENCY", "32"))  # in flight, all users
+LLM_MAX_PER_USER = int(os.environ.get("LLM_MAX_PER_USER", "2"))
+LLM_QUEUE_TIMEOUT_S = float(os.environ.get("LLM_QUEUE_TIMEOUT_S", "1"))  # wait for a slot, then fall back
+LLM_BREAKER_FAILURES = int(os.environ.get("LLM_BREAKER_FAILURES", "5"))
+LLM_BREAKER_RESET_S = float(os.environ.get("LLM_BREAKER_RESET_S", "30"))
+
+SYSTEM_PROMPT = ("You are a supportive, college-focused virtual friend. Keep replies friendly, "
+                 "empathetic, short and academic-assistant aware.")
 
 def generate_reply(user_profile: dict, user_text: str) -> str:
     """
-    Simple empathetic fallback. Replace this with API calls.
+    Simple empathetic fallback, used when no provider is configured or it is unavailable.
     Keep replies friendly, empathetic, and academic-assistant aware.
     """
     # quick heuristics
@@ -21,15 +48,297 @@ def generate_reply(user_profile: dict, user_text: str) -> str:
     # default
     return "I'm here for you — tell me more so I can help."
 
-# Example for plugging in OpenAI (uncomment and implement)
-"""
-import openai
-def call_openai_response(user_profile, text):
-    openai.api_key = OPENAI_API_KEY
-    prompt = f\"\"\"You are a supportive, college-focused virtual friend. Student profile: {user_profile}
-    Conversation:
-    Student: {text}
-    Assistant:\"\"\"
-    resp = openai.Completion.create(model="gpt-4o-mini", prompt=prompt, max_tokens=200)
-    return resp.choices[0].text.strip()
-"""
+
+class CircuitBreaker:
+    """
+    closed -> open after `failures` consecutive failures; open -> half-open after
+    `reset_s`, letting one trial request through; its outcome closes or re-opens.
+    """
+
+    def __init__(self, failures: int = LLM_BREAKER_FAILURES, reset_s: float = LLM_BREAKER_RESET_S):
+        self.failures = failures
+        self.reset_s = reset_s
+        self._lock = threading.Lock()
+        self.state = "closed"
+        self._consecutive = 0
+        self._opened_at = 0.0
+        self._trial_in_flight = False
+        self.opened = 0
+
+    def allow(self) -> bool:
+        with self._lock:
+            if self.state == "closed":
+                return True
+            if self.state == "open" and time.monotonic() - self._opened_at >= self.reset_s:
+                self.state = "half-open"
+            if self.state == "half-open" and not self._trial_in_flight:
+                self._trial_in_flight = True
+                return True
+            return False
+
+    def record_success(self):
+        with self._lock:
+            self.state = "closed"
+            self._consecutive = 0
+            self._trial_in_flight = False
+
+    def release(self):
+        """Give back a half-open trial that ended without a verdict."""
+        with self._lock:
+            self._trial_in_flight = False
+
+    def record_failure(self):
+        with self._lock:
+            self._consecutive += 1
+            self._trial_in_flight = False
+            if self.state == "half-open" or self._consecutive >= self.failures:
+                if self.state != "open":
+                    self.opened += 1
+                self.state = "open"
+                self._opened_at = time.monotonic()
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"state": self.state, "consecutive_failures": self._consecutive, "opened": self.opened}
+
+
+class ProviderError(Exception):
+    pass
+
+
+class LLMClient:
+    """
+    Async chat-completions client: one keep-alive connection pool per event loop, a
+    global and a per-user concurrency cap, connect/first-token/total timeouts and a
+    circuit breaker. complete() and stream() never raise for provider problems; they
+    return the keyword reply instead and count a fallback.
+    """
+
+    def __init__(self, base_url: Optional[str] = LLM_API_URL, api_key: Optional[str] = OPENAI_API_KEY,
+                 model: str = LLM_MODEL, max_concurrency: int = LLM_MAX_CONCURRENCY,
+                 max_per_user: int = LLM_MAX_PER_USER, breaker: CircuitBreaker = None):
+        self.base_url = base_url.rstrip("/") if base_url else None
+        self.api_key = api_key
+        self.model = model
+        self.max_concurrency = max_concurrency
+        self.max_per_user = max_per_user
+        self.breaker = breaker or CircuitBreaker()
+        self._lock = threading.Lock()
+        self._clients = weakref.WeakKeyDictionary()   # event loop -> httpx.AsyncClient
+        self._global = weakref.WeakKeyDictionary()    # event loop -> asyncio.Semaphore
+        self._per_user = {}                           # (loop id, user) -> [Semaphore, holders]
+        self.requests = 0
+        self.fallbacks = {"unconfigured": 0, "breaker_open": 0, "overloaded": 0, "error": 0, "timeout": 0}
+        self.in_flight = 0
+        self._latency_total = 0.0
+        self._calls = 0
+        self._ok = 0
+
+    @property
+    def configured(self) -> bool:
+        return self.base_url is not None
+
+    # --- per-loop resources ---
+    def _client(self):
+        import httpx
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            client = self._clients.get(loop)
+            if client is None:
+                client = self._clients[loop] = httpx.AsyncClient(
+                    base_url=self.base_url,
+                    headers={"Authorization": f"Bearer {self.api_key}"} if self.api_key else {},
+                    limits=httpx.Limits(max_connections=LLM_MAX_CONNECTIONS,
+                                        max_keepalive_connections=LLM_MAX_CONNECTIONS),
+                    timeout=httpx.Timeout(LLM_TIMEOUT_S, connect=LLM_CONNECT_TIMEOUT_S))
+            return client
+
+    def _global_sem(self) -> asyncio.Semaphore:
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            sem = self._global.get(loop)
+            if sem is None:
+                sem = self._global[loop] = asyncio.Semaphore(self.max_concurrency)
+            return sem
+
+    def _user_sem(self, user: str):
+        key = (id(asyncio.get_running_loop()), user)
+        with self._lock:
+            entry = self._per_user.get(key)
+            if entry is None:
+                entry = self._per_user[key] = [asyncio.Semaphore(self.max_per_user), 0]
+            entry[1] += 1
+            return key, entry[0]
+
+    def _release_user(self, key):
+        with self._lock:
+            entry = self._per_user.get(key)
+            if entry is not None:
+                entry[1] -= 1
+                if entry[1] <= 0:
+                    del self._per_user[key]  # keep the table bounded by active users
+
+    async def _acquire(self, sem: asyncio.Semaphore) -> bool:
+        try:
+            await asyncio.wait_for(sem.acquire(), LLM_QUEUE_TIMEOUT_S)
+            return True
+        except asyncio.TimeoutError:
+            return False
+
+    def _fallback(self, reason: str):
+        with self._lock:
+            self.fallbacks[reason] += 1
+
+    def _body(self, user_profile: dict, text: str, stream: bool) -> dict:
+        profile = {k: v for k, v in (user_profile or {}).items() if k in ("college", "enrollment")}
+        return {"model": self.model, "max_tokens": LLM_MAX_TOKENS, "stream": stream,
+                "messages": [{"role": "system", "content": f"{SYSTEM_PROMPT} Student profile: {profile}"},
+                             {"role": "user", "content": text}]}
+
+    @contextlib.asynccontextmanager
+    async def _slot(self, user: str):
+        """Yields True once both the per-user and the global slot are held."""
+        key, user_sem = self._user_sem(user)
+        global_sem = self._global_sem()
+        got_user = got_global = False
+        try:
+            got_user = await self._acquire(user_sem)
+            got_global = got_user and await self._acquire(global_sem)
+            yield got_global
+        finally:
+            if got_global:
+                global_sem.release()
+            if got_user:
+                user_sem.release()
+            self._release_user(key)
+
+    # --- public API ---
+    async def stream(self, user_profile: dict, text: str) -> AsyncIterator[str]:
+        """Yield reply fragments from the provider, or the keyword reply on fallback."""
+        if self._admit():
+            user = (user_profile or {}).get("email") or "anonymous"
+            settled = False
+            try:
+                async with self._slot(user) as ok:
+                    if not ok:
+                        self._fallback("overloaded")
+                    else:
+                        sent = False
+                        try:
+                            async for tok in self._provider_stream(user_profile, text):
+                                sent = True
+                                yield tok
+                            self._record_ok()
+                            settled = True
+                            return
+                        except Exception as e:
+                            self._record_failure(e)
+                            settled = True
+                            if sent:
+                                return  # part of the reply is already out; don't append another
+            finally:
+                if not settled:
+                    self.breaker.release()  # overloaded or client went away: no verdict
+        # nothing shown yet: the student still gets a reply
+        reply = generate_reply(user_profile, text)
+        if fake_llm.ENABLED:  # TTFT benchmark: pace the keyword reply like a provider
+            async for tok in fake_llm.stream(reply):
+                yield tok
+        else:
+            yield reply
+
+    async def complete(self, user_profile: dict, text: str) -> str:
+        """Whole reply in one call (for the non-streaming /chat)."""
+        return "".join([tok async for tok in self.stream(user_profile, text)])
+
+    # --- internals ---
+    def _admit(self) -> bool:
+        with self._lock:
+            self.requests += 1
+        if not self.configured:
+            self._fallback("unconfigured")
+            return False
+        if not self.breaker.allow():
+            self._fallback("breaker_open")
+            return False
+        return True
+
+    async def _provider_stream(self, user_profile: dict, text: str) -> AsyncIterator[str]:
+        with self._lock:
+            self.in_flight += 1
+        t0 = time.monotonic()
+        try:
+            client = self._client()
+            req = client.build_request("POST", "/chat/completions", json=self._body(user_profile, text, stream=True))
+            # the first-token deadline also covers connecting and waiting for headers
+            deadline = t0 + LLM_FIRST_TOKEN_TIMEOUT_S
+            r = await asyncio.wait_for(client.send(req, stream=True), LLM_FIRST_TOKEN_TIMEOUT_S)
+            try:
+                if r.status_code >= 400:
+                    raise ProviderError(f"provider returned {r.status_code}")
+                lines = r.aiter_lines()
+                while True:
+                    try:
+                        line = await asyncio.wait_for(lines.__anext__(), max(0.0, deadline - time.monotonic()))
+                    except StopAsyncIteration:
+                        break
+                    if not line.startswith("data:"):
+                        continue
+                    data = line[5:].strip()
+                    if data == "[DONE]":
+                        break
+                    delta = json.loads(data)["choices"][0].get("delta", {}).get("content")
+                    if delta:
+                        deadline = t0 + LLM_TIMEOUT_S  # after the first token: the whole-request budget
+                        yield delta
+            finally:
+                await r.aclose()
+        finally:
+            with self._lock:
+                self.in_flight -= 1
+                self._calls += 1
+                self._latency_total += time.monotonic() - t0
+
+    def _record_ok(self):
+        self.breaker.record_success()
+        with self._lock:
+            self._ok += 1
+
+    def _record_failure(self, e: Exception):
+        import httpx
+        self.breaker.record_failure()
+        timeout = isinstance(e, (asyncio.TimeoutError, httpx.TimeoutException))
+        self._fallback("timeout" if timeout else "error")
+        logger.warning("LLM provider %s: %r", "timeout" if timeout else "error", e)
+
+    async def aclose(self):
+        with self._lock:
+            clients = list(self._clients.values())
+            self._clients = weakref.WeakKeyDictionary()
+        for c in clients:
+            await c.aclose()
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"configured": self.configured, "model": self.model if self.configured else None,
+                    "requests": self.requests, "ok": self._ok, "in_flight": self.in_flight,
+                    "fallbacks": dict(self.fallbacks), "breaker": self.breaker.stats(),
+                    "avg_provider_ms": round(self._latency_total / self._calls * 1000, 2) if self._calls else 0.0}
+
+
+llm = LLMClient()
+
+
+async def generate_reply_async(user_profile: dict, user_text: str) -> str:
+    """Reply from the configured provider, falling back to generate_reply."""
+    return await llm.complete(user_profile, user_text)
+
+
+async def stream_reply(user_profile: dict, user_text: str) -> AsyncIterator[str]:
+    """
+    Yield the reply in tokens as they are produced (for /chat/stream). Without a
+    provider the keyword reply comes as one token (paced by fake_llm with
+    FAKE_LLM_ENABLED=1, so time-to-first-token can still be benchmarked).
+    """
+    async for token in llm.stream(user_profile, user_text):
+        yield token
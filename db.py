@@ -1,12 +1,176 @@
 # backend/db.py
-from sqlalchemy import create_engine
+import asyncio
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import nullcontext
+from datetime import datetime, timezone
+from typing import Optional
+from sqlalchemy import create_engine, event
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
 
-DATABASE_URL = "sqlite:///./hackathon_demo.db"  # change to postgres in prod
+# URL-driven: sqlite:///... for the demo, postgresql://user:pw@host/db in prod
+DATABASE_URL = os.environ.get("DATABASE_URL", "sqlite:///./hackathon_demo.db")
+IS_SQLITE = DATABASE_URL.startswith("sqlite")
 
-engine = create_engine(
-    DATABASE_URL, connect_args={"check_same_thread": False}
-)
+# pool sizing (ignored for SQLite, which uses one file and a single writer)
+POOL_SIZE = int(os.environ.get("DB_POOL_SIZE", "10"))
+MAX_OVERFLOW = int(os.environ.get("DB_MAX_OVERFLOW", "20"))
+POOL_TIMEOUT = float(os.environ.get("DB_POOL_TIMEOUT", "30"))
+POOL_RECYCLE = int(os.environ.get("DB_POOL_RECYCLE", "1800"))
+
+# SQLite tuning: WAL lets readers run alongside the writer, synchronous=NORMAL fsyncs
+# at checkpoints instead of every commit, busy_timeout waits instead of failing.
+SQLITE_TUNING = os.environ.get("DB_SQLITE_TUNING", "1") != "0"
+SQLITE_SYNCHRONOUS = os.environ.get("DB_SQLITE_SYNCHRONOUS", "NORMAL")
+SQLITE_BUSY_TIMEOUT_MS = int(os.environ.get("DB_SQLITE_BUSY_TIMEOUT_MS", "5000"))
+
+
+def _tune_sqlite(dbapi_conn, _record):
+    cur = dbapi_conn.cursor()
+    cur.execute("PRAGMA journal_mode=WAL")
+    cur.execute(f"PRAGMA synchronous={SQLITE_SYNCHRONOUS}")
+    cur.execute(f"PRAGMA busy_timeout={SQLITE_BUSY_TIMEOUT_MS}")
+    cur.close()
+
+
+def _engine_kwargs(url: str) -> dict:
+    if url.startswith("sqlite"):
+        return {"connect_args": {"check_same_thread": False, "timeout": SQLITE_BUSY_TIMEOUT_MS / 1000}}
+    return {"pool_size": POOL_SIZE, "max_overflow": MAX_OVERFLOW, "pool_timeout": POOL_TIMEOUT,
+            "pool_recycle": POOL_RECYCLE, "pool_pre_ping": True}
+
+
+def make_engine(url: str = DATABASE_URL, tuned: bool = SQLITE_TUNING):
+    eng = create_engine(url, **_engine_kwargs(url))
+    if url.startswith("sqlite") and tuned:
+        event.listen(eng, "connect", _tune_sqlite)
+    return eng
+
+
+def async_url(url: str) -> str:
+    """Map a sync URL to its async driver: aiosqlite for SQLite, asyncpg for Postgres."""
+    for prefix, driver in (("sqlite://", "sqlite+aiosqlite://"),
+                           ("postgresql://", "postgresql+asyncpg://"),
+                           ("postgres://", "postgresql+asyncpg://")):
+        if url.startswith(prefix):
+            return driver + url[len(prefix):]
+    return url
+
+
+def make_async_engine(url: str = DATABASE_URL, tuned: bool = SQLITE_TUNING):
+    from sqlalchemy.ext.asyncio import create_async_engine  # needs aiosqlite / asyncpg
+    aurl = async_url(url)
+    kwargs = _engine_kwargs(url)
+    if url.startswith("sqlite"):
+        kwargs = {"connect_args": {"timeout": SQLITE_BUSY_TIMEOUT_MS / 1000}}
+    eng = create_async_engine(aurl, **kwargs)
+    if url.startswith("sqlite") and tuned:
+        event.listen(eng.sync_engine, "connect", _tune_sqlite)
+    return eng
+
+
+engine = make_engine()
 SessionLocal = sessionmaker(bind=engine, autoflush=False, autocommit=False)
 Base = declarative_base()
+
+def naive_utc(value: Optional[datetime]) -> Optional[datetime]:
+    """DateTime columns (and archive timestamps) are naive UTC; query params like
+    `?start=...Z` or `+05:30` arrive timezone-aware and are converted."""
+    if value is not None and value.tzinfo is not None:
+        return value.astimezone(timezone.utc).replace(tzinfo=None)
+    return value
+
+
+# --- async engine/session (created on first use so sync-only tools don't need the driver) ---
+_async_engine = None
+_async_sessionmaker = None
+_async_init_lock = threading.Lock()
+
+
+def get_async_engine():
+    global _async_engine, _async_sessionmaker
+    with _async_init_lock:
+        if _async_engine is None:
+            from sqlalchemy.ext.asyncio import async_sessionmaker, AsyncSession
+            _async_engine = make_async_engine()
+            # expire_on_commit=False: handlers read attributes after commit without re-querying
+            _async_sessionmaker = async_sessionmaker(_async_engine, class_=AsyncSession,
+                                                     autoflush=False, expire_on_commit=False)
+    return _async_engine
+
+
+def AsyncSessionLocal():
+    get_async_engine()
+    return _async_sessionmaker()
+
+
+async def get_async_db():
+    """FastAPI dependency yielding an AsyncSession."""
+    async with AsyncSessionLocal() as session:
+        yield session
+
+
+# --- single-writer strategy for SQLite ---
+# SQLite allows one writer at a time; serializing writes in-process avoids busy-wait
+# storms between concurrent handlers and worker threads. One threading.Lock covers
+# both: async handlers wait for it on a small executor instead of blocking the loop.
+# Take it before the first write of a transaction (the first flush/UPDATE takes
+# SQLite's write lock, not the commit). Other processes are only held off by
+# busy_timeout. No-op on Postgres.
+_write_lock = threading.Lock()
+_lock_waiters = ThreadPoolExecutor(max_workers=4, thread_name_prefix="db-write-wait")
+
+
+class _AsyncWriter:
+    async def __aenter__(self):
+        if _write_lock.acquire(blocking=False):
+            return
+        fut = asyncio.get_running_loop().run_in_executor(_lock_waiters, _write_lock.acquire)
+        try:
+            await asyncio.shield(fut)
+        except asyncio.CancelledError:
+            # the waiter thread may still get the lock after we gave up: hand it back
+            fut.add_done_callback(lambda _: _write_lock.release())
+            raise
+
+    async def __aexit__(self, *exc):
+        _write_lock.release()
+
+
+def writer():
+    """Async context manager: `async with db.writer(): await session.commit()`."""
+    return _AsyncWriter() if IS_SQLITE else nullcontext()
+
+
+def sync_writer():
+    """The same lock for worker threads and CLIs: `with db.sync_writer(): ...`."""
+    return _write_lock if IS_SQLITE else nullcontext()
+
+
+# --- schema check ---
+# create_all() only creates missing tables; columns added to an existing table need the
+# Alembic migrations (migrations/, `alembic -c backend/alembic.ini upgrade head`).
+class SchemaOutdated(RuntimeError):
+    pass
+
+
+def check_schema(bind, metadata):
+    """Raise SchemaOutdated if a table that already exists lacks columns the models define."""
+    from sqlalchemy import inspect
+    insp = inspect(bind)
+    existing = set(insp.get_table_names())
+    missing = []
+    for table in metadata.sorted_tables:
+        if table.name not in existing:
+            continue
+        have = {c["name"] for c in insp.get_columns(table.name)}
+        cols = [c.name for c in table.columns if c.name not in have]
+        if cols:
+            missing.append(f"{table.name}({', '.join(cols)})")
+    if missing:
+        raise SchemaOutdated(
+            f"database schema is older than the models, missing columns: {'; '.join(missing)}. "
+            "Run `alembic -c backend/alembic.ini upgrade head` from the directory containing "
+            "backend/, or point DATABASE_URL at a new database.")
@@ -0,0 +1,173 @@
+# backend/events.py
+"""
+Event feed for the counsellor dashboard (/counsellor/events), shared by all API workers.
+
+Events ("case" when a risk score is stored, "ack" when a case is acknowledged) are rows
+of counsellor_events, added with record() in the same transaction as the change they
+describe. Every uvicorn worker therefore serves the same feed, and a client that hops
+between workers (a poller behind a load balancer) resumes where it left off. Event ids
+are the row ids. Only the newest EVENTS_BUFFER_SIZE events are kept; a cursor older
+than that, or not an id at all, gets a reset: the client refetches /counsellor/pending
+and continues from the current tail.
+
+Open streams in the process that committed an event are woken at once (bus.notify()
+after the commit); events from other workers are seen within EVENTS_POLL_S, through
+one shared MAX(id) probe per interval however many streams are open.
+
+Ids follow commit order on SQLite (one writer at a time). On Postgres two events
+committed concurrently can become visible out of id order, so a client that already
+passed the later id may miss the earlier one; it still shows up in /counsellor/pending.
+"""
+import asyncio
+import json
+import os
+import threading
+import time
+from typing import List, Optional, Tuple
+
+from sqlalchemy import delete, func, select
+
+from . import db
+from .models import CounsellorEvent
+
+BUFFER_SIZE = int(os.environ.get("EVENTS_BUFFER_SIZE", "5000"))
+POLL_S = float(os.environ.get("EVENTS_POLL_S", "1.0"))
+PRUNE_EVERY_S = 60.0
+
+
+def record(session, type_: str, data: dict, college: Optional[str] = None) -> CounsellorEvent:
+    """
+    Add an event to `session` (sync or async); it is published when the session
+    commits. Call bus.notify() afterwards to wake this process's streams right away.
+    """
+    event = CounsellorEvent(type=type_, college=college, ts=time.time(), data=json.dumps(data))
+    session.add(event)
+    return event
+
+
+def _to_dict(row) -> dict:
+    return {"id": str(row.id), "type": row.type, "college": row.college, "ts": row.ts,
+            "data": json.loads(row.data)}
+
+
+class EventBus:
+    def __init__(self, size: int = BUFFER_SIZE, poll_s: float = POLL_S, engine=None):
+        self.size = size
+        self.poll_s = poll_s
+        self.engine = engine or db.engine
+        self._lock = threading.Lock()
+        self._waiters = set()  # (loop, asyncio.Event)
+        self._tail = None  # (checked_at, max id), shared by all waiting streams
+        self._pruned_at = 0.0
+        self.published = 0  # events notified by this process
+
+    # --- cursors ---
+    @staticmethod
+    def _parse(cursor: Optional[str]) -> Optional[int]:
+        """id to resume after, or None if the cursor is missing or malformed."""
+        if not cursor or not cursor.isdigit():
+            return None
+        return int(cursor)
+
+    def _cached_tail(self, max_age: float) -> Optional[int]:
+        with self._lock:
+            cached = self._tail
+        if cached is not None and time.monotonic() - cached[0] < max_age:
+            return cached[1]
+        return None
+
+    def _tail_id(self) -> int:
+        checked_at = time.monotonic()
+        with self.engine.connect() as conn:
+            tail = conn.execute(select(func.max(CounsellorEvent.id))).scalar() or 0
+        with self._lock:
+            self._tail = (checked_at, tail)
+        return tail
+
+    def tail(self) -> str:
+        return str(self._tail_id())
+
+    # --- publish / read ---
+    def notify(self, n: int = 1):
+        """Events were committed by this process: wake its open streams now."""
+        with self._lock:
+            self.published += n
+            self._tail = None
+            waiters = list(self._waiters)
+        for loop, ev in waiters:
+            try:
+                loop.call_soon_threadsafe(ev.set)
+            except RuntimeError:  # loop closed
+                pass
+
+    def since(self, cursor: Optional[str], college: Optional[str] = None,
+              limit: int = 500) -> Tuple[List[dict], bool, str]:
+        """
+        (events after `cursor`, reset, next cursor). reset is True when the cursor cannot
+        be resumed; the events then start at the current tail. `college` filters to
+        that college's events (None: all). Blocking: call from a thread.
+        """
+        seq = self._parse(cursor)
+        t = CounsellorEvent.__table__
+        with self.engine.connect() as conn:
+            tail = conn.execute(select(func.max(t.c.id))).scalar() or 0
+            if seq is None or seq > tail:
+                return [], cursor is not None, str(tail)
+            oldest = conn.execute(select(func.min(t.c.id))).scalar()
+            if oldest is not None and seq < oldest - 1:
+                return [], True, str(tail)
+            # bounded by the tail read first, so the next cursor never skips an unread row
+            q = select(t).where(t.c.id > seq, t.c.id <= tail)
+            if college is not None:
+                q = q.where(t.c.college == college)
+            rows = conn.execute(q.order_by(t.c.id).limit(limit)).all()
+        last = rows[-1].id if len(rows) >= limit else tail
+        return [_to_dict(r) for r in rows], False, str(last)
+
+    async def wait(self, cursor: str, timeout: float) -> bool:
+        """Wait until something is published after `cursor`; False on timeout."""
+        loop = asyncio.get_running_loop()
+        seq = self._parse(cursor) or 0
+        ev = asyncio.Event()
+        key = (loop, ev)
+        with self._lock:
+            self._waiters.add(key)  # before the first probe, so a notify isn't missed
+        deadline = loop.time() + timeout
+        try:
+            while True:
+                tail = self._cached_tail(self.poll_s)
+                if tail is None:
+                    tail = await asyncio.to_thread(self._tail_id)
+                if tail > seq:
+                    return True
+                remaining = deadline - loop.time()
+                if remaining <= 0:
+                    return False
+                try:
+                    await asyncio.wait_for(ev.wait(), min(self.poll_s, remaining))
+                except asyncio.TimeoutError:
+                    pass
+                ev.clear()
+        finally:
+            with self._lock:
+                self._waiters.discard(key)
+
+    def prune(self, session):
+        """Inside a write: drop events beyond the newest `size` (at most every PRUNE_EVERY_S)."""
+        now = time.monotonic()
+        with self._lock:
+            if now - self._pruned_at < PRUNE_EVERY_S:
+                return
+            self._pruned_at = now
+        t = CounsellorEvent.__table__
+        tail = session.execute(select(func.max(t.c.id))).scalar() or 0
+        if tail > self.size:
+            session.execute(delete(t).where(t.c.id <= tail - self.size))
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"published": self.published, "subscribers": len(self._waiters),
+                    "tail": str(self._tail[1]) if self._tail is not None else None}
+
+
+bus = EventBus()
@@ -0,0 +1,49 @@
+# backend/fake_llm.py
+"""
+Local stand-in for a streaming LLM, for measuring time-to-first-token offline.
+
+It "generates" a reply that is already known (the keyword replies from
+chatbot.generate_reply / main.generate_reply_simple) with provider-like pacing: a
+FAKE_LLM_TTFT_MS delay before the first token, then FAKE_LLM_TOKEN_MS between
+tokens. Benchmark harness only: the reply handlers use it just when FAKE_LLM_ENABLED=1
+(checked at each call site); otherwise the keyword reply is sent as soon as it is known.
+
+Standalone (no package imports) so both main.py and the backend can use it.
+"""
+import asyncio
+import os
+import re
+import time
+from typing import AsyncIterator, List
+
+ENABLED = os.environ.get("FAKE_LLM_ENABLED", "0") == "1"
+TTFT_MS = float(os.environ.get("FAKE_LLM_TTFT_MS", "0"))
+TOKEN_MS = float(os.environ.get("FAKE_LLM_TOKEN_MS", "0"))
+
+_TOKEN_RE = re.compile(r"\s*\S+")
+
+
+def tokenize(text: str) -> List[str]:
+    """Word-sized tokens that keep their leading whitespace, so "".join() restores the text."""
+    return _TOKEN_RE.findall(text) or [text]
+
+
+async def stream(text: str, ttft_ms: float = None, token_ms: float = None) -> AsyncIterator[str]:
+    ttft = TTFT_MS if ttft_ms is None else ttft_ms
+    per_token = TOKEN_MS if token_ms is None else token_ms
+    if ttft:
+        await asyncio.sleep(ttft / 1000.0)
+    for i, tok in enumerate(tokenize(text)):
+        if i and per_token:
+            await asyncio.sleep(per_token / 1000.0)
+        yield tok
+
+
+def complete(text: str, ttft_ms: float = None, token_ms: float = None) -> str:
+    """Blocking, non-streaming counterpart: waits as long as the whole stream would."""
+    ttft = TTFT_MS if ttft_ms is None else ttft_ms
+    per_token = TOKEN_MS if token_ms is None else token_ms
+    total = ttft + per_token * max(0, len(tokenize(text)) - 1)
+    if total:
+        time.sleep(total / 1000.0)
+    return text
@@ -0,0 +1,141 @@
+# backend/lexicon.py
+"""
+Shared risk lexicons and a single-pass matcher used by both risk scorers
+(main.compute_risk_score and risk.compute_risk_score).
+
+All phrase and word lists are compiled once into one Aho-Corasick automaton, so a
+message is lowercased and scanned a single time no matter how many entries the
+lexicons hold. Every hit records whether it falls on word boundaries, which lets
+callers choose between substring counting and whole-word counting.
+"""
+from collections import deque
+from typing import Dict, Iterable, List, NamedTuple
+
+SUICIDAL_PHRASES = [
+    "i want to die", "kill myself", "i'm going to kill myself", "end it all",
+    "i want to end it", "i wish i was dead", "wish i was dead", "i can't go on",
+    "i can't take it"
+]
+NEGATIVE_WORDS = ["sad", "depressed", "worthless", "hopeless", "anxious", "stressed", "overwhelmed", "miserable"]
+ABSOLUTIST_WORDS = {"always", "never", "nobody", "nothing", "everybody", "completely"}
+
+
+def _is_word_char(ch: str) -> bool:
+    # same notion of a word character as the \w+ tokenization it replaces
+    return ch.isalnum() or ch == "_"
+
+
+class LexiconHit(NamedTuple):
+    category: str
+    term: str
+    start: int       # offsets into text.lower()
+    end: int
+    whole_word: bool
+
+
+class MatchResult:
+    """Hits for one message plus its word count (number of \\w+ runs)."""
+
+    def __init__(self, hits: List[LexiconHit], word_count: int):
+        self.hits = hits
+        self.word_count = word_count
+
+    def count(self, category: str, whole_word: bool = False) -> int:
+        return sum(1 for h in self.hits if h.category == category and (h.whole_word or not whole_word))
+
+    def any(self, category: str, whole_word: bool = False) -> bool:
+        return any(h.category == category and (h.whole_word or not whole_word) for h in self.hits)
+
+    def counts(self, whole_word: bool = False) -> Dict[str, int]:
+        out: Dict[str, int] = {}
+        for h in self.hits:
+            if h.whole_word or not whole_word:
+                out[h.category] = out.get(h.category, 0) + 1
+        return out
+
+    def positions(self, category: str) -> List[LexiconHit]:
+        return [h for h in self.hits if h.category == category]
+
+
+class LexiconMatcher:
+    """Aho-Corasick automaton over {category: terms}. Terms are matched case-insensitively."""
+
+    def __init__(self, lexicons: Dict[str, Iterable[str]]):
+        self._goto: List[Dict[str, int]] = [{}]
+        self._fail: List[int] = [0]
+        # per state: tuple of (term_length, term, categories) ending at that state
+        self._out: List[tuple] = [()]
+        terms: Dict[str, List[str]] = {}
+        for category, words in lexicons.items():
+            for w in words:
+                w = w.lower()
+                if w:
+                    terms.setdefault(w, []).append(category)
+        for term, cats in terms.items():
+            self._add(term, tuple(cats))
+        self._build()
+        self.size = len(terms)
+
+    def _add(self, term: str, categories: tuple):
+        state = 0
+        for ch in term:
+            nxt = self._goto[state].get(ch)
+            if nxt is None:
+                nxt = len(self._goto)
+                self._goto[state][ch] = nxt
+                self._goto.append({})
+                self._fail.append(0)
+                self._out.append(())
+            state = nxt
+        self._out[state] = self._out[state] + ((len(term), term, categories),)
+
+    def _build(self):
+        goto, fail, out = self._goto, self._fail, self._out
+        queue = deque(goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for ch, nxt in goto[state].items():
+                queue.append(nxt)
+                f = fail[state]
+                while f and ch not in goto[f]:
+                    f = fail[f]
+                fail[nxt] = goto[f].get(ch, 0)
+                # inherit the outputs of the fail state so matching never walks the chain
+                out[nxt] = out[nxt] + out[fail[nxt]]
+
+    def match(self, text: str) -> MatchResult:
+        t = text.lower()
+        n = len(t)
+        goto, fail, out = self._goto, self._fail, self._out
+        hits: List[LexiconHit] = []
+        state = 0
+        words = 0
+        prev_word = False
+        for i, ch in enumerate(t):
+            is_word = _is_word_char(ch)
+            if is_word and not prev_word:
+                words += 1
+            prev_word = is_word
+            while state and ch not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(ch, 0)
+            if out[state]:
+                right_ok = i + 1 == n or not _is_word_char(t[i + 1])
+                for length, term, cats in out[state]:
+                    start = i - length + 1
+                    whole = right_ok and (start == 0 or not _is_word_char(t[start - 1]))
+                    for c in cats:
+                        hits.append(LexiconHit(c, term, start, i + 1, whole))
+        return MatchResult(hits, words)
+
+
+DEFAULT_MATCHER = LexiconMatcher({
+    "suicidal": SUICIDAL_PHRASES,
+    "negative": NEGATIVE_WORDS,
+    "absolutist": ABSOLUTIST_WORDS,
+})
+
+
+def match(text: str) -> MatchResult:
+    """Scan `text` once against the shared risk lexicons."""
+    return DEFAULT_MATCHER.match(text)
@@ -1,15 +1,34 @@
 # main.py  -- Demo FastAPI app for single-click hackathon demo
-from fastapi import FastAPI, HTTPException
+from fastapi import FastAPI, HTTPException, Query, Request, Response
+from fastapi.responses import JSONResponse, StreamingResponse
 from pydantic import BaseModel
 from datetime import datetime
-import re
+from typing import Optional
+import asyncio
+import json
+import fake_llm
+import lexicon
+import metrics
+import notify
+from case_store import CaseStore
+from memory_store import MemoryStore
 
 app = FastAPI(title="Virtual Friend Demo (Hackathon)")
 
 # --- In-memory stores (demo only) ---
-VISIBLE_MEMORY = {}       # email -> list of {text, reply, ts}
-PENDING_CASES = []        # list of {id, email, name, score, reason, ts, acknowledged}
-CASE_COUNTER = 1
+VISIBLE_MEMORY = MemoryStore()  # per-student ring of {id, text, reply, ts}; older entries on disk
+PENDING_CASES = CaseStore()  # indexed by case id, score/time and student; thread-safe
+
+# --- Metrics (GET /metrics, Prometheus text format) ---
+metrics.install(app)
+ESCALATIONS = metrics.counter("escalations_total", "Risk scores that escalated to a counsellor.")
+metrics.callback("visible_memory_entries", "Visible-memory entries resident in RAM.",
+                 lambda: VISIBLE_MEMORY.stats()["entries_resident"])
+metrics.callback("visible_memory_students", "Students with visible memory resident in RAM.",
+                 lambda: VISIBLE_MEMORY.stats()["students_resident"])
+metrics.callback("pending_cases", "Unacknowledged risk cases.", lambda: PENDING_CASES.stats()["pending"])
+metrics.callback("notify_outbox", "Counsellor notifications in the outbox, by status.",
+                 lambda: {k: notify.dispatcher.stats()[k] for k in ("pending", "dead")}, ["status"])
 
 # --- Models ---
 class ChatIn(BaseModel):
@@ -21,35 +40,30 @@ class ChatOut(BaseModel):
     reply: str
 
 # --- Simple risk config ---
-SUICIDAL_PHRASES = [
-    "i want to die", "kill myself", "i'm going to kill myself", "end it all",
-    "i want to end it", "wish i was dead", "i can't go on", "i can't take it"
-]
-NEGATIVE_WORDS = ["sad", "depressed", "worthless", "hopeless", "anxious", "stressed", "overwhelmed", "miserable"]
-ABSOLUTIST_WORDS = {"always", "never", "nobody", "nothing", "everybody", "completely"}
-
+# Lexicons live in lexicon.py (shared with the full backend's risk.py) and are matched
+# in a single pass; the helpers below are kept for callers that need one signal only.
 def contains_suicidal(text: str) -> bool:
-    t = text.lower()
-    return any(p in t for p in SUICIDAL_PHRASES)
+    return lexicon.match(text).any("suicidal")
 
 def absolutist_count(text: str) -> int:
-    words = re.findall(r"\w+", text.lower())
-    return sum(1 for w in words if w in ABSOLUTIST_WORDS)
+    return lexicon.match(text).count("absolutist", whole_word=True)
 
 def neg_ratio(text: str) -> float:
-    words = re.findall(r"\w+", text.lower())
-    if not words:
+    return _neg_ratio(lexicon.match(text))
+
+def _neg_ratio(m) -> float:
+    if not m.word_count:
         return 0.0
-    neg = sum(1 for w in words if w in NEGATIVE_WORDS)
-    return neg / len(words)
+    return m.count("negative", whole_word=True) / m.word_count
 
 def compute_risk_score(text: str, behavioral_meta: dict = None) -> (int, str, bool):
     """
     Returns (score int 1-10, reason str, escalate bool)
     """
-    suicidal = contains_suicidal(text)
-    neg = neg_ratio(text)            # 0..1
-    absolutist = absolutist_count(text)
+    m = lexicon.match(text)
+    suicidal = m.any("suicidal")
+    neg = _neg_ratio(m)              # 0..1
+    absolutist = m.count("absolutist", whole_word=True)
     behaviour = float(behavioral_meta.get("behavior_change", 0.0)) if behavioral_meta else 0.0
 
     base = 0.4 * neg + 0.25 * (neg) + 0.20 * min(1.0, absolutist / 5.0) + 0.10 * behaviour
@@ -80,84 +94,163 @@ def generate_reply_simple(name: str, text: str) -> str:
 def root():
     return {"message": "Virtual Friend Demo running. POST /chat to interact."}
 
-@app.post("/chat", response_model=ChatOut)
-def chat_endpoint(payload: ChatIn):
-    global CASE_COUNTER
-    email = payload.email.strip().lower()
-    name = payload.name.strip() if payload.name else "Student"
-    text = payload.text.strip()
-
-    # store visible memory for student (they can see this)
-    mem = VISIBLE_MEMORY.setdefault(email, [])
-    # Generate a friendly reply
-    reply = generate_reply_simple(name, text)
-    mem.append({"text": text, "reply": reply, "ts": datetime.utcnow().isoformat()})
-
+def assess_message(email: str, name: str, text: str):
+    """Risk-score a student message, record the case and notify if needed."""
     # compute a simple behavioral meta for demo (here: none)
     history_meta = {"behavior_change": 0.0}
 
     # risk scoring
-    score, reason, escalate = compute_risk_score(text, history_meta)
+    with metrics.stage("risk.compute_risk_score"):
+        score, reason, escalate = compute_risk_score(text, history_meta)
 
     # store risk internally only when above low threshold (keeping history)
     if score >= 4:
-        PENDING_CASES.append({
-            "id": CASE_COUNTER,
-            "email": email,
-            "name": name,
-            "score": score,
-            "reason": reason,
-            "ts": datetime.utcnow().isoformat(),
-            "acknowledged": False
-        })
-        CASE_COUNTER += 1
+        PENDING_CASES.add(email, name, score, reason)
 
     # escalate (notify counsellor) only when escalate True OR suicidal phrase
     if escalate:
-        # Notification: in demo we log/print — you can replace with webhook/email/SMS
-        notify_payload = {
-            "student_email": email,
-            "student_name": name,
-            "score": score,
-            "reason": reason,
-            "ts": datetime.utcnow().isoformat()
-        }
+        # queued to the notification dispatcher (webhook, or a log line when none is
+        # configured); repeats for the same student are coalesced there.
         # IMPORTANT: do NOT include chat transcripts here. Only minimal student info + score.
-        print("=== NOTIFY_COUNSELLOR (DEMO LOG) ===")
-        print(notify_payload)
-        print("====================================")
+        ESCALATIONS.inc()
+        with metrics.stage("notify.enqueue"):
+            notify.notify_counsellor({"score": score, "reason": reason}, {"email": email, "full_name": name})
+
+@app.post("/chat", response_model=ChatOut)
+def chat_endpoint(payload: ChatIn):
+    email = payload.email.strip().lower()
+    name = payload.name.strip() if payload.name else "Student"
+    text = payload.text.strip()
+
+    # Generate a friendly reply
+    with metrics.stage("chat.generate_reply"):
+        reply = generate_reply_simple(name, text)
+        if fake_llm.ENABLED:  # TTFT benchmark: pace it like an LLM provider
+            reply = fake_llm.complete(reply)
+    # store visible memory for student (they can see this)
+    with metrics.stage("memory.append"):
+        VISIBLE_MEMORY.append(email, {"text": text, "reply": reply, "ts": datetime.utcnow().isoformat()})
+
+    assess_message(email, name, text)
 
     # return only the reply to the student (never the score)
     return {"reply": reply}
 
+async def _whole(reply: str):
+    yield reply
+
+def _sse(event: str, data: dict) -> str:
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+@app.post("/chat/stream")
+async def chat_stream_endpoint(payload: ChatIn):
+    """Streaming /chat over Server-Sent Events: `token` events with reply fragments,
+    then a `done` event with the full reply. Risk scoring runs in a worker thread
+    while the reply streams; the score is never sent to the student."""
+    email = payload.email.strip().lower()
+    name = payload.name.strip() if payload.name else "Student"
+    text = payload.text.strip()
+    loop = asyncio.get_running_loop()
+    assessed = loop.run_in_executor(None, assess_message, email, name, text)
+
+    async def events():
+        parts = []
+        stored = False
+        try:
+            reply = generate_reply_simple(name, text)
+            # the keyword reply is ready at once; the TTFT benchmark paces it like a provider
+            tokens = fake_llm.stream(reply) if fake_llm.ENABLED else _whole(reply)
+            async for tok in tokens:
+                parts.append(tok)
+                yield _sse("token", {"t": tok})
+            entry = VISIBLE_MEMORY.append(email, {"text": text, "reply": "".join(parts),
+                                                  "ts": datetime.utcnow().isoformat()})
+            stored = True
+            # the memory id lets the client add the entry to its cached history
+            yield _sse("done", {"reply": entry["reply"], "id": entry["id"], "ts": entry["ts"]})
+        finally:
+            # keep whatever was sent, even if the client went away mid-stream
+            if parts and not stored:
+                VISIBLE_MEMORY.append(email, {"text": text, "reply": "".join(parts),
+                                              "ts": datetime.utcnow().isoformat()})
+            await assessed
+
+    return StreamingResponse(events(), media_type="text/event-stream",
+                             headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
 @app.get("/memory/{email}")
-def view_visible_memory(email: str):
-    """Student-visible memory — in demo we return the visible logs to the student."""
+def view_visible_memory(email: str, request: Request, limit: int = Query(50, ge=1, le=500),
+                        before: Optional[int] = None, after: Optional[int] = None):
+    """Student-visible memory — in demo we return the visible logs to the student.
+    Newest page by default; `before=<id>` pages back, `after=<id>` returns only newer entries.
+    Responses carry an ETag; a matching If-None-Match gets 304 with no body."""
+    if before is not None and after is not None:
+        raise HTTPException(status_code=400, detail="use either before or after, not both")
     email = email.strip().lower()
-    return {"email": email, "visible_memory": VISIBLE_MEMORY.get(email, [])}
+    # entries are append-only, so the newest id plus the query identify the response. For
+    # after= (catching up) the tag is the id the response brings the client up to, without
+    # `after` itself: after a sync that found new entries, the client's next poll (after=
+    # the id it reached, with that tag) gets a 304 straight away while nothing is new.
+    def etag(newest):
+        if after is not None:
+            return f'W/"a{max(after, min(newest, after + limit))}-{limit}"'
+        return f'W/"{newest}-{limit}-{before}"'
+    current = etag(VISIBLE_MEMORY.newest_id(email))
+    if request.headers.get("if-none-match") == current:
+        return Response(status_code=304, headers={"ETag": current, "Cache-Control": "no-cache"})
+    page = VISIBLE_MEMORY.page(email, limit=limit, before=before, after=after)
+    entries = page["entries"]
+    headers = {"ETag": etag(page["newest_id"]), "Cache-Control": "no-cache"}
+    return JSONResponse({
+        "email": email,
+        "visible_memory": entries,
+        "newest_id": page["newest_id"],
+        "next_before": entries[0]["id"] if page["has_older"] else None,
+        "next_after": entries[-1]["id"] if entries else after,
+    }, headers=headers)
 
 @app.get("/counsellor/pending")
-def counsellor_pending():
-    """Counsellor view for demo: list pending risky cases.
-    IMPORTANT: No chat messages here, only student basic info + score + timestamp."""
+def counsellor_pending(limit: int = Query(50, ge=1, le=500), cursor: Optional[str] = None,
+                       min_score: Optional[int] = None, since: Optional[datetime] = None,
+                       email: Optional[str] = None):
+    """Counsellor view for demo: list pending risky cases, highest score first.
+    IMPORTANT: No chat messages here, only student basic info + score + timestamp.
+    Pass the returned next_cursor as `cursor` to get the next page. `since` is an ISO
+    datetime (UTC unless it carries an offset); anything else is a 422."""
+    try:
+        cases, next_cursor = PENDING_CASES.pending(
+            limit=limit, cursor=cursor, min_score=min_score, since=since,
+            email=email.strip().lower() if email else None)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="invalid cursor")
     # return only minimal info
-    return [
-        {
-            "case_id": c["id"],
-            "email": c["email"],
-            "name": c["name"],
-            "score": c["score"],
-            "reason": c["reason"],
-            "ts": c["ts"],
-            "acknowledged": c["acknowledged"]
-        }
-        for c in PENDING_CASES if not c["acknowledged"]
-    ]
+    return {
+        "cases": [
+            {
+                "case_id": c["id"],
+                "email": c["email"],
+                "name": c["name"],
+                "score": c["score"],
+                "reason": c["reason"],
+                "ts": c["ts"],
+                "acknowledged": c["acknowledged"]
+            }
+            for c in cases
+        ],
+        "next_cursor": next_cursor
+    }
+
+@app.on_event("startup")
+def start_notifier():
+    notify.dispatcher.start()
+
+@app.on_event("shutdown")
+def flush_memory():
+    VISIBLE_MEMORY.flush()
+    notify.dispatcher.stop()
 
 @app.post("/counsellor/ack/{case_id}")
 def counsellor_ack(case_id: int):
-    for c in PENDING_CASES:
-        if c["id"] == case_id:
-            c["acknowledged"] = True
-            return {"ok": True, "case_id": case_id}
+    if PENDING_CASES.ack(case_id):
+        return {"ok": True, "case_id": case_id}
     raise HTTPException(status_code=404, detail="case not found")
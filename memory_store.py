@@ -0,0 +1,214 @@
+# memory_store.py -- bounded student-visible memory for the demo app (main.py)
+import hashlib
+import json
+import os
+import threading
+import time
+from collections import OrderedDict, deque
+from typing import List, Optional
+
+RING_SIZE = int(os.environ.get("MEMORY_RING_SIZE", "100"))
+MAX_ENTRIES = int(os.environ.get("MEMORY_MAX_ENTRIES", "50000"))
+IDLE_SECONDS = float(os.environ.get("MEMORY_IDLE_SECONDS", "1800"))
+SPILL_DIR = os.environ.get("MEMORY_SPILL_DIR", "./visible_memory")
+
+
+class _Student:
+    __slots__ = ("ring", "spilled", "next_id", "last_access")
+
+    def __init__(self, spilled: int):
+        self.ring = deque()          # newest entries, ids spilled+1 .. next_id-1
+        self.spilled = spilled       # highest id written to the spill file
+        self.next_id = spilled + 1
+        self.last_access = time.monotonic()
+
+
+class MemoryStore:
+    """
+    Thread-safe, bounded per-student memory.
+
+    Each student keeps a ring of their newest `ring_size` entries in memory; older
+    entries are appended to a per-student JSONL spill file. Entry ids increase by one
+    per student, so the file (ids 1..spilled) and the ring (spilled+1..) never overlap
+    and a page is read from whichever side holds it. When more than `max_entries`
+    entries are held in memory overall, or a student has been idle for
+    `idle_seconds`, their ring is flushed to disk and they are dropped from memory.
+    """
+
+    def __init__(self, spill_dir: str = SPILL_DIR, ring_size: int = RING_SIZE,
+                 max_entries: int = MAX_ENTRIES, idle_seconds: float = IDLE_SECONDS):
+        self.spill_dir = spill_dir
+        self.ring_size = ring_size
+        self.max_entries = max_entries
+        self.idle_seconds = idle_seconds
+        self._lock = threading.Lock()
+        self._students = OrderedDict()  # email -> _Student, least recently used first
+        self._entries = 0               # entries held in memory across all students
+        self._evictions = 0
+        self._last_idle_sweep = time.monotonic()
+        os.makedirs(spill_dir, exist_ok=True)
+
+    # --- spill files ---
+    def _path(self, email: str) -> str:
+        return os.path.join(self.spill_dir, hashlib.sha1(email.encode("utf-8")).hexdigest() + ".jsonl")
+
+    def _spill(self, email: str, entries):
+        if not entries:
+            return
+        with open(self._path(email), "a", encoding="utf-8") as f:
+            f.write("".join(json.dumps(e, ensure_ascii=False) + "\n" for e in entries))
+
+    def _last_spilled_id(self, email: str) -> int:
+        """Id of the last line of the spill file, read from its tail (0 if none)."""
+        try:
+            with open(self._path(email), "rb") as f:
+                f.seek(0, os.SEEK_END)
+                size = f.tell()
+                block = 4096
+                while True:
+                    f.seek(max(0, size - block))
+                    lines = f.read().splitlines()
+                    if len(lines) >= 2 or block >= size:
+                        break
+                    block *= 4
+                return json.loads(lines[-1])["id"] if lines else 0
+        except FileNotFoundError:
+            return 0
+
+    def _read_spilled(self, email: str, lo: int, hi: int) -> List[dict]:
+        """Spilled entries with lo <= id <= hi, binary-searching the file by byte offset."""
+        if hi < lo:
+            return []
+        try:
+            f = open(self._path(email), "rb")
+        except FileNotFoundError:
+            return []
+        with f:
+            f.seek(0, os.SEEK_END)
+            left, right = 0, f.tell()
+            # find a line start whose id is >= lo, with everything before it < lo
+            while left < right:
+                mid = (left + right) // 2
+                f.seek(mid)
+                if mid:
+                    f.readline()  # skip the partial line
+                pos = f.tell()
+                line = f.readline()
+                if not line or json.loads(line)["id"] >= lo:
+                    right = mid
+                else:
+                    left = pos + len(line)
+            f.seek(left)
+            if left:
+                f.seek(left - 1)
+                if f.read(1) != b"\n":
+                    f.readline()
+            out = []
+            for line in f:
+                e = json.loads(line)
+                if e["id"] > hi:
+                    break
+                if e["id"] >= lo:
+                    out.append(e)
+            return out
+
+    # --- residency ---
+    def _load(self, email: str) -> _Student:
+        st = self._students.get(email)
+        if st is None:
+            st = self._students[email] = _Student(self._last_spilled_id(email))
+        self._students.move_to_end(email)
+        st.last_access = time.monotonic()
+        return st
+
+    def _view(self, email: str) -> _Student:
+        """For reads: the resident student, or else a transient view of the spill file
+        (everything of a non-resident student is on disk). Never makes anyone resident,
+        so looking up unknown emails costs no memory."""
+        st = self._students.get(email)
+        if st is None:
+            return _Student(self._last_spilled_id(email))
+        self._students.move_to_end(email)
+        st.last_access = time.monotonic()
+        return st
+
+    def _evict(self, email: str):
+        st = self._students.pop(email)
+        self._spill(email, st.ring)
+        self._entries -= len(st.ring)
+        self._evictions += 1
+
+    def _enforce_budget(self, keep: str):
+        while self._entries > self.max_entries and len(self._students) > 1:
+            email = next(iter(self._students))
+            if email == keep:
+                self._students.move_to_end(email)
+                continue
+            self._evict(email)
+        now = time.monotonic()
+        if now - self._last_idle_sweep >= min(60.0, self.idle_seconds):
+            self._last_idle_sweep = now
+            for email in [e for e, st in self._students.items() if now - st.last_access > self.idle_seconds]:
+                if email != keep:
+                    self._evict(email)
+
+    # --- public API ---
+    def append(self, email: str, entry: dict) -> dict:
+        with self._lock:
+            st = self._load(email)
+            entry = dict(entry, id=st.next_id)
+            st.next_id += 1
+            st.ring.append(entry)
+            self._entries += 1
+            if len(st.ring) > self.ring_size:
+                old = st.ring.popleft()
+                self._spill(email, [old])
+                st.spilled = old["id"]
+                self._entries -= 1
+            self._enforce_budget(keep=email)
+            return dict(entry)
+
+    def newest_id(self, email: str) -> int:
+        """Id of the student's latest entry (0 if none); entries never change once written."""
+        with self._lock:
+            return self._view(email).next_id - 1
+
+    def page(self, email: str, limit: int = 50, before: Optional[int] = None,
+             after: Optional[int] = None) -> dict:
+        """
+        One page of a student's entries, oldest first.
+          neither cursor: the newest `limit` entries
+          before=id:      the newest `limit` entries older than id (scrolling back)
+          after=id:       the oldest `limit` entries newer than id (catching up)
+        """
+        with self._lock:
+            st = self._view(email)
+            newest = st.next_id - 1
+            if after is not None:
+                lo, hi = after + 1, min(newest, after + limit)
+            else:
+                hi = newest if before is None else min(newest, before - 1)
+                lo = max(1, hi - limit + 1)
+            entries = []
+            if lo <= hi:
+                entries = self._read_spilled(email, lo, min(hi, st.spilled))
+                first = st.spilled + 1
+                entries += [dict(e) for e in list(st.ring)[max(0, lo - first):max(0, hi - first + 1)]]
+            return {
+                "entries": entries,
+                "newest_id": newest,
+                "has_older": bool(entries) and entries[0]["id"] > 1,
+                "has_newer": bool(entries) and entries[-1]["id"] < newest,
+            }
+
+    def flush(self):
+        """Write every resident ring to disk and drop it (shutdown)."""
+        with self._lock:
+            for email in list(self._students):
+                self._evict(email)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"students_resident": len(self._students), "entries_resident": self._entries,
+                    "max_entries": self.max_entries, "ring_size": self.ring_size,
+                    "evictions": self._evictions}
@@ -0,0 +1,245 @@
+# backend/metrics.py
+"""
+Minimal Prometheus instrumentation: counters, histograms, callback gauges and the
+text exposition format served on /metrics.
+
+    with metrics.stage("chat.generate_reply"):
+        ...
+    metrics.install(app)   # per-endpoint latency middleware + GET /metrics
+
+- Stage timings go to one histogram, artemis_stage_seconds{stage=...}, so a slow
+  /chat can be split into reply generation, risk scoring, DB writes, notification.
+- Endpoint latency is artemis_http_request_seconds{method, route, status}, keyed by
+  the route template (/memory/{email}), not the concrete path. For streaming
+  responses it measures the time until the response starts.
+- Queue depths and store sizes are callback metrics: the owning module registers a
+  function that is read at scrape time, so nothing is updated on the hot path.
+
+Slow-request profiling (optional, needs pyinstrument): with METRICS_PROFILE_SAMPLE > 0
+that fraction of requests runs under the sampling profiler, and those slower than
+METRICS_PROFILE_SLOW_MS are written as HTML flame graphs to METRICS_PROFILE_DIR.
+
+Standalone (no package imports) so main.py can use it too.
+"""
+import bisect
+import contextlib
+import logging
+import os
+import random
+import threading
+import time
+from typing import Callable, Dict, Iterable, Optional, Tuple
+
+logger = logging.getLogger("metrics")
+
+PREFIX = "artemis_"
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+PROFILE_SAMPLE = float(os.environ.get("METRICS_PROFILE_SAMPLE", "0"))
+PROFILE_SLOW_MS = float(os.environ.get("METRICS_PROFILE_SLOW_MS", "1000"))
+PROFILE_DIR = os.environ.get("METRICS_PROFILE_DIR", "./profiles")
+
+
+def _escape(v) -> str:
+    return str(v).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(names: Tuple[str, ...], values: Tuple, extra: str = "") -> str:
+    parts = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+def _num(v: float) -> str:
+    if v == float("inf"):
+        return "+Inf"
+    return repr(float(v)) if isinstance(v, float) and not v.is_integer() else str(int(v))
+
+
+class Counter:
+    type = "counter"
+
+    def __init__(self, name: str, help: str, labelnames: Iterable[str] = ()):
+        self.name, self.help, self.labelnames = name, help, tuple(labelnames)
+        self._lock = threading.Lock()
+        self._values: Dict[Tuple, float] = {}
+
+    def inc(self, amount: float = 1.0, **labels):
+        key = tuple(labels.get(n, "") for n in self.labelnames)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def samples(self):
+        with self._lock:
+            items = list(self._values.items())
+        for key, v in items:
+            yield self.name, _labels(self.labelnames, key), v
+
+
+class Histogram:
+    type = "histogram"
+
+    def __init__(self, name: str, help: str, labelnames: Iterable[str] = (), buckets=DEFAULT_BUCKETS):
+        self.name, self.help, self.labelnames = name, help, tuple(labelnames)
+        self.buckets = tuple(sorted(buckets))
+        self._lock = threading.Lock()
+        self._values: Dict[Tuple, list] = {}  # key -> [bucket counts..., +Inf count, sum]
+
+    def observe(self, value: float, **labels):
+        key = tuple(labels.get(n, "") for n in self.labelnames)
+        i = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            v = self._values.get(key)
+            if v is None:
+                v = self._values[key] = [0] * (len(self.buckets) + 1) + [0.0]
+            v[i] += 1
+            v[-1] += value
+
+    @contextlib.contextmanager
+    def time(self, **labels):
+        t0 = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - t0, **labels)
+
+    def samples(self):
+        with self._lock:
+            items = [(k, list(v)) for k, v in self._values.items()]
+        for key, v in items:
+            cumulative = 0
+            for bound, n in zip(self.buckets + (float("inf"),), v[:-1]):
+                cumulative += n
+                yield self.name + "_bucket", _labels(self.labelnames, key, f'le="{_num(bound)}"'), cumulative
+            yield self.name + "_count", _labels(self.labelnames, key), cumulative
+            yield self.name + "_sum", _labels(self.labelnames, key), v[-1]
+
+
+class Callback:
+    """Value(s) read at scrape time: fn() returns a number, or {label value(s): number}."""
+
+    def __init__(self, name: str, help: str, fn: Callable, labelnames: Iterable[str] = (), type: str = "gauge"):
+        self.name, self.help, self.fn, self.labelnames, self.type = name, help, fn, tuple(labelnames), type
+
+    def samples(self):
+        try:
+            value = self.fn()
+        except Exception:
+            logger.exception("metric %s callback failed", self.name)
+            return
+        if value is None:
+            return
+        if not isinstance(value, dict):
+            yield self.name, "", value
+            return
+        for key, v in value.items():
+            key = key if isinstance(key, tuple) else (key,)
+            yield self.name, _labels(self.labelnames, key), v
+
+
+class Registry:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._metrics = {}
+
+    def _get_or_add(self, cls, name: str, *args, **kwargs):
+        name = PREFIX + name
+        with self._lock:
+            m = self._metrics.get(name)
+            if m is None:
+                m = self._metrics[name] = cls(name, *args, **kwargs)
+            return m
+
+    def counter(self, name: str, help: str, labelnames: Iterable[str] = ()) -> Counter:
+        return self._get_or_add(Counter, name, help, labelnames)
+
+    def histogram(self, name: str, help: str, labelnames: Iterable[str] = (), buckets=DEFAULT_BUCKETS) -> Histogram:
+        return self._get_or_add(Histogram, name, help, labelnames, buckets)
+
+    def callback(self, name: str, help: str, fn: Callable, labelnames: Iterable[str] = (),
+                 type: str = "gauge") -> Callback:
+        """Register (or replace: the latest owner wins) a metric read from fn() at scrape time."""
+        m = Callback(PREFIX + name, help, fn, labelnames, type)
+        with self._lock:
+            self._metrics[m.name] = m
+        return m
+
+    def render(self) -> str:
+        with self._lock:
+            metrics = sorted(self._metrics.values(), key=lambda m: m.name)
+        lines = []
+        for m in metrics:
+            lines.append(f"# HELP {m.name} {m.help}")
+            lines.append(f"# TYPE {m.name} {m.type}")
+            for name, labels, value in m.samples():
+                lines.append(f"{name}{labels} {_num(value)}")
+        return "\n".join(lines) + "\n"
+
+
+registry = Registry()
+counter = registry.counter
+histogram = registry.histogram
+callback = registry.callback
+
+STAGES = histogram("stage_seconds", "Time spent per pipeline stage.", ["stage"])
+HTTP = histogram("http_request_seconds", "HTTP request latency by route (until the response starts).",
+                 ["method", "route", "status"])
+
+
+def stage(name: str):
+    """Context manager timing one pipeline stage into artemis_stage_seconds."""
+    return STAGES.time(stage=name)
+
+
+# --- HTTP ---
+
+def _profiler():
+    if PROFILE_SAMPLE <= 0 or random.random() >= PROFILE_SAMPLE:
+        return None
+    try:
+        from pyinstrument import Profiler
+    except ImportError:
+        return None
+    return Profiler(async_mode="enabled")
+
+
+def _save_profile(profiler, method: str, route: str, elapsed: float):
+    # `route` is the template ("/memory/{email}"), never the raw path: no emails or ids on disk
+    os.makedirs(PROFILE_DIR, exist_ok=True)
+    slug = "_".join(part.strip("{}") for part in route.strip("/").split("/")) or "root"
+    out = os.path.join(PROFILE_DIR, f"{int(time.time() * 1000)}-{method}-{slug}-{int(elapsed * 1000)}ms.html")
+    with open(out, "w") as f:
+        f.write(profiler.output_html())
+    logger.warning("slow request %s %s (%.0f ms), profile: %s", method, route, elapsed * 1000, out)
+
+
+def install(app):
+    """Add the latency middleware and GET /metrics to a FastAPI app."""
+    from fastapi import Request
+    from fastapi.responses import Response
+
+    @app.middleware("http")
+    async def record_latency(request: Request, call_next):
+        profiler = _profiler()
+        if profiler is not None:
+            profiler.start()
+        t0 = time.perf_counter()
+        status = 500
+        try:
+            response = await call_next(request)
+            status = response.status_code
+            return response
+        finally:
+            elapsed = time.perf_counter() - t0
+            route = getattr(request.scope.get("route"), "path", "unmatched")
+            HTTP.observe(elapsed, method=request.method, route=route, status=str(status))
+            if profiler is not None:
+                profiler.stop()
+                if elapsed * 1000 >= PROFILE_SLOW_MS:
+                    _save_profile(profiler, request.method, route, elapsed)
+
+    @app.get("/metrics", include_in_schema=False)
+    def prometheus_metrics():
+        return Response(registry.render(), media_type=CONTENT_TYPE)
@@ -0,0 +1,33 @@
+# backend/migrations/env.py
+from logging.config import fileConfig
+
+from alembic import context
+
+from backend import db, models
+
+config = context.config
+if config.config_file_name is not None:
+    fileConfig(config.config_file_name)
+
+target_metadata = models.Base.metadata
+
+
+def run_migrations_offline():
+    context.configure(url=db.DATABASE_URL, target_metadata=target_metadata, literal_binds=True,
+                      render_as_batch=db.IS_SQLITE)
+    with context.begin_transaction():
+        context.run_migrations()
+
+
+def run_migrations_online():
+    with db.make_engine(tuned=False).connect() as conn:
+        # batch mode: SQLite can't ALTER a table to add constraints, so it is rebuilt
+        context.configure(connection=conn, target_metadata=target_metadata, render_as_batch=db.IS_SQLITE)
+        with context.begin_transaction():
+            context.run_migrations()
+
+
+if context.is_offline_mode():
+    run_migrations_offline()
+else:
+    run_migrations_online()
@@ -0,0 +1,125 @@
+"""scoring pipeline: risk score provenance, scoring jobs, stats, rollups, event feed
+
+Brings a database created from the original models (create_all) up to date:
+risk_scores gains message_id and scorer_version plus the counsellor queue indexes,
+users.college is indexed, and the user_stats, risk_rollups, counsellor_events and
+scoring_jobs tables are created. Each step is skipped when it is already in place, so
+this also runs cleanly on a database that create_all() built from the current models.
+
+Revision ID: 0001
+Revises:
+Create Date: 2026-10-18
+"""
+from alembic import op
+import sqlalchemy as sa
+
+revision = "0001"
+down_revision = None
+branch_labels = None
+depends_on = None
+
+
+def _inspector():
+    return sa.inspect(op.get_bind())
+
+
+def _has_table(name):
+    return name in _inspector().get_table_names()
+
+
+def _has_column(table, column):
+    return column in {c["name"] for c in _inspector().get_columns(table)}
+
+
+def _has_index(table, name):
+    return name in {i["name"] for i in _inspector().get_indexes(table)}
+
+
+def _create_index(name, table, columns):
+    if not _has_index(table, name):
+        op.create_index(name, table, columns)
+
+
+def upgrade():
+    with op.batch_alter_table("risk_scores") as batch:
+        if not _has_column("risk_scores", "message_id"):
+            batch.add_column(sa.Column("message_id", sa.Integer(), nullable=True))
+            batch.create_foreign_key("fk_risk_scores_message_id", "chat_messages",
+                                     ["message_id"], ["id"], ondelete="SET NULL")
+        if not _has_column("risk_scores", "scorer_version"):
+            batch.add_column(sa.Column("scorer_version", sa.String(), nullable=True))
+    _create_index("ix_risk_scores_message_version", "risk_scores", ["message_id", "scorer_version"])
+    _create_index("ix_risk_scores_ack_created", "risk_scores", ["acknowledged", "created_at", "id"])
+    _create_index("ix_risk_scores_ack_score", "risk_scores", ["acknowledged", "score"])
+    _create_index("ix_users_college", "users", ["college"])
+
+    if not _has_table("user_stats"):
+        op.create_table(
+            "user_stats",
+            sa.Column("user_id", sa.Integer(), sa.ForeignKey("users.id"), primary_key=True),
+            sa.Column("total_messages", sa.Integer()),
+            sa.Column("rate_short", sa.Float()),
+            sa.Column("rate_long", sa.Float()),
+            sa.Column("late_night_ratio", sa.Float()),
+            sa.Column("avg_risk", sa.Float(), nullable=True),
+            sa.Column("last_message_at", sa.DateTime(), nullable=True),
+            sa.Column("last_gap_hours", sa.Float(), nullable=True),
+            sa.Column("updated_at", sa.DateTime()),
+        )
+
+    if not _has_table("risk_rollups"):
+        op.create_table(
+            "risk_rollups",
+            sa.Column("scope", sa.String(), primary_key=True),
+            sa.Column("key", sa.String(), primary_key=True),
+            sa.Column("granularity", sa.String(), primary_key=True),
+            sa.Column("bucket", sa.DateTime(), primary_key=True),
+            sa.Column("count", sa.Integer()),
+            sa.Column("score_sum", sa.Integer()),
+            sa.Column("score_max", sa.Integer()),
+            sa.Column("ewma", sa.Float(), nullable=True),
+            sa.Column("escalations", sa.Integer()),
+            sa.Column("updated_at", sa.DateTime()),
+        )
+
+    if not _has_table("counsellor_events"):
+        op.create_table(
+            "counsellor_events",
+            sa.Column("id", sa.Integer(), primary_key=True),
+            sa.Column("type", sa.String()),
+            sa.Column("college", sa.String(), nullable=True),
+            sa.Column("ts", sa.Float()),
+            sa.Column("data", sa.Text()),
+            sqlite_autoincrement=True,
+        )
+    _create_index("ix_counsellor_events_college_id", "counsellor_events", ["college", "id"])
+
+    if not _has_table("scoring_jobs"):
+        op.create_table(
+            "scoring_jobs",
+            sa.Column("id", sa.Integer(), primary_key=True),
+            sa.Column("message_id", sa.Integer(), sa.ForeignKey("chat_messages.id", ondelete="CASCADE")),
+            sa.Column("user_id", sa.Integer(), sa.ForeignKey("users.id")),
+            sa.Column("status", sa.String()),
+            sa.Column("attempts", sa.Integer()),
+            sa.Column("error", sa.String(), nullable=True),
+            sa.Column("created_at", sa.DateTime()),
+            sa.Column("started_at", sa.DateTime(), nullable=True),
+            sa.Column("finished_at", sa.DateTime(), nullable=True),
+        )
+    _create_index("ix_scoring_jobs_id", "scoring_jobs", ["id"])
+    _create_index("ix_scoring_jobs_status_id", "scoring_jobs", ["status", "id"])
+
+
+def downgrade():
+    for table in ("scoring_jobs", "counsellor_events", "risk_rollups", "user_stats"):
+        if _has_table(table):
+            op.drop_table(table)
+    if _has_index("users", "ix_users_college"):
+        op.drop_index("ix_users_college", table_name="users")
+    for name in ("ix_risk_scores_ack_score", "ix_risk_scores_ack_created", "ix_risk_scores_message_version"):
+        if _has_index("risk_scores", name):
+            op.drop_index(name, table_name="risk_scores")
+    with op.batch_alter_table("risk_scores") as batch:
+        batch.drop_column("scorer_version")
+        batch.drop_column("message_id")
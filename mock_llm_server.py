@@ -0,0 +1,118 @@
+# backend/mock_llm_server.py
+"""
+Local stand-in for an OpenAI-compatible chat-completions provider, for load-testing
+chatbot.LLMClient (latency, timeouts, circuit breaker, fallback) offline.
+
+    python -m backend.mock_llm_server --port 9100 --ttft-ms 300 --token-ms 30
+    LLM_API_URL=http://127.0.0.1:9100/v1 uvicorn backend.main:app
+
+Behaviour can be changed while it runs, e.g. to simulate an outage:
+
+    curl -X POST localhost:9100/_config -H 'content-type: application/json' -d '{"error_rate": 1}'
+
+Standalone (no package imports).
+"""
+import argparse
+import asyncio
+import json
+import random
+import time
+
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+
+CONFIG = {
+    "ttft_ms": 300.0,     # delay before the first token
+    "token_ms": 30.0,     # delay between tokens
+    "error_rate": 0.0,    # fraction of requests answered with HTTP 500
+    "hang_rate": 0.0,     # fraction of requests that stall for hang_s before answering
+    "hang_s": 30.0,
+}
+REPLY = ("That sounds like a lot to carry right now. Let's take it one step at a time — "
+         "what feels most pressing today, and is there one small thing we could plan together?")
+STATS = {"requests": 0, "errors": 0, "hangs": 0, "in_flight": 0, "max_in_flight": 0}
+
+app = FastAPI(title="Mock LLM provider")
+
+
+def _tokens(text: str):
+    words = text.split(" ")
+    return [w if i == 0 else " " + w for i, w in enumerate(words)]
+
+
+def _chunk(content: str = None, finish: str = None) -> str:
+    delta = {"content": content} if content is not None else {}
+    body = {"id": "mock", "object": "chat.completion.chunk", "created": int(time.time()),
+            "choices": [{"index": 0, "delta": delta, "finish_reason": finish}]}
+    return f"data: {json.dumps(body)}\n\n"
+
+
+@app.post("/v1/chat/completions")
+async def chat_completions(request: Request):
+    body = await request.json()
+    STATS["requests"] += 1
+    if random.random() < CONFIG["error_rate"]:
+        STATS["errors"] += 1
+        return JSONResponse({"error": {"message": "mock provider error"}}, status_code=500)
+    STATS["in_flight"] += 1
+    STATS["max_in_flight"] = max(STATS["max_in_flight"], STATS["in_flight"])
+    try:
+        if random.random() < CONFIG["hang_rate"]:
+            STATS["hangs"] += 1
+            await asyncio.sleep(CONFIG["hang_s"])
+        await asyncio.sleep(CONFIG["ttft_ms"] / 1000.0)
+    except BaseException:
+        STATS["in_flight"] -= 1
+        raise
+
+    if not body.get("stream"):
+        try:
+            await asyncio.sleep(CONFIG["token_ms"] * (len(_tokens(REPLY)) - 1) / 1000.0)
+        finally:
+            STATS["in_flight"] -= 1
+        return {"id": "mock", "object": "chat.completion", "model": body.get("model"),
+                "choices": [{"index": 0, "message": {"role": "assistant", "content": REPLY},
+                             "finish_reason": "stop"}]}
+
+    async def events():
+        try:
+            for i, tok in enumerate(_tokens(REPLY)):
+                if i:
+                    await asyncio.sleep(CONFIG["token_ms"] / 1000.0)
+                yield _chunk(tok)
+            yield _chunk(finish="stop")
+            yield "data: [DONE]\n\n"
+        finally:
+            STATS["in_flight"] -= 1
+
+    return StreamingResponse(events(), media_type="text/event-stream")
+
+
+@app.post("/_config")
+async def set_config(update: dict):
+    for k, v in update.items():
+        if k in CONFIG:
+            CONFIG[k] = float(v)
+    return CONFIG
+
+
+@app.get("/_stats")
+async def get_stats():
+    return {"config": CONFIG, **STATS}
+
+
+def main():
+    import uvicorn
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--host", default="127.0.0.1")
+    ap.add_argument("--port", type=int, default=9100)
+    for k, v in CONFIG.items():
+        ap.add_argument("--" + k.replace("_", "-"), type=float, default=v)
+    args = ap.parse_args()
+    for k in CONFIG:
+        CONFIG[k] = getattr(args, k)
+    uvicorn.run(app, host=args.host, port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,289 @@
+# backend/model_server.py
+"""
+Shared model-serving sidecar for risk scoring.
+
+With `uvicorn --workers N` every worker would otherwise load its own copy of the
+transformer pipelines (RAM per worker, N runtimes competing for the cores). Instead
+one process loads the models and serves risk analysis to all API workers over a
+Unix socket:
+
+    python -m backend.model_server --socket ./model_server.sock --inference-threads 4
+    RISK_MODEL_SERVER=./model_server.sock uvicorn backend.old_main:app --workers 4
+
+Requests from every worker land on the sidecar's handler threads, which feed risk.py's
+micro-batchers, so concurrent messages from different workers share a forward pass.
+The result cache lives here too and is shared by all workers. --inference-threads
+sets the intra-op threads of the model runtime (torch or ONNX), --handlers how many
+requests may be in flight at once (further requests wait unread in their connection);
+API workers scale for I/O independently.
+
+Wire format: 4-byte big-endian length + JSON object, both ways. Requests carry an
+"id" and the response echoes it, so one connection is shared by all threads of a
+worker (ModelClient).
+"""
+import argparse
+import json
+import logging
+import os
+import socket
+import struct
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Optional
+
+logger = logging.getLogger("model_server")
+
+SOCKET_PATH = os.environ.get("MODEL_SERVER_SOCKET", "./model_server.sock")
+HANDLERS = int(os.environ.get("MODEL_SERVER_HANDLERS", "64"))
+TIMEOUT_S = float(os.environ.get("RISK_MODEL_SERVER_TIMEOUT_S", "10"))
+RETRY_S = 1.0  # after a failed connect, calls fail fast (heuristic fallback) this long
+
+_HEADER = struct.Struct(">I")
+MAX_FRAME = 16 * 1024 * 1024
+
+
+def send_frame(sock: socket.socket, obj: dict):
+    data = json.dumps(obj).encode()
+    sock.sendall(_HEADER.pack(len(data)) + data)
+
+
+def _read_exact(sock: socket.socket, n: int) -> bytes:
+    buf = bytearray()
+    while len(buf) < n:
+        chunk = sock.recv(n - len(buf))
+        if not chunk:
+            raise ConnectionError("connection closed")
+        buf += chunk
+    return bytes(buf)
+
+
+def recv_frame(sock: socket.socket) -> dict:
+    (n,) = _HEADER.unpack(_read_exact(sock, _HEADER.size))
+    if n > MAX_FRAME:
+        raise ConnectionError(f"frame too large ({n} bytes)")
+    return json.loads(_read_exact(sock, n))
+
+
+# --- server ---
+
+class ModelServer:
+    def __init__(self, path: str = SOCKET_PATH, handlers: int = HANDLERS):
+        from . import risk
+        self.risk = risk
+        risk.MODEL_SERVER = None  # this process is the server: always analyze locally
+        self.path = path
+        self.pool = ThreadPoolExecutor(max_workers=handlers, thread_name_prefix="model-handler")
+        # caps requests in flight: the executor's own queue is unbounded
+        self._slots = threading.BoundedSemaphore(handlers)
+        self.started_at = time.time()
+        self._lock = threading.Lock()
+        self.connections = 0
+        self.requests = 0
+        self.errors = 0
+
+    def _handle(self, req: dict) -> dict:
+        op = req.get("op")
+        if op == "analyze":
+            result, version = self.risk.analyze(req["text"])
+            return {"result": result, "version": version}
+        if op == "info":
+            return {"scorer_version": self.risk.scorer_version(), "models": self.risk.model_status(),
+                    "cache": self.risk.cache_stats(), "batchers": self.risk.batcher_stats(), "server": self.stats()}
+        raise ValueError(f"unknown op {op!r}")
+
+    def _respond(self, conn, write_lock, req: dict):
+        try:
+            resp = self._handle(req)
+        except Exception as e:
+            with self._lock:
+                self.errors += 1
+            resp = {"error": repr(e)}
+        finally:
+            self._slots.release()
+        resp["id"] = req.get("id")
+        try:
+            with write_lock:
+                send_frame(conn, resp)
+        except OSError:
+            pass  # client went away; its reader fails the pending call
+
+    def _serve_conn(self, conn: socket.socket):
+        write_lock = threading.Lock()
+        with self._lock:
+            self.connections += 1
+        try:
+            while True:
+                req = recv_frame(conn)
+                with self._lock:
+                    self.requests += 1
+                self._slots.acquire()  # all handlers busy: stop reading this connection
+                self.pool.submit(self._respond, conn, write_lock, req)
+        except (ConnectionError, OSError, ValueError):
+            pass
+        finally:
+            with self._lock:
+                self.connections -= 1
+            conn.close()
+
+    def serve_forever(self):
+        if os.path.exists(self.path):
+            os.unlink(self.path)  # stale socket from a previous run
+        srv = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        srv.bind(self.path)
+        srv.listen(128)
+        logger.info("model server listening on %s", self.path)
+        try:
+            while True:
+                conn, _ = srv.accept()
+                threading.Thread(target=self._serve_conn, args=(conn,), name="model-conn", daemon=True).start()
+        finally:
+            srv.close()
+            if os.path.exists(self.path):
+                os.unlink(self.path)
+            self.pool.shutdown(wait=False)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"path": self.path, "uptime_s": round(time.time() - self.started_at, 1),
+                    "connections": self.connections, "requests": self.requests, "errors": self.errors}
+
+
+# --- client ---
+
+class ModelClient:
+    """
+    Thread-safe client for one worker process: a single connection, requests
+    multiplexed by id, a reader thread completing the waiting callers. Connection
+    failures raise; the caller (risk.py) falls back to heuristics.
+    """
+
+    def __init__(self, path: str, timeout: float = TIMEOUT_S):
+        self.path = path
+        self.timeout = timeout
+        self._lock = threading.Lock()
+        self._sock = None
+        self._pending = {}  # id -> Future
+        self._next_id = 0
+        self._retry_at = 0.0
+        self.requests = 0
+        self.failures = 0
+        self.last_error = None
+
+    def _connect(self) -> socket.socket:
+        # called with self._lock held
+        if self._sock is not None:
+            return self._sock
+        if time.monotonic() < self._retry_at:
+            raise ConnectionError(f"model server unavailable: {self.last_error}")
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        try:
+            sock.connect(self.path)
+        except OSError as e:
+            sock.close()
+            self._retry_at = time.monotonic() + RETRY_S
+            self.last_error = repr(e)
+            raise ConnectionError(f"model server unavailable: {e!r}") from e
+        self._sock = sock
+        threading.Thread(target=self._read_loop, args=(sock,), name="model-client-reader", daemon=True).start()
+        return sock
+
+    def _read_loop(self, sock: socket.socket):
+        try:
+            while True:
+                resp = recv_frame(sock)
+                with self._lock:
+                    fut = self._pending.pop(resp.get("id"), None)
+                if fut is not None:
+                    fut.set_result(resp)
+        except Exception as e:
+            self._disconnect(sock, e)
+
+    def _disconnect(self, sock: socket.socket, err: Exception):
+        with self._lock:
+            if self._sock is not sock:
+                return
+            self._sock = None
+            self.last_error = repr(err)
+            pending, self._pending = self._pending, {}
+        sock.close()
+        for fut in pending.values():
+            fut.set_exception(ConnectionError(f"model server connection lost: {err!r}"))
+
+    def call(self, op: str, timeout: Optional[float] = None, **params) -> dict:
+        fut = Future()
+        with self._lock:
+            self.requests += 1
+            self._next_id += 1
+            req_id = self._next_id
+            try:
+                sock = self._connect()
+            except ConnectionError:
+                self.failures += 1
+                raise
+            self._pending[req_id] = fut
+            try:
+                send_frame(sock, dict(params, op=op, id=req_id))
+            except OSError as e:
+                # the reader thread sees the broken socket and reconnects on the next call
+                self.failures += 1
+                self._pending.pop(req_id, None)
+                raise ConnectionError(f"model server connection lost: {e!r}") from e
+        try:
+            resp = fut.result(self.timeout if timeout is None else timeout)
+        except Exception:
+            with self._lock:
+                self.failures += 1
+                self._pending.pop(req_id, None)
+            raise
+        if "error" in resp:
+            raise RuntimeError(f"model server: {resp['error']}")
+        return resp
+
+    def analyze(self, text: str):
+        """(risk.analyze_text_simple result, scorer version that produced it)."""
+        resp = self.call("analyze", text=text)
+        return resp["result"], resp["version"]
+
+    def info(self, timeout: float = 2.0) -> dict:
+        return self.call("info", timeout=timeout)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"path": self.path, "connected": self._sock is not None, "in_flight": len(self._pending),
+                    "requests": self.requests, "failures": self.failures, "last_error": self.last_error}
+
+    def close(self):
+        with self._lock:
+            sock = self._sock
+        if sock is not None:
+            self._disconnect(sock, ConnectionError("closed"))
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--socket", default=SOCKET_PATH)
+    ap.add_argument("--handlers", type=int, default=HANDLERS, help="max requests in flight; more wait unread in the socket")
+    ap.add_argument("--inference-threads", type=int, help="intra-op threads for the model runtime")
+    args = ap.parse_args()
+    logging.basicConfig(level=logging.INFO)
+    if args.inference_threads:
+        os.environ["RISK_ONNX_THREADS"] = str(args.inference_threads)  # read when onnx_backend imports
+        try:
+            import torch
+            torch.set_num_threads(args.inference_threads)
+        except ImportError:
+            pass
+    server = ModelServer(args.socket, args.handlers)
+    if server.risk.USE_MODELS:
+        t0 = time.perf_counter()
+        server.risk.warm_up(block=True)
+        logger.info("models: %s (%.1fs)", server.risk.model_status()["status"], time.perf_counter() - t0)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -1,5 +1,5 @@
 # backend/models.py
-from sqlalchemy import Column, Integer, String, DateTime, ForeignKey, Text, Boolean, Float
+from sqlalchemy import Column, Integer, String, DateTime, ForeignKey, Text, Boolean, Float, Index
 from sqlalchemy.orm import relationship
 from datetime import datetime
 from .db import Base
@@ -12,7 +12,7 @@ class User(Base):
     hashed_password = Column(String, nullable=False)
     role = Column(String, default="student")  # student, counsellor, admin
     full_name = Column(String, nullable=True)
-    college = Column(String, nullable=True)
+    college = Column(String, nullable=True, index=True)
     enrollment = Column(String, nullable=True)
     linked_portal = Column(String, nullable=True)  # placeholder for college portal link
     created_at = Column(DateTime, default=datetime.utcnow)
@@ -49,7 +49,9 @@ class RiskScore(Base):
     __tablename__ = "risk_scores"
     id = Column(Integer, primary_key=True, index=True)
     user_id = Column(Integer, ForeignKey("users.id"))
-    source = Column(String, default="automated")  # automated | clinician
+    message_id = Column(Integer, ForeignKey("chat_messages.id", ondelete="SET NULL"), nullable=True)  # scored message, if automated
+    source = Column(String, default="automated")  # automated | clinician | rescore
+    scorer_version = Column(String, nullable=True)  # risk.scorer_version() that produced it
     score = Column(Integer)  # 1-10
     reason = Column(String, nullable=True)
     created_at = Column(DateTime, default=datetime.utcnow)
@@ -57,6 +59,75 @@ class RiskScore(Base):
 
     user = relationship("User", back_populates="risks")
 
+    __table_args__ = (
+        Index("ix_risk_scores_message_version", "message_id", "scorer_version"),
+        # counsellor queue: unacknowledged, newest first (keyset on created_at, id)
+        Index("ix_risk_scores_ack_created", "acknowledged", "created_at", "id"),
+        Index("ix_risk_scores_ack_score", "acknowledged", "score"),
+    )
+
+
+class UserStats(Base):
+    """Rolling per-student behavioral statistics, updated in O(1) per scored message."""
+    __tablename__ = "user_stats"
+    user_id = Column(Integer, ForeignKey("users.id"), primary_key=True)
+    total_messages = Column(Integer, default=0)
+    rate_short = Column(Float, default=0.0)        # messages/day, EWMA over ~1 day
+    rate_long = Column(Float, default=0.0)         # messages/day, EWMA over ~2 weeks
+    late_night_ratio = Column(Float, default=0.0)  # EWMA of the late-night indicator
+    avg_risk = Column(Float, nullable=True)        # EWMA of recent risk scores
+    last_message_at = Column(DateTime, nullable=True)
+    last_gap_hours = Column(Float, nullable=True)  # gap before the latest message
+    updated_at = Column(DateTime, default=datetime.utcnow)
+
+
+class RiskRollup(Base):
+    """Hourly/daily risk aggregates per student and per college, maintained by rollups.py."""
+    __tablename__ = "risk_rollups"
+    scope = Column(String, primary_key=True)        # student | college
+    key = Column(String, primary_key=True)          # user id (student) or college name
+    granularity = Column(String, primary_key=True)  # hour | day
+    bucket = Column(DateTime, primary_key=True)     # bucket start, UTC
+    count = Column(Integer, default=0)
+    score_sum = Column(Integer, default=0)
+    score_max = Column(Integer, default=0)
+    ewma = Column(Float, nullable=True)             # EWMA of scores, as of the bucket's last one
+    escalations = Column(Integer, default=0)
+    updated_at = Column(DateTime, default=datetime.utcnow)
+
+
+class CounsellorEvent(Base):
+    """Counsellor dashboard feed (events.py): one row per case/ack, shared by all workers."""
+    __tablename__ = "counsellor_events"
+    id = Column(Integer, primary_key=True)  # the event id clients resume from
+    type = Column(String)                   # case | ack
+    college = Column(String, nullable=True)
+    ts = Column(Float)
+    data = Column(Text)                     # JSON
+
+    __table_args__ = (
+        Index("ix_counsellor_events_college_id", "college", "id"),
+        {"sqlite_autoincrement": True},  # ids never reused after pruning
+    )
+
+
+class ScoringJob(Base):
+    """Durable risk-scoring work item, written next to the chat message it scores."""
+    __tablename__ = "scoring_jobs"
+    id = Column(Integer, primary_key=True, index=True)
+    message_id = Column(Integer, ForeignKey("chat_messages.id", ondelete="CASCADE"))
+    user_id = Column(Integer, ForeignKey("users.id"))
+    status = Column(String, default="pending")  # pending | running | done | failed
+    attempts = Column(Integer, default=0)
+    error = Column(String, nullable=True)
+    created_at = Column(DateTime, default=datetime.utcnow)
+    started_at = Column(DateTime, nullable=True)
+    finished_at = Column(DateTime, nullable=True)
+
+    message = relationship("ChatMessage")
+
+    __table_args__ = (Index("ix_scoring_jobs_status_id", "status", "id"),)
+
 
 class CounselorProfile(Base):
     __tablename__ = "counselor_profiles"
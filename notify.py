@@ -1,11 +1,263 @@
 # backend/notify.py
+"""
+Counsellor notifications, delivered off the request path.
+
+notify_counsellor() only writes the notification to a local SQLite outbox
+(NOTIFY_OUTBOX_PATH) and wakes the dispatcher thread, which delivers to the
+counsellor endpoint and retries with exponential backoff. Undelivered rows survive
+restarts.
+
+- Coalescing: the first escalation for a student goes out immediately. Further
+  escalations within NOTIFY_COALESCE_S are merged into one follow-up (highest
+  score kept, count of escalations) sent when the window closes, unless one scores
+  higher than the last delivered notification: then the follow-up goes now.
+- Batching: due notifications for the same endpoint are POSTed together, up to
+  NOTIFY_BATCH_SIZE per request, as {"notifications": [...]}.
+- Endpoints: NOTIFY_COLLEGE_WEBHOOKS (JSON {college: url}) then NOTIFY_WEBHOOK_URL;
+  with neither set, notifications are logged, which is the demo behaviour.
+
+Standalone (no package imports) so main.py can use it too.
+Only numeric score + minimal identifying info is sent. Never chat transcripts.
+"""
+import json
 import logging
+import os
+import random
+import sqlite3
+import threading
+import time
+from typing import Optional
+
 logger = logging.getLogger("notify")
 logger.setLevel(logging.INFO)
 
+OUTBOX_PATH = os.environ.get("NOTIFY_OUTBOX_PATH", "./notify_outbox.db")
+WEBHOOK_URL = os.environ.get("NOTIFY_WEBHOOK_URL")
+COLLEGE_WEBHOOKS = json.loads(os.environ.get("NOTIFY_COLLEGE_WEBHOOKS", "{}"))
+COALESCE_S = float(os.environ.get("NOTIFY_COALESCE_S", "60"))
+BATCH_SIZE = int(os.environ.get("NOTIFY_BATCH_SIZE", "50"))
+TIMEOUT_S = float(os.environ.get("NOTIFY_TIMEOUT_S", "5"))
+MAX_ATTEMPTS = int(os.environ.get("NOTIFY_MAX_ATTEMPTS", "8"))
+BACKOFF_BASE_S = float(os.environ.get("NOTIFY_BACKOFF_BASE_S", "2"))
+BACKOFF_MAX_S = float(os.environ.get("NOTIFY_BACKOFF_MAX_S", "300"))
+KEEP_SENT_S = 86400.0  # sent rows are kept this long (they anchor the coalescing window)
+
+LOG_ENDPOINT = "log"
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS outbox (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    endpoint TEXT NOT NULL,
+    student TEXT NOT NULL,
+    payload TEXT NOT NULL,
+    score INTEGER NOT NULL,
+    count INTEGER NOT NULL DEFAULT 1,
+    version INTEGER NOT NULL DEFAULT 1,
+    status TEXT NOT NULL DEFAULT 'pending',  -- pending | sent | dead
+    attempts INTEGER NOT NULL DEFAULT 0,
+    due_at REAL NOT NULL,
+    created_at REAL NOT NULL,
+    sent_at REAL,
+    last_error TEXT
+);
+CREATE INDEX IF NOT EXISTS ix_outbox_due ON outbox(status, due_at);
+CREATE INDEX IF NOT EXISTS ix_outbox_student ON outbox(endpoint, student, status);
+"""
+
+
+def endpoint_for(college: Optional[str]) -> str:
+    return COLLEGE_WEBHOOKS.get(college or "") or WEBHOOK_URL or LOG_ENDPOINT
+
+
+class Dispatcher:
+    def __init__(self, path: str = OUTBOX_PATH, coalesce_s: float = COALESCE_S, batch_size: int = BATCH_SIZE):
+        self.path = path
+        self.coalesce_s = coalesce_s
+        self.batch_size = batch_size
+        self._lock = threading.Lock()
+        self._conn = None
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._thread = None
+        self._http = None
+        self.enqueued = 0
+        self.coalesced = 0
+        self.delivered = 0
+        self.batches = 0
+        self.failures = 0
+
+    # --- storage ---
+    def _db(self) -> sqlite3.Connection:
+        if self._conn is None:
+            conn = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.executescript(_SCHEMA)
+            self._conn = conn
+        return self._conn
+
+    def enqueue(self, payload: dict, endpoint: str) -> int:
+        """Persist one escalation (merging it into an open window); returns the outbox row id."""
+        student = payload.get("student_email") or payload.get("student_name") or "?"
+        score = int(payload.get("score") or 0)
+        now = time.time()
+        with self._lock:
+            db = self._db()
+            db.execute("BEGIN IMMEDIATE")
+            try:
+                row = db.execute(
+                    "SELECT id, score, payload, count FROM outbox WHERE endpoint=? AND student=? "
+                    "AND status='pending' ORDER BY id DESC LIMIT 1", (endpoint, student)).fetchone()
+                last = db.execute(
+                    "SELECT sent_at, score FROM outbox WHERE endpoint=? AND student=? AND status='sent' "
+                    "ORDER BY sent_at DESC LIMIT 1", (endpoint, student)).fetchone()
+                last_sent, last_score = last if last is not None else (None, None)
+                # worse than what the counsellor last saw (e.g. a suicidal 9 after a 7): no waiting
+                escalated = last_score is not None and score > last_score
+                if row is not None:
+                    # not delivered yet: fold into it, keeping the highest score
+                    row_id, old_score, old_payload, count = row
+                    merged = json.loads(old_payload)
+                    if score > old_score:
+                        merged.update(payload)
+                    merged["count"] = count + 1
+                    merged["last_seen"] = now
+                    db.execute("UPDATE outbox SET payload=?, score=?, count=?, version=version+1, "
+                               "due_at=CASE WHEN ? THEN MIN(due_at, ?) ELSE due_at END WHERE id=?",
+                               (json.dumps(merged), max(score, old_score), count + 1, escalated, now, row_id))
+                    self.coalesced += 1
+                else:
+                    # first in a window goes now; a repeat waits for the window to close
+                    if last_sent is None or escalated or now - last_sent >= self.coalesce_s:
+                        due = now
+                    else:
+                        due = last_sent + self.coalesce_s
+                    body = dict(payload, count=1, first_seen=now, last_seen=now)
+                    row_id = db.execute(
+                        "INSERT INTO outbox (endpoint, student, payload, score, due_at, created_at) "
+                        "VALUES (?, ?, ?, ?, ?, ?)",
+                        (endpoint, student, json.dumps(body), score, due, now)).lastrowid
+                db.execute("COMMIT")
+            except Exception:
+                db.execute("ROLLBACK")
+                raise
+            self.enqueued += 1
+        self._wake.set()
+        return row_id
+
+    # --- delivery ---
+    def start(self):
+        with self._lock:
+            if self._thread is not None:
+                return
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name="notify-dispatcher", daemon=True)
+            self._thread.start()
+
+    def stop(self, timeout: float = 5.0):
+        self._stop.set()
+        self._wake.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+            self._thread = None
+
+    def _run(self):
+        last_prune = 0.0
+        while not self._stop.is_set():
+            self._wake.clear()  # before delivering, so an enqueue during delivery isn't missed
+            try:
+                next_due = self.deliver_due()
+            except Exception:
+                logger.exception("notification dispatch failed")
+                next_due = time.time() + 5
+            if time.time() - last_prune > 3600:
+                self._prune()
+                last_prune = time.time()
+            wait = 5.0 if next_due is None else max(0.0, min(5.0, next_due - time.time()))
+            if wait:
+                self._wake.wait(wait)
+
+    def deliver_due(self) -> Optional[float]:
+        """Send everything that is due; returns when the next row falls due (None if none)."""
+        now = time.time()
+        with self._lock:
+            rows = self._db().execute(
+                "SELECT id, endpoint, payload, version, attempts FROM outbox WHERE status='pending' "
+                "AND due_at <= ? ORDER BY due_at LIMIT ?", (now, self.batch_size * 20)).fetchall()
+        by_endpoint = {}
+        for r in rows:
+            by_endpoint.setdefault(r[1], []).append(r)
+        for endpoint, items in by_endpoint.items():
+            for i in range(0, len(items), self.batch_size):
+                self._deliver(endpoint, items[i:i + self.batch_size])
+        with self._lock:
+            return self._db().execute("SELECT MIN(due_at) FROM outbox WHERE status='pending'").fetchone()[0]
+
+    def _post(self, endpoint: str, notifications: list):
+        if endpoint == LOG_ENDPOINT:
+            for n in notifications:
+                logger.info("NOTIFY_COUNSELLOR: %s", n)
+            return
+        if self._http is None:
+            import requests
+            self._http = requests.Session()  # keep-alive across batches
+        r = self._http.post(endpoint, json={"notifications": notifications}, timeout=TIMEOUT_S)
+        r.raise_for_status()
+
+    def _deliver(self, endpoint: str, rows):
+        notifications = [dict(json.loads(payload), notification_id=row_id) for row_id, _, payload, _, _ in rows]
+        try:
+            self._post(endpoint, notifications)
+        except Exception as e:
+            now = time.time()
+            with self._lock:
+                self.failures += 1
+                db = self._db()
+                db.execute("BEGIN IMMEDIATE")
+                for row_id, _, _, _, attempts in rows:
+                    attempts += 1
+                    if attempts >= MAX_ATTEMPTS:
+                        db.execute("UPDATE outbox SET status='dead', attempts=?, last_error=? WHERE id=?",
+                                   (attempts, str(e)[:500], row_id))
+                    else:
+                        delay = min(BACKOFF_MAX_S, BACKOFF_BASE_S * 2 ** (attempts - 1)) * random.uniform(0.8, 1.2)
+                        db.execute("UPDATE outbox SET attempts=?, due_at=?, last_error=? WHERE id=?",
+                                   (attempts, now + delay, str(e)[:500], row_id))
+                db.execute("COMMIT")
+            logger.warning("notification delivery to %s failed (%d rows): %r", endpoint, len(rows), e)
+            return
+        now = time.time()
+        with self._lock:
+            db = self._db()
+            db.execute("BEGIN IMMEDIATE")
+            for row_id, _, _, version, _ in rows:
+                cur = db.execute("UPDATE outbox SET status='sent', sent_at=? WHERE id=? AND version=?",
+                                 (now, row_id, version))
+                if cur.rowcount == 0:
+                    # merged into while in flight: it stays pending as the window's follow-up
+                    db.execute("UPDATE outbox SET due_at=? WHERE id=?", (now + self.coalesce_s, row_id))
+            db.execute("COMMIT")
+            self.delivered += len(rows)
+            self.batches += 1
+
+    def _prune(self):
+        with self._lock:
+            self._db().execute("DELETE FROM outbox WHERE status='sent' AND sent_at < ?", (time.time() - KEEP_SENT_S,))
+
+    def stats(self) -> dict:
+        with self._lock:
+            counts = dict(self._db().execute("SELECT status, COUNT(*) FROM outbox GROUP BY status").fetchall())
+            return {"running": self._thread is not None, "pending": counts.get("pending", 0),
+                    "dead": counts.get("dead", 0), "enqueued": self.enqueued, "coalesced": self.coalesced,
+                    "delivered": self.delivered, "batches": self.batches, "failed_attempts": self.failures}
+
+
+dispatcher = Dispatcher()
+
+
 def notify_counsellor(score_obj: dict, user_info: dict):
     """
-    For hackathon: log. Replace with email, webhook, SMS or internal dashboard event.
+    Queue a counsellor notification; delivery happens on the dispatcher thread.
     Only send numeric score + minimal identifying info (name, college, enrollment).
     Do NOT send chat transcripts.
     """
@@ -17,6 +269,5 @@ def notify_counsellor(score_obj: dict, user_info: dict):
         "score": score_obj["score"],
         "reason": score_obj.get("reason")
     }
-    logger.info("NOTIFY_COUNSELLOR: %s", payload)
-    # For hackathon, we just log. Real: send to secured counsellor webhook or create a DB record.
+    dispatcher.enqueue(payload, endpoint_for(user_info.get("college")))
     return True
@@ -1,122 +1,358 @@
 # backend/main.py
-from fastapi import FastAPI, Depends, HTTPException, status, Body
+from fastapi import FastAPI, Depends, HTTPException, status, Body, Query, Header, Request
+from fastapi.responses import StreamingResponse
 from fastapi.security import OAuth2PasswordRequestForm
-from sqlalchemy.orm import Session
-from datetime import timedelta
-from . import db, models, schemas, auth, chatbot, risk, notify
+from sqlalchemy import and_, or_, select
+from sqlalchemy.ext.asyncio import AsyncSession
+from datetime import datetime, timedelta
+import asyncio
+import json
+from typing import Optional
+from . import archive, db, models, schemas, auth, chatbot, events, metrics, risk, notify, rollups, scoring, passwords, writebehind
 from .db import engine
 from .models import User, ChatMessage, RiskScore, UserMemory, CounselorProfile
 
+db.check_schema(engine, models.Base.metadata)  # existing tables need the migrations first
 models.Base.metadata.create_all(bind=engine)
 
 app = FastAPI(title="Virtual Friend + Mental Sentinel (Hackathon MVP)")
 
-# simple dependency
-def get_db():
-    gen = db.SessionLocal()
-    try:
-        yield gen
-    finally:
-        gen.close()
+metrics.install(app)  # per-endpoint latency + GET /metrics
+
+# queue depths and store sizes, read at scrape time
+metrics.callback("scoring_jobs", "Scoring jobs not yet done, by status.",
+                 lambda: {k: scoring.pool.stats()[k] for k in ("pending", "running", "failed")}, ["status"])
+metrics.callback("write_behind_queued", "Writes waiting for the next group commit.",
+                 lambda: writebehind.buffer.stats()["queued"])
+metrics.callback("notify_outbox", "Counsellor notifications in the outbox, by status.",
+                 lambda: {k: notify.dispatcher.stats()[k] for k in ("pending", "dead")}, ["status"])
+metrics.callback("risk_batcher_queued", "Messages waiting for a model batch.",
+                 lambda: {name: b["queued"] for name, b in risk.batcher_stats().items()}, ["batcher"])
+metrics.callback("llm_in_flight", "LLM provider requests in flight.", lambda: chatbot.llm.stats()["in_flight"])
+metrics.callback("llm_fallbacks_total", "Replies served by the keyword fallback, by reason.",
+                 lambda: chatbot.llm.stats()["fallbacks"], ["reason"], type="counter")
+metrics.callback("password_hash_waiting", "Password hashes waiting for the hashing executor.",
+                 lambda: passwords.hasher.stats()["waiting"])
+metrics.callback("events_subscribers", "Open counsellor event streams.", lambda: events.bus.stats()["subscribers"])
+
+# simple dependency: async session (aiosqlite / asyncpg); writes go through db.writer()
+# (one lock shared with the scoring and write-behind threads: a single writer per process)
+get_db = db.get_async_db
+
+@app.on_event("startup")
+def warm_risk_models():
+    # load transformer pipelines in the background; /chat uses heuristics until ready
+    risk.warm_up()
+    writebehind.buffer.start()
+    scoring.pool.start()
+    notify.dispatcher.start()
+
+@app.on_event("shutdown")
+def stop_workers():
+    scoring.pool.stop()
+    writebehind.buffer.stop()  # flush pending chat/risk writes
+    passwords.hasher.shutdown()
+    notify.dispatcher.stop()  # undelivered notifications stay in the outbox
 
+@app.on_event("shutdown")
+async def close_llm_client():
+    await chatbot.llm.aclose()
+
+@app.get("/health")
+def health():
+    """Liveness/readiness: risk scoring is 'heuristic-only' until the models are loaded."""
+    return {"ok": True, "risk_models": risk.model_status(), "risk_cache": risk.cache_stats(),
+            "scoring": scoring.pool.stats(), "principal_cache": auth.principal_cache.stats(),
+            "password_hashing": passwords.hasher.stats(), "write_behind": writebehind.buffer.stats(),
+            "llm": chatbot.llm.stats(), "events": events.bus.stats(),
+            "notifications": notify.dispatcher.stats()}
+
+# waiting on bcrypt (which runs on the bounded hashing executor) doesn't hold a worker thread
 @app.post("/register", response_model=dict)
-def register(user_in: schemas.UserCreate, db_session: Session = Depends(get_db)):
+async def register(user_in: schemas.UserCreate, db_session: AsyncSession = Depends(get_db)):
     # basic user creation; in demo password is saved hashed
-    existing = db_session.query(User).filter(User.email == user_in.email).first()
+    existing = (await db_session.execute(select(User).where(User.email == user_in.email))).scalars().first()
     if existing:
         raise HTTPException(status_code=400, detail="Email already registered")
-    hashed = auth.get_password_hash(user_in.password)
+    hashed = await auth.hash_password_async(user_in.password)
     user = User(email=user_in.email, phone=user_in.phone, hashed_password=hashed,
                 full_name=user_in.full_name, college=user_in.college, enrollment=user_in.enrollment)
     db_session.add(user)
-    db_session.commit()
+    async with db.writer():
+        await db_session.commit()
     return {"ok": True, "email": user.email}
 
 @app.post("/token", response_model=schemas.Token)
-def login(form_data: OAuth2PasswordRequestForm = Depends(), db_session: Session = Depends(get_db)):
-    user = db_session.query(User).filter(User.email == form_data.username).first()
-    if not user or not auth.verify_password(form_data.password, user.hashed_password):
+async def login(form_data: OAuth2PasswordRequestForm = Depends(), db_session: AsyncSession = Depends(get_db)):
+    user = (await db_session.execute(select(User).where(User.email == form_data.username))).scalars().first()
+    if not user:
         raise HTTPException(status_code=400, detail="Incorrect credentials")
+    ok, new_hash = await auth.verify_and_update_async(form_data.password, user.hashed_password)
+    if not ok:
+        raise HTTPException(status_code=400, detail="Incorrect credentials")
+    if new_hash:
+        # stored hash used a different work factor: upgrade it transparently
+        user.hashed_password = new_hash
+        async with db.writer():
+            await db_session.commit()
     access_token_expires = timedelta(minutes=auth.ACCESS_TOKEN_EXPIRE_MINUTES)
     token = auth.create_access_token({"sub": user.email, "role": user.role}, expires_delta=access_token_expires)
     return {"access_token": token, "token_type": "bearer"}
 
 @app.post("/link_portal")
-def link_portal(link: dict = Body(...), current_user: User = Depends(auth.get_current_user), db_session: Session = Depends(get_db)):
+async def link_portal(link: dict = Body(...), current_user: auth.Principal = Depends(auth.get_current_user), db_session: AsyncSession = Depends(get_db)):
     """
     Placeholder endpoint where student provides the college portal URL + credentials.
     DO NOT store raw portal credentials in plain text in production. Use OAuth / secure vault.
     """
     portal_url = link.get("portal_url")
-    # save placeholder
-    current_user.linked_portal = portal_url
-    db_session.add(current_user)
-    db_session.commit()
+    # save placeholder (the update invalidates the cached principal)
+    user = await db_session.get(User, current_user.id)
+    user.linked_portal = portal_url
+    async with db.writer():
+        await db_session.commit()
     return {"ok": True, "portal_url": portal_url, "note": "Portal integration placeholder - implement college-specific connector."}
 
 @app.post("/chat", response_model=schemas.ChatOut)
-def chat(payload: schemas.ChatIn, current_user: User = Depends(auth.get_current_user), db_session: Session = Depends(get_db)):
-    # 1) persist chat message
-    msg = ChatMessage(user_id=current_user.id, role="user", text=payload.text)
-    db_session.add(msg)
-    db_session.commit()
+async def chat(payload: schemas.ChatIn, current_user: auth.Principal = Depends(auth.get_current_user)):
+    # 1) student message + its scoring job (risk analysis and escalation run in the
+    #    background scoring workers)
+    msg = ChatMessage(user_id=current_user.id, role="user", text=payload.text, timestamp=datetime.utcnow())
+    job = scoring.make_job(current_user.id, msg)
 
     # 2) generate reply
     user_profile = {"email": current_user.email, "college": current_user.college, "enrollment": current_user.enrollment}
-    reply_text = chatbot.generate_reply(user_profile, payload.text)
-
+    with metrics.stage("chat.generate_reply"):
+        reply_text = await chatbot.generate_reply_async(user_profile, payload.text)
     bot_msg = ChatMessage(user_id=current_user.id, role="bot", text=reply_text)
-    db_session.add(bot_msg)
-    db_session.commit()
 
-    # 3) risk analyze (synchronous for hackathon - in prod do async/background)
-    # compute behavioral meta (very simple: count of messages)
-    history_meta = {"behavioral_change": 0.0}
-    count_msgs = db_session.query(ChatMessage).filter(ChatMessage.user_id==current_user.id).count()
-    if count_msgs >= 10:
-        # trivial heuristic for demo: if >10 messages and many late-night (not implemented) -> raise
-        history_meta["behavioral_change"] = 0.1
+    # 3) one write for all three rows, group-committed with concurrent requests
+    with metrics.stage("chat.db_write"):
+        await writebehind.buffer.submit_async(msg, job, bot_msg, on_done=lambda _: scoring.pool.wake())
 
-    score_obj = risk.compute_risk_score(payload.text, user_history_meta=history_meta)
+    return {"reply": reply_text}
 
-    # store risk but only if escalate or above low threshold (we keep history anyway, but mark)
-    if score_obj["score"] >= 4:
-        rs = RiskScore(user_id=current_user.id, score=score_obj["score"], reason=score_obj.get("reason"))
-        db_session.add(rs)
-        db_session.commit()
+def _sse(event: str, data: dict) -> str:
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
 
-    # escalate to counsellor if required
-    if score_obj["escalate"]:
-        notify.notify_counsellor(score_obj, user_profile)
+@app.post("/chat/stream")
+async def chat_stream(payload: schemas.ChatIn, current_user: auth.Principal = Depends(auth.get_current_user)):
+    """
+    Streaming /chat (Server-Sent Events): `token` events carry reply fragments as they
+    are generated, then one `done` event with the full reply. The student message and
+    its scoring job are queued before the first token, so risk scoring runs while the
+    reply streams.
+    """
+    msg = ChatMessage(user_id=current_user.id, role="user", text=payload.text, timestamp=datetime.utcnow())
+    job = scoring.make_job(current_user.id, msg)
+    written = writebehind.buffer.submit(msg, job)
+    written.add_done_callback(lambda _: scoring.pool.wake())
+    user_profile = {"email": current_user.email, "college": current_user.college, "enrollment": current_user.enrollment}
 
-    return {"reply": reply_text}
+    async def events():
+        parts = []
+        try:
+            async for tok in chatbot.stream_reply(user_profile, payload.text):
+                parts.append(tok)
+                yield _sse("token", {"t": tok})
+            if writebehind.buffer.durability == "flush":
+                await asyncio.wrap_future(written)
+            yield _sse("done", {"reply": "".join(parts)})
+        except Exception:
+            yield _sse("error", {"detail": "chat failed"})
+            raise
+        finally:
+            # keep whatever was sent, even if the client went away mid-stream
+            if parts:
+                writebehind.buffer.submit(ChatMessage(user_id=current_user.id, role="bot", text="".join(parts)))
+
+    return StreamingResponse(events(), media_type="text/event-stream",
+                             headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+@app.get("/history")
+def chat_history(start: Optional[datetime] = None, end: Optional[datetime] = None,
+                 current_user: auth.Principal = Depends(auth.get_current_user)):
+    """
+    The student's own chat history, oldest first, as NDJSON ({id, role, text, ts} per
+    line): archived messages from the segment files, then the hot table. Streamed, so
+    years of history never sit in memory at once. start/end without an offset are UTC.
+    """
+    t = ChatMessage.__table__
+    start, end = db.naive_utc(start), db.naive_utc(end)  # stored timestamps are naive UTC
+    start_s = start.isoformat(timespec="microseconds") if start else None
+    end_s = end.isoformat(timespec="microseconds") if end else None
+
+    def lines():
+        for rec in archive.reader.read_user(current_user.id, start_s, end_s):
+            yield json.dumps({k: rec[k] for k in ("id", "role", "text", "ts")}) + "\n"
+        q = select(t.c.id, t.c.role, t.c.text, t.c.timestamp).where(t.c.user_id == current_user.id)
+        if start:
+            q = q.where(t.c.timestamp >= start)
+        if end:
+            q = q.where(t.c.timestamp <= end)
+        with engine.connect() as conn:
+            for r in conn.execute(q.order_by(t.c.timestamp, t.c.id)):
+                yield json.dumps({"id": r.id, "role": r.role, "text": r.text,
+                                  "ts": r.timestamp.isoformat(timespec="microseconds") if r.timestamp else None}) + "\n"
+
+    # a sync iterator: Starlette runs it in the threadpool
+    return StreamingResponse(lines(), media_type="application/x-ndjson")
+
+@app.post("/admin/users/{user_id}/role")
+async def set_user_role(user_id: int, body: dict = Body(...), current_user: auth.Principal = Depends(auth.require_role("admin")), db_session: AsyncSession = Depends(get_db)):
+    role = body.get("role")
+    if role not in ("student", "counsellor", "admin"):
+        raise HTTPException(status_code=400, detail="Unknown role")
+    user = await db_session.get(User, user_id)
+    if not user:
+        raise HTTPException(status_code=404, detail="User not found")
+    user.role = role
+    async with db.writer():
+        await db_session.commit()  # cached principal for this user is invalidated on update
+    return {"ok": True, "user_id": user_id, "role": role}
 
 # Counsellor endpoints
-@app.get("/counsellor/pending", response_model=list)
-def counsellor_pending(current_user: User = Depends(auth.require_role("counsellor")), db_session: Session = Depends(get_db)):
+@app.get("/counsellor/pending", response_model=dict)
+async def counsellor_pending(limit: int = Query(50, ge=1, le=200), cursor: Optional[str] = None,
+                       college: Optional[str] = None, min_score: Optional[int] = None,
+                       current_user: auth.Principal = Depends(auth.require_role("counsellor")), db_session: AsyncSession = Depends(get_db)):
+    """
+    Unacknowledged risk cases, newest first, one page at a time (keyset pagination).
+    Pass the returned next_cursor as `cursor` for the next page. Counsellors attached
+    to a college only see that college's students. `last_event_id` is where a live
+    dashboard should start following /counsellor/events.
+    """
+    college = _counsellor_college(current_user, college)
+    last_event_id = await asyncio.to_thread(events.bus.tail)  # taken before the query, so no event is missed
+    # single joined query; served by ix_risk_scores_ack_created
+    q = select(RiskScore.id, RiskScore.score, RiskScore.reason, RiskScore.created_at,
+               User.email, User.full_name, User.college, User.enrollment) \
+        .join(User, User.id == RiskScore.user_id) \
+        .where(RiskScore.acknowledged == False)
+    if college:
+        q = q.where(User.college == college)
+    if min_score is not None:
+        q = q.where(RiskScore.score >= min_score)
+    if cursor:
+        try:
+            ts, last_id = cursor.rsplit("|", 1)
+            ts, last_id = datetime.fromisoformat(ts), int(last_id)
+        except ValueError:
+            raise HTTPException(status_code=400, detail="Invalid cursor")
+        q = q.where(or_(RiskScore.created_at < ts, and_(RiskScore.created_at == ts, RiskScore.id < last_id)))
+    rows = (await db_session.execute(q.order_by(RiskScore.created_at.desc(), RiskScore.id.desc()).limit(limit + 1))).all()
     # return list of recent risky cases (anonymous minimally)
-    q = db_session.query(RiskScore).filter(RiskScore.acknowledged==False).order_by(RiskScore.created_at.desc()).all()
-    out = []
-    for r in q:
-        user = db_session.query(User).filter(User.id==r.user_id).first()
-        out.append({
-            "risk_id": r.id,
-            "score": r.score,
-            "reason": r.reason,
-            "created_at": r.created_at.isoformat(),
-            "student_email": user.email,
-            "student_name": user.full_name,
-            "college": user.college,
-            "enrollment": user.enrollment
-        })
-    return out
+    out = [{
+        "risk_id": r.id,
+        "score": r.score,
+        "reason": r.reason,
+        "created_at": r.created_at.isoformat(),
+        "student_email": r.email,
+        "student_name": r.full_name,
+        "college": r.college,
+        "enrollment": r.enrollment
+    } for r in rows[:limit]]
+    next_cursor = f"{rows[limit - 1].created_at.isoformat()}|{rows[limit - 1].id}" if len(rows) > limit else None
+    return {"items": out, "next_cursor": next_cursor, "last_event_id": last_event_id}
+
+def _counsellor_college(current_user: auth.Principal, college: Optional[str]) -> Optional[str]:
+    if current_user.college:
+        if college and college != current_user.college:
+            raise HTTPException(status_code=403, detail="Not your college")
+        return current_user.college
+    return college
+
+async def _trend(db_session: AsyncSession, scope: str, key: str, granularity: str,
+                 start: Optional[datetime], end: Optional[datetime]) -> dict:
+    try:
+        start, end = rollups.resolve_range(granularity, start, end)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    rows = (await db_session.execute(rollups.series_query(scope, key, granularity, start, end))).all()
+    prior = (await db_session.execute(rollups.prior_query(scope, key, granularity, start))).scalar()
+    return rollups.report(rows, prior, scope, key, granularity, start, end)
+
+@app.get("/counsellor/trends/student/{user_id}", response_model=dict)
+async def counsellor_student_trend(user_id: int, granularity: str = "day",
+                                   start: Optional[datetime] = None, end: Optional[datetime] = None,
+                                   current_user: auth.Principal = Depends(auth.require_role("counsellor")),
+                                   db_session: AsyncSession = Depends(get_db)):
+    """
+    A student's risk trend from the precomputed rollups: hour or day buckets with
+    count, mean, max, EWMA and escalations of their stored scores, and a summary
+    whose ewma_change > 0 means scores are trending worse over the range. Defaults
+    to the last 48 hours / 90 days.
+    """
+    student = await db_session.get(User, user_id)
+    if not student:
+        raise HTTPException(status_code=404, detail="User not found")
+    _counsellor_college(current_user, student.college)
+    return await _trend(db_session, "student", str(user_id), granularity, start, end)
+
+@app.get("/counsellor/trends/college", response_model=dict)
+async def counsellor_college_trend(college: Optional[str] = None, granularity: str = "day",
+                                   start: Optional[datetime] = None, end: Optional[datetime] = None,
+                                   current_user: auth.Principal = Depends(auth.require_role("counsellor")),
+                                   db_session: AsyncSession = Depends(get_db)):
+    """The same trend over all of a college's students (the counsellor's own college by default)."""
+    college = _counsellor_college(current_user, college)
+    if not college:
+        raise HTTPException(status_code=400, detail="college is required")
+    return await _trend(db_session, "college", college, granularity, start, end)
+
+EVENTS_KEEPALIVE_S = 15.0
+
+@app.get("/counsellor/events")
+async def counsellor_events(request: Request, last_event_id: Optional[str] = None, follow: bool = True,
+                            college: Optional[str] = None,
+                            last_event_id_header: Optional[str] = Header(None, alias="Last-Event-ID"),
+                            current_user: auth.Principal = Depends(auth.require_role("counsellor"))):
+    """
+    Server-Sent Events feed of `case` (new risk case) and `ack` events for the
+    counsellor's college. Resume with `last_event_id` (or the Last-Event-ID header
+    EventSource sends on reconnect); a `reset` event means the cursor could not be
+    resumed and the client should refetch /counsellor/pending. follow=false sends
+    what is buffered after the cursor and closes, for clients that poll.
+    """
+    college = _counsellor_college(current_user, college)
+    cursor = last_event_id or last_event_id_header
+
+    async def stream():
+        nonlocal cursor
+        yield "retry: 3000\n\n"
+        while True:
+            batch, reset, cursor = await asyncio.to_thread(events.bus.since, cursor, college=college)
+            if reset:
+                yield f"id: {cursor}\nevent: reset\ndata: {{}}\n\n"
+            for e in batch:
+                yield f"id: {e['id']}\nevent: {e['type']}\ndata: {json.dumps(e['data'])}\n\n"
+            if not follow:
+                # tell a polling client where to resume, even if nothing matched its college
+                yield f"id: {cursor}\nevent: cursor\ndata: {{}}\n\n"
+                return
+            if await request.is_disconnected():
+                return
+            if not await events.bus.wait(cursor, EVENTS_KEEPALIVE_S):
+                yield ": keepalive\n\n"
+
+    return StreamingResponse(stream(), media_type="text/event-stream",
+                             headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
 
 @app.post("/counsellor/ack/{risk_id}")
-def counsellor_ack(risk_id: int, current_user: User = Depends(auth.require_role("counsellor")), db_session: Session = Depends(get_db)):
-    r = db_session.query(RiskScore).filter(RiskScore.id==risk_id).first()
-    if not r:
+async def counsellor_ack(risk_id: int, current_user: auth.Principal = Depends(auth.require_role("counsellor")), db_session: AsyncSession = Depends(get_db)):
+    r = await db_session.get(RiskScore, risk_id)
+    student = await db_session.get(User, r.user_id) if r else None
+    college = student.college if student else None
+    # same scope as /counsellor/pending: another college's case is not found
+    if not r or (current_user.college and college != current_user.college):
         raise HTTPException(status_code=404, detail="Risk not found")
+    was_acknowledged = r.acknowledged
     r.acknowledged = True
-    db_session.add(r)
-    db_session.commit()
+    if not was_acknowledged:
+        # the event commits with the acknowledgement
+        events.record(db_session, "ack", {"risk_id": risk_id, "by": current_user.email}, college=college)
+    async with db.writer():
+        await db_session.commit()
+    if not was_acknowledged:
+        events.bus.notify()
     return {"ok": True}
@@ -1,4 +1,5 @@
 #!/usr/bin/env bash
 # simple helper to run backend + frontend locally (Unix)
+alembic -c backend/alembic.ini upgrade head
 uvicorn backend.main:app --reload --port 8000 &
 streamlit run frontend/streamlit_app.py --server.port 8501
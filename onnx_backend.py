@@ -0,0 +1,125 @@
+# backend/onnx_backend.py
+"""
+Quantized ONNX Runtime backend for the risk models (RISK_BACKEND=onnx).
+
+Both classifiers (sentiment and emotion) are exported from their Hugging Face
+checkpoints to ONNX once, dynamically quantized to int8 weights, and cached under
+RISK_ONNX_DIR. At runtime they run on onnxruntime's CPU provider with
+RISK_ONNX_THREADS intra-op threads and full graph optimizations; no PyTorch in the
+serving path.
+
+The two checkpoints use different vocabularies (DistilBERT WordPiece vs RoBERTa BPE),
+so a message cannot literally share one token sequence. Instead each batch is
+tokenized once per model, padded only to its longest message, and both models run
+in one call, so a message goes through the micro-batcher once for both outputs.
+
+    python -m backend.onnx_backend --export      # build the cache ahead of deploy
+"""
+import argparse
+import os
+import time
+from typing import Dict, List, Tuple
+
+ONNX_DIR = os.environ.get("RISK_ONNX_DIR", "./onnx_models")
+THREADS = int(os.environ.get("RISK_ONNX_THREADS", str(os.cpu_count() or 1)))
+QUANTIZED = os.environ.get("RISK_ONNX_QUANTIZE", "1") != "0"
+MAX_LENGTH = 512
+OPSET = 14
+
+
+def model_dir(model_id: str, root: str = ONNX_DIR) -> str:
+    return os.path.join(root, model_id.replace("/", "--"))
+
+
+def export(model_id: str, out_dir: str = None, quantize: bool = True) -> str:
+    """Export a sequence-classification checkpoint to ONNX (+ int8 copy); returns out_dir."""
+    import torch
+    from transformers import AutoModelForSequenceClassification, AutoTokenizer
+
+    out_dir = out_dir or model_dir(model_id)
+    os.makedirs(out_dir, exist_ok=True)
+    tokenizer = AutoTokenizer.from_pretrained(model_id)
+    model = AutoModelForSequenceClassification.from_pretrained(model_id).eval()
+    sample = tokenizer(["export sample", "a second, longer export sample"], padding=True, return_tensors="pt")
+    fp32 = os.path.join(out_dir, "model.onnx")
+    axes = {"input_ids": {0: "batch", 1: "seq"}, "attention_mask": {0: "batch", 1: "seq"}, "logits": {0: "batch"}}
+    with torch.no_grad():
+        torch.onnx.export(model, (sample["input_ids"], sample["attention_mask"]), fp32,
+                          input_names=["input_ids", "attention_mask"], output_names=["logits"],
+                          dynamic_axes=axes, opset_version=OPSET)
+    if quantize:
+        from onnxruntime.quantization import QuantType, quantize_dynamic
+        quantize_dynamic(fp32, os.path.join(out_dir, "model.int8.onnx"), weight_type=QuantType.QInt8)
+    tokenizer.save_pretrained(out_dir)
+    model.config.save_pretrained(out_dir)
+    return out_dir
+
+
+class OnnxClassifier:
+    def __init__(self, path: str, threads: int = THREADS, quantized: bool = QUANTIZED):
+        import onnxruntime as ort
+        from transformers import AutoConfig, AutoTokenizer
+
+        opts = ort.SessionOptions()
+        opts.intra_op_num_threads = threads
+        opts.inter_op_num_threads = 1
+        opts.execution_mode = ort.ExecutionMode.ORT_SEQUENTIAL
+        opts.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        model_file = os.path.join(path, "model.int8.onnx" if quantized else "model.onnx")
+        self.session = ort.InferenceSession(model_file, opts, providers=["CPUExecutionProvider"])
+        self.input_names = {i.name for i in self.session.get_inputs()}
+        self.tokenizer = AutoTokenizer.from_pretrained(path)
+        config = AutoConfig.from_pretrained(path)
+        self.labels = [config.id2label[i] for i in range(len(config.id2label))]
+
+    def probabilities(self, texts: List[str]):
+        import numpy as np
+        enc = self.tokenizer(texts, padding=True, truncation=True, max_length=MAX_LENGTH, return_tensors="np")
+        feeds = {k: v.astype(np.int64) for k, v in enc.items() if k in self.input_names}
+        logits = self.session.run(["logits"], feeds)[0]
+        e = np.exp(logits - logits.max(axis=1, keepdims=True))
+        return e / e.sum(axis=1, keepdims=True)
+
+
+class OnnxRiskModels:
+    """Sentiment + emotion in one call, with outputs shaped like the transformers pipelines."""
+
+    def __init__(self, sentiment_model: str, emotion_model: str, threads: int = THREADS,
+                 quantized: bool = QUANTIZED, root: str = ONNX_DIR):
+        t0 = time.perf_counter()
+        dirs = []
+        for model_id in (sentiment_model, emotion_model):
+            path = model_dir(model_id, root)
+            wanted = os.path.join(path, "model.int8.onnx" if quantized else "model.onnx")
+            if not os.path.exists(wanted):
+                export(model_id, path, quantize=quantized)
+            dirs.append(path)
+        self.sentiment = OnnxClassifier(dirs[0], threads, quantized)
+        self.emotion = OnnxClassifier(dirs[1], threads, quantized)
+        self.load_seconds = time.perf_counter() - t0
+
+    def __call__(self, texts: List[str]) -> List[Tuple[Dict, List[Dict]]]:
+        """Per text: (sentiment {label, score}, emotions [{label, score}, ...])."""
+        sent = self.sentiment.probabilities(texts)
+        emo = self.emotion.probabilities(texts)
+        out = []
+        for s, e in zip(sent, emo):
+            best = int(s.argmax())
+            out.append(({"label": self.sentiment.labels[best], "score": float(s[best])},
+                        [{"label": label, "score": float(p)} for label, p in zip(self.emotion.labels, e)]))
+        return out
+
+
+def main():
+    from . import risk
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--export", action="store_true", help="export and quantize both models into RISK_ONNX_DIR")
+    ap.add_argument("--dir", default=ONNX_DIR)
+    args = ap.parse_args()
+    if args.export:
+        for model_id in (risk.SENTIMENT_MODEL, risk.EMOTION_MODEL):
+            print("exported", export(model_id, model_dir(model_id, args.dir)))
+
+
+if __name__ == "__main__":
+    main()
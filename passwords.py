@@ -0,0 +1,147 @@
+# backend/passwords.py
+"""
+Password hashing off the request path.
+
+bcrypt burns hundreds of milliseconds of CPU per call. /register and /token hand it to
+a dedicated executor (a process pool by default, so it never holds the API process's
+GIL) behind a semaphore that caps in-flight hashes; everything over the cap waits its
+turn instead of eating the request threadpool. The bcrypt work factor comes from
+BCRYPT_ROUNDS, and hashes made with a different cost are re-hashed on the next
+successful login (see verify_and_update).
+"""
+import asyncio
+import multiprocessing
+import os
+import threading
+import time
+import weakref
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Optional, Tuple
+
+from passlib.context import CryptContext
+
+ROUNDS = int(os.environ.get("BCRYPT_ROUNDS", "12"))
+EXECUTOR = os.environ.get("HASH_EXECUTOR", "process")  # process | thread
+WORKERS = int(os.environ.get("HASH_WORKERS", str(max(1, (os.cpu_count() or 2) // 2))))
+MAX_IN_FLIGHT = int(os.environ.get("HASH_MAX_IN_FLIGHT", str(WORKERS * 2)))
+
+
+def make_context(rounds: int = ROUNDS) -> CryptContext:
+    # min == max == default: any other cost is reported as needing an update
+    return CryptContext(schemes=["bcrypt"], deprecated="auto", bcrypt__default_rounds=rounds,
+                        bcrypt__min_rounds=rounds, bcrypt__max_rounds=rounds)
+
+
+pwd_context = make_context()
+
+
+# --- executed inside the pool (module-level so they pickle) ---
+def _hash_job(password: str):
+    started = time.time()
+    return pwd_context.hash(password), started
+
+def _verify_job(password: str, hashed: str):
+    started = time.time()
+    return pwd_context.verify_and_update(password, hashed), started
+
+
+class HashExecutor:
+    def __init__(self, kind: str = EXECUTOR, workers: int = WORKERS, max_in_flight: int = MAX_IN_FLIGHT):
+        self.kind = kind
+        self.workers = workers
+        self.max_in_flight = max_in_flight
+        self._executor = None
+        self._semaphores = weakref.WeakKeyDictionary()  # event loop -> asyncio.Semaphore
+        self._lock = threading.Lock()
+        self.submitted = 0
+        self.completed = 0
+        self.errors = 0
+        self.waiting = 0
+        self.in_flight = 0
+        self._wait_total = 0.0
+        self._wait_max = 0.0
+        self._run_total = 0.0
+
+    def _get_executor(self):
+        with self._lock:
+            if self._executor is None:
+                if self.kind == "thread":
+                    self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="pwhash")
+                else:
+                    # spawn: the API process has live threads, forking it is unsafe
+                    self._executor = ProcessPoolExecutor(max_workers=self.workers,
+                                                         mp_context=multiprocessing.get_context("spawn"))
+            return self._executor
+
+    def _semaphore(self) -> asyncio.Semaphore:
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            sem = self._semaphores.get(loop)
+            if sem is None:
+                sem = self._semaphores[loop] = asyncio.Semaphore(self.max_in_flight)
+            return sem
+
+    async def run(self, fn, *args):
+        enqueued = time.time()
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            self.submitted += 1
+            self.waiting += 1
+        acquired = False
+        try:
+            async with self._semaphore():
+                acquired = True
+                with self._lock:
+                    self.waiting -= 1
+                    self.in_flight += 1
+                try:
+                    result, started = await loop.run_in_executor(self._get_executor(), fn, *args)
+                except Exception:
+                    with self._lock:
+                        self.errors += 1
+                    raise
+                finally:
+                    with self._lock:
+                        self.in_flight -= 1
+        finally:
+            if not acquired:  # cancelled while queued
+                with self._lock:
+                    self.waiting -= 1
+        done = time.time()
+        with self._lock:
+            self.completed += 1
+            wait = max(0.0, started - enqueued)  # queue time: semaphore + executor backlog
+            self._wait_total += wait
+            self._wait_max = max(self._wait_max, wait)
+            self._run_total += done - started
+        return result
+
+    def stats(self) -> dict:
+        with self._lock:
+            n = self.completed
+            return {
+                "executor": self.kind, "workers": self.workers, "max_in_flight": self.max_in_flight,
+                "rounds": ROUNDS, "submitted": self.submitted, "completed": n, "errors": self.errors,
+                "waiting": self.waiting, "in_flight": self.in_flight,
+                "avg_queue_ms": round(self._wait_total / n * 1000, 2) if n else 0.0,
+                "max_queue_ms": round(self._wait_max * 1000, 2),
+                "avg_hash_ms": round(self._run_total / n * 1000, 2) if n else 0.0,
+            }
+
+    def shutdown(self):
+        with self._lock:
+            ex, self._executor = self._executor, None
+        if ex is not None:
+            ex.shutdown(wait=False, cancel_futures=True)
+
+
+hasher = HashExecutor()
+
+
+async def hash_password(password: str) -> str:
+    return await hasher.run(_hash_job, password)
+
+
+async def verify_and_update(password: str, hashed: str) -> Tuple[bool, Optional[str]]:
+    """(ok, new_hash); new_hash is set when the stored hash used another work factor."""
+    return await hasher.run(_verify_job, password, hashed)
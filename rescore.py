@@ -0,0 +1,233 @@
+# backend/rescore.py
+"""
+Bulk re-scoring of historical student messages after a lexicon or model change.
+
+    python -m backend.rescore --workers 8 --chunk-size 5000
+    python -m backend.rescore --models --batched --workers 32   # transformer path via the micro-batcher
+    python -m backend.rescore --resume                # continue an interrupted run
+    python -m backend.rescore --source archive        # messages moved out by archive.py
+
+chat_messages is streamed with keyset pagination (id > last ORDER BY id LIMIT n), so the
+table is never loaded into memory. Each chunk is scored in a process pool (or, with
+--batched, by threads feeding risk.py's batched model path) while the next chunk is read,
+then its risk_scores rows are replaced in one transaction, each tagged with the version of
+the scorer path that produced it.
+The last committed message id goes to a checkpoint file after every chunk.
+
+With --source archive the messages are streamed from the archive segments instead
+(archive.ArchiveReader.scan_from, memory-mapped, block by block). Their rows have no
+message_id (the message is no longer in chat_messages) and are replaced per
+(user_id, created_at, scorer version); the checkpoint holds the archive position
+(segment, offset) after the last message done, which later archive runs don't move.
+
+Backfilled rows use source="rescore" and are stored as acknowledged so they never show
+up in the live counsellor queue. No behavioral history meta is reconstructed.
+"""
+import argparse
+import json
+import os
+import time
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from datetime import datetime
+from itertools import islice
+
+from sqlalchemy import select, tuple_
+
+from . import archive, db, risk, scoring
+from .models import ChatMessage, RiskScore
+
+
+def _init_worker(use_models: bool):
+    if use_models:
+        risk.warm_up(block=True)
+    else:
+        # heuristic-only: don't start a model load in every child, nor ask a model server
+        risk.USE_MODELS = False
+        risk.MODEL_SERVER = None
+
+
+def _score_texts(texts):
+    out = []
+    for t in texts:
+        r = risk.compute_risk_score(t or "")
+        out.append((r["score"], r["reason"], r["version"]))
+    return out
+
+
+def _split(items, parts):
+    step = max(1, -(-len(items) // parts))
+    return [items[i:i + step] for i in range(0, len(items), step)]
+
+
+def _read_checkpoint(path):
+    if not path or not os.path.exists(path):
+        return None
+    with open(path) as f:
+        return json.load(f)
+
+
+def _write_checkpoint(path, state):
+    tmp = path + ".tmp"
+    with open(tmp, "w") as f:
+        json.dump(state, f)
+    os.replace(tmp, path)
+
+
+def fetch_chunk(conn, after_id: int, size: int):
+    t = ChatMessage.__table__
+    q = select(t.c.id, t.c.user_id, t.c.text, t.c.timestamp) \
+        .where(t.c.role == "user", t.c.id > after_id).order_by(t.c.id).limit(size)
+    return conn.execute(q).all()
+
+
+ArchivedMessage = namedtuple("ArchivedMessage", "id user_id text timestamp pos")
+
+
+def archive_chunks(reader, after, size: int):
+    """Chunks of archived student messages after archive position `after` (None: from the start)."""
+    msgs = (ArchivedMessage(r["id"], r["user_id"], r["text"], datetime.fromisoformat(r["ts"]), pos)
+            for pos, r in reader.scan_from(after) if r["role"] == "user")
+    while True:
+        chunk = list(islice(msgs, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+def write_archived_chunk(rows, scores, min_score: int):
+    t = RiskScore.__table__
+    keys = [(r.user_id, r.timestamp) for r in rows]
+    versions = sorted({v for _, _, v in scores})
+    values = [
+        {"user_id": r.user_id, "message_id": None, "source": "rescore", "scorer_version": version,
+         "score": score, "reason": reason, "created_at": r.timestamp, "acknowledged": True}
+        for r, (score, reason, version) in zip(rows, scores) if score >= min_score
+    ]
+    with db.engine.begin() as conn:
+        for k in range(0, len(keys), 500):
+            conn.execute(t.delete().where(t.c.source == "rescore", t.c.scorer_version.in_(versions),
+                                          t.c.message_id.is_(None),
+                                          tuple_(t.c.user_id, t.c.created_at).in_(keys[k:k + 500])))
+        if values:
+            conn.execute(t.insert(), values)
+    return len(values)
+
+
+def write_chunk(rows, scores, min_score: int):
+    t = RiskScore.__table__
+    ids = [r.id for r in rows]
+    versions = sorted({v for _, _, v in scores})
+    values = [
+        {"user_id": r.user_id, "message_id": r.id, "source": "rescore", "scorer_version": version,
+         "score": score, "reason": reason, "created_at": r.timestamp, "acknowledged": True}
+        for r, (score, reason, version) in zip(rows, scores) if score >= min_score
+    ]
+    with db.engine.begin() as conn:
+        # idempotent per (message, version): re-running a chunk replaces its own rows, never
+        # the live automated ones (which share the scorer version tag)
+        conn.execute(t.delete().where(t.c.source == "rescore", t.c.message_id.in_(ids),
+                                      t.c.scorer_version.in_(versions)))
+        if values:
+            conn.execute(t.insert(), values)
+    return len(values)
+
+
+def run(workers: int, chunk_size: int, use_models: bool, batched: bool, min_score: int,
+        checkpoint: str, resume: bool, limit: int = None, source: str = "db"):
+    if use_models:
+        risk.warm_up(block=True)
+    else:
+        risk.USE_MODELS = False
+        risk.MODEL_SERVER = None
+    version = risk.scorer_version()  # the intended scorer; each row stores the one that scored it
+
+    state = _read_checkpoint(checkpoint) if resume else None
+    if state and state.get("version") != version:
+        raise SystemExit(f"checkpoint is for scorer {state.get('version')}, current is {version}")
+    if state and state.get("source", "db") != source:
+        raise SystemExit(f"checkpoint is for source {state.get('source', 'db')}, not {source}")
+    if state and source == "archive" and state["scored"] and "archive_pos" not in state:
+        raise SystemExit("checkpoint has no archive position (older format); start over without --resume")
+    state = state or {"version": version, "source": source, "last_id": 0, "scored": 0, "written": 0,
+                      "archive_pos": None}
+    if source == "archive":
+        print(f"rescoring archived messages with scorer {version}, "
+              f"starting after {state.get('archive_pos') or 'the beginning'}")
+    else:
+        print(f"rescoring with scorer {version}, starting after message id {state['last_id']}")
+
+    if batched:
+        executor = ThreadPoolExecutor(max_workers=workers)
+    else:
+        executor = ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(use_models,))
+
+    started = time.perf_counter()
+    done_this_run = 0
+    with executor, db.engine.connect() as read_conn:
+        if source == "archive":
+            chunks = archive_chunks(archive.reader, state.get("archive_pos"), chunk_size)
+            read_next = lambda last: next(chunks, [])
+            write = write_archived_chunk
+        else:
+            read_next = lambda last: fetch_chunk(read_conn, last, chunk_size)
+            write = write_chunk
+        rows = read_next(state["last_id"])
+        while rows:
+            if limit is not None and done_this_run >= limit:
+                break
+            if batched:
+                # one text per task so concurrent calls reach the micro-batcher together
+                futures = [executor.submit(_score_texts, [r.text]) for r in rows]
+            else:
+                futures = [executor.submit(_score_texts, part) for part in _split([r.text for r in rows], workers * 4)]
+            # read ahead while the pool scores this chunk
+            next_rows = read_next(rows[-1].id)
+            scores = [s for f in futures for s in f.result()]
+
+            written = write(rows, scores, min_score)
+            other = sum(1 for s in scores if s[2] != version)
+            if other:
+                # e.g. the model server was down: those rows are tagged with the fallback's version
+                print(f"  {other} messages scored by another scorer version than {version}")
+            state["last_id"] = rows[-1].id
+            if source == "archive":
+                state["archive_pos"] = rows[-1].pos
+            state["scored"] += len(rows)
+            state["written"] += written
+            done_this_run += len(rows)
+            if checkpoint:
+                _write_checkpoint(checkpoint, state)
+            elapsed = time.perf_counter() - started
+            print(f"  last_id={state['last_id']} scored={done_this_run} "
+                  f"written={state['written']} rate={done_this_run / elapsed:.0f} rows/s")
+            rows = next_rows
+
+    elapsed = time.perf_counter() - started
+    print(f"done: {done_this_run} messages in {elapsed:.1f}s "
+          f"({done_this_run / elapsed if elapsed else 0:.0f} rows/s), total written {state['written']}")
+    return state
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Re-score historical chat messages into risk_scores.")
+    ap.add_argument("--workers", type=int, default=os.cpu_count() or 2)
+    ap.add_argument("--chunk-size", type=int, default=5000)
+    ap.add_argument("--models", action="store_true", help="use the transformer pipelines (default: heuristics)")
+    ap.add_argument("--batched", action="store_true", help="score in-process through the micro-batcher")
+    ap.add_argument("--min-score", type=int, default=scoring.STORE_THRESHOLD,
+                    help="only store scores >= this (default: same threshold as live scoring)")
+    ap.add_argument("--checkpoint", default="rescore.checkpoint.json")
+    ap.add_argument("--resume", action="store_true")
+    ap.add_argument("--limit", type=int, help="stop after roughly this many messages")
+    ap.add_argument("--source", choices=["db", "archive"], default="db",
+                    help="chat_messages (default) or the archive segments")
+    args = ap.parse_args()
+    if args.batched and not args.models:
+        ap.error("--batched only makes sense with --models")
+    run(args.workers, args.chunk_size, args.models, args.batched, args.min_score,
+        args.checkpoint, args.resume, args.limit, args.source)
+
+
+if __name__ == "__main__":
+    main()
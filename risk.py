@@ -1,80 +1,279 @@
 # backend/risk.py
 from typing import Dict
-from transformers import pipeline
-import re
+import os
+import threading
+import time
+from .batching import MicroBatcher
+from . import lexicon, metrics
+from . import cache as result_cache
 
 # Basic transformer models may be heavy in demo; optionally stub with small rule-based
 # If you have GPU and transformers installed, uncomment pipelines. For hackathon small CPU demo,
 # fallback to rule-based functions.
+#
+# The pipelines are NOT built at import time: they load on first use or via warm_up()
+# at app startup, in a background thread. Until they are ready every request is served
+# by the rule-based heuristics below, so importing this module is instant.
+USE_MODELS = os.environ.get("RISK_USE_MODELS", "1") != "0"
+# torch: transformers pipelines; onnx: int8-quantized ONNX Runtime (see onnx_backend.py)
+BACKEND = os.environ.get("RISK_BACKEND", "torch")
+SENTIMENT_MODEL = os.environ.get("RISK_SENTIMENT_MODEL", "distilbert-base-uncased-finetuned-sst-2-english")
+EMOTION_MODEL = os.environ.get("RISK_EMOTION_MODEL", "j-hartmann/emotion-english-distilroberta-base")
+# Unix socket of a shared model server (model_server.py). When set, this process loads
+# no models: analysis goes to the server, with the heuristics as fallback if it is down.
+MODEL_SERVER = os.environ.get("RISK_MODEL_SERVER")
 
-try:
-    sentiment_pipe = pipeline("sentiment-analysis")
-    emotion_pipe = pipeline("text-classification", model="j-hartmann/emotion-english-distilroberta-base", return_all_scores=True)
-    HAS_PIPELINES = True
-except Exception as e:
-    print("Could not initialize transformers pipelines (will use rule heuristics):", e)
-    sentiment_pipe = None
-    emotion_pipe = None
-    HAS_PIPELINES = False
+# Concurrent /chat requests are coalesced into one forward pass per batch.
+BATCH_MAX_SIZE = int(os.environ.get("RISK_BATCH_MAX_SIZE", "16"))
+BATCH_MAX_WAIT_MS = float(os.environ.get("RISK_BATCH_MAX_WAIT_MS", "5"))
 
-SUICIDAL_PHRASES = [
-    "i want to die", "i'm going to kill myself", "end it all", "i can't go on",
-    "i want to end it", "i wish i was dead", "kill myself"
-]
+sentiment_pipe = None
+emotion_pipe = None
+sentiment_batcher = None
+emotion_batcher = None
+combined_batcher = None  # onnx: one submission yields (sentiment, emotions)
+HAS_PIPELINES = False
 
-ABSOLUTIST_WORDS = {"always", "never", "nobody", "nothing", "everybody", "completely"}
+_load_lock = threading.Lock()
+_load_thread = None
+_load_error = None
+_load_seconds = None
+_remote = None  # ModelClient, created on first use
 
-def _contains_suicidal(text: str) -> bool:
-    t = text.lower()
-    return any(ph in t for ph in SUICIDAL_PHRASES)
+FALLBACKS = metrics.counter("risk_model_fallback_total",
+                            "Messages scored without model outputs (heuristics, or a failed model call).",
+                            ["reason"])
 
-def _absolutist_count(text: str) -> int:
-    words = re.findall(r"\w+", text.lower())
-    return sum(1 for w in words if w in ABSOLUTIST_WORDS)
+def _make_batcher(pipe, name):
+    # pipelines iterate list inputs one by one unless batch_size is given
+    return MicroBatcher(lambda texts: pipe(texts, batch_size=len(texts)),
+                        max_batch_size=BATCH_MAX_SIZE, max_wait_ms=BATCH_MAX_WAIT_MS, name=name)
+
+def _load_pipelines():
+    global sentiment_pipe, emotion_pipe, sentiment_batcher, emotion_batcher, combined_batcher
+    global HAS_PIPELINES, _load_error, _load_seconds
+    t0 = time.perf_counter()
+    try:
+        if BACKEND == "onnx":
+            from .onnx_backend import OnnxRiskModels
+            models = OnnxRiskModels(SENTIMENT_MODEL, EMOTION_MODEL)
+        else:
+            from transformers import pipeline
+            sent = pipeline("sentiment-analysis", model=SENTIMENT_MODEL)
+            emo = pipeline("text-classification", model=EMOTION_MODEL, return_all_scores=True)
+    except Exception as e:
+        print("Could not initialize transformers pipelines (will use rule heuristics):", e)
+        _load_error = str(e)
+        return
+    if BACKEND == "onnx":
+        combined_batcher = MicroBatcher(models, max_batch_size=BATCH_MAX_SIZE,
+                                        max_wait_ms=BATCH_MAX_WAIT_MS, name="onnx-batcher")
+    else:
+        sentiment_pipe, emotion_pipe = sent, emo
+        sentiment_batcher = _make_batcher(sent, "sentiment-batcher")
+        emotion_batcher = _make_batcher(emo, "emotion-batcher")
+    _load_seconds = time.perf_counter() - t0
+    HAS_PIPELINES = True  # flipped last: readers never see half-initialized state
+
+def warm_up(block: bool = False) -> bool:
+    """
+    Start loading the transformer pipelines in a background thread (idempotent).
+    With block=True wait for the load to finish. Returns True when models are ready.
+    """
+    global _load_thread
+    if MODEL_SERVER:
+        return _remote_ready()
+    if not USE_MODELS:
+        return False
+    with _load_lock:
+        if _load_thread is None and not HAS_PIPELINES:
+            _load_thread = threading.Thread(target=_load_pipelines, name="risk-model-loader", daemon=True)
+            _load_thread.start()
+        thread = _load_thread
+    if block and thread is not None:
+        thread.join()
+    return HAS_PIPELINES
+
+metrics.callback("risk_cache_hits_total", "Risk result cache hits.", lambda: cache_stats().get("hits"),
+                 type="counter")
+metrics.callback("risk_cache_misses_total", "Risk result cache misses.", lambda: cache_stats().get("misses"),
+                 type="counter")
+
+def _remote_client():
+    global _remote
+    if _remote is None:
+        from .model_server import ModelClient
+        _remote = ModelClient(MODEL_SERVER)
+    return _remote
+
+def _remote_ready() -> bool:
+    try:
+        info = _remote_client().info()
+    except Exception:
+        return False
+    return info["models"]["status"] == "models ready"
+
+def batcher_stats() -> Dict:
+    batchers = [b for b in (sentiment_batcher, emotion_batcher, combined_batcher) if b is not None]
+    return {b.name: b.stats() for b in batchers}
+
+def model_status() -> Dict:
+    """Readiness info: 'models ready' once pipelines are loaded, else 'heuristic-only'."""
+    if MODEL_SERVER:
+        try:
+            info = _remote_client().info()
+        except Exception as e:
+            return {"status": "heuristic-only", "backend": "model-server", "server": MODEL_SERVER,
+                    "error": repr(e), "client": _remote_client().stats()}
+        return dict(info["models"], server=MODEL_SERVER, client=_remote_client().stats(),
+                    server_stats=info["server"], batchers=info["batchers"])
+    loading = _load_thread is not None and _load_thread.is_alive()
+    return {
+        "status": "models ready" if HAS_PIPELINES else "heuristic-only",
+        "loading": loading,
+        "enabled": USE_MODELS,
+        "backend": BACKEND,
+        "load_seconds": round(_load_seconds, 2) if _load_seconds is not None else None,
+        "error": _load_error,
+    }
+
+# Bump when lexicons or weights change; stored on RiskScore rows so history can be re-scored.
+SCORER_VERSION = "2"
+
+def _local_version(use_models: bool) -> str:
+    # quantized ONNX scores differ slightly from torch, so they are versioned apart
+    if not use_models:
+        return f"{SCORER_VERSION}+heuristic"
+    return f"{SCORER_VERSION}+{'onnx' if BACKEND == 'onnx' else 'models'}"
+
+def scorer_version() -> str:
+    """
+    Version tag of the scorer currently in effect (heuristic and model paths differ).
+    Informational: the path can change between calls (models finish loading, the
+    model server goes down), so stored scores use the version returned with each
+    result by analyze() / compute_risk_score().
+    """
+    if MODEL_SERVER:
+        try:
+            return _remote_client().info()["scorer_version"]
+        except Exception:
+            return _local_version(False)
+    return _local_version(HAS_PIPELINES)
+
+# Repeated short messages ("ok", "thanks", "i'm stressed") skip the transformer calls.
+_cache = result_cache.from_env()
+
+def cache_stats() -> Dict:
+    if MODEL_SERVER:
+        try:
+            return dict(_remote_client().info()["cache"], location="model-server")
+        except Exception as e:
+            return {"backend": "model-server", "error": repr(e)}
+    return _cache.stats() if _cache is not None else {"backend": "off"}
+
+def analyze(text: str):
+    """Returns (analysis, version of the scorer path that produced it)."""
+    # analyze exactly what the cache key covers: texts sharing an entry must analyze alike
+    # (and "i want to  die" must still match the phrase "i want to die"). Case is kept for
+    # the models; only the heuristics, which lowercase anyway, share entries across case.
+    text = result_cache.collapse(text)
+    if MODEL_SERVER:
+        return _analyze_remote(text)
+    use_models = HAS_PIPELINES  # one snapshot: the models may finish loading mid-call
+    if not use_models:
+        warm_up()  # no-op once started; this request is served by heuristics
+    version = _local_version(use_models)
+    if _cache is None:
+        return _analyze(text, use_models)[0], version
+    key = result_cache.make_key(text, version, fold_case=not use_models)
+    hit = _cache.get(key)
+    if hit is not None:
+        return hit, version
+    result, cacheable = _analyze(text, use_models)
+    if cacheable:
+        _cache.set(key, result)
+    return result, version
 
 def analyze_text_simple(text: str) -> Dict:
+    return analyze(text)[0]
+
+def _analyze_remote(text: str):
+    """Analysis by the shared model server (its cache is shared by all workers)."""
+    try:
+        with metrics.stage("risk.model_server"):
+            return _remote_client().analyze(text)
+    except Exception:
+        # server down or overloaded: score with the heuristics, tagged as such
+        FALLBACKS.inc(reason="server_unavailable")
+        return _analyze(text, False)[0], _local_version(False)
+
+def _analyze(text: str, use_models: bool):
+    """Returns (result, cacheable); results degraded by a model error are not cached."""
+    cacheable = True
     txt = text.lower()
-    suicidal = _contains_suicidal(txt)
-    absol = _absolutist_count(txt)
+    # one pass over all lexicons
+    with metrics.stage("risk.lexicon"):
+        hits = lexicon.match(text)
+        suicidal = hits.any("suicidal")
+        absol = hits.count("absolutist", whole_word=True)
+    # model outputs (one batched submission per model, or one for both on onnx)
+    sent = emo = None
+    if not use_models:
+        if not MODEL_SERVER:  # the server-down fallback is counted by the caller
+            FALLBACKS.inc(reason="models_not_loaded")
+    else:
+        t0 = time.perf_counter()
+        if combined_batcher is not None:
+            try:
+                sent, emo = combined_batcher(text[:512])
+            except:
+                cacheable = False
+        else:
+            try:
+                sent = sentiment_batcher(text[:512])
+            except:
+                cacheable = False
+            try:
+                # batched call yields one list of {label, score} per input text
+                emo = emotion_batcher(text[:512])
+            except:
+                cacheable = False
+        metrics.STAGES.observe(time.perf_counter() - t0, stage="risk.models")
+        if not cacheable:
+            FALLBACKS.inc(reason="model_error")
     # naive sentiment
     neg_score = 0.0
-    distress = 0.0
-    if HAS_PIPELINES and sentiment_pipe:
-        try:
-            sent = sentiment_pipe(text[:512])[0]
+    if use_models:
+        if sent is not None:
             # label may be POSITIVE/NEGATIVE
             if sent['label'].lower().startswith('negative'):
                 neg_score = float(sent['score'])
             else:
                 neg_score = 1.0 - float(sent['score'])
-        except:
-            neg_score = 0.0
     else:
         # heuristic
-        neg_words = ["sad", "depressed", "worthless", "hopeless", "anxious", "stressed", "overwhelmed"]
-        neg_score = sum(txt.count(w) for w in neg_words) / max(1, len(txt.split()))
+        neg_score = hits.count("negative") / max(1, len(txt.split()))
         neg_score = min(1.0, neg_score)
     # distress via emotion pipeline if available
     distress = 0.0
-    if HAS_PIPELINES and emotion_pipe:
-        try:
-            res = emotion_pipe(text[:512])
-            for r in res:
+    if use_models:
+        if emo is not None:
+            for r in emo:
                 if r['label'].lower() in ['sadness', 'fear', 'anger']:
                     distress += r['score']
             distress = min(1.0, distress)
-        except:
-            distress = 0.0
     else:
         distress = neg_score * 0.9
 
-    return {"suicidal": suicidal, "neg_score": float(neg_score), "distress": float(distress), "absolutist": int(absol)}
+    result = {"suicidal": suicidal, "neg_score": float(neg_score), "distress": float(distress), "absolutist": int(absol)}
+    return result, cacheable
 
 def compute_risk_score(text: str, user_history_meta: dict = None) -> Dict:
     """
-    Returns: {'score': int(1-10), 'escalate': bool, 'reason': str}
+    Returns: {'score': int(1-10), 'escalate': bool, 'reason': str, 'version': str}
+    where version tags the scorer path that produced this score (store it with the score).
     """
-    meta = analyze_text_simple(text)
+    meta, version = analyze(text)
     base = 0.0
     base += 0.4 * meta['neg_score']
     base += 0.25 * meta['distress']
@@ -91,4 +290,4 @@ def compute_risk_score(text: str, user_history_meta: dict = None) -> Dict:
         reason += "|suicidal_phrase"
     else:
         escalate = score >= 7
-    return {"score": int(score), "escalate": escalate, "reason": reason}
+    return {"score": int(score), "escalate": escalate, "reason": reason, "version": version}
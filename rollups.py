@@ -0,0 +1,257 @@
+# backend/rollups.py
+"""
+Precomputed risk trends for counsellor analytics (models.RiskRollup).
+
+Every automated RiskScore row is folded, in the same write-behind transaction that
+inserts it, into four rollup rows: the student's and the college's hour and day
+buckets. A bucket holds count, sum and max of the scores, escalations, and the EWMA
+of scores as of its last one (carried over from the previous bucket, so the EWMA
+runs across the whole history). A trend view is then one primary-key range scan of
+at most MAX_POINTS rows, however long the history is.
+
+    python -m backend.rollups rebuild                 # recompute from risk_scores
+    python -m backend.rollups show --student 42 --granularity day --start 2026-09-01
+    python -m backend.rollups show --college "IIT Delhi" --granularity hour
+
+Only stored rows are counted, i.e. scores >= scoring.STORE_THRESHOLD, so `count` is
+the number of concerning messages rather than all messages. Buckets start at local
+midnight / on the local hour (userstats.TZ_OFFSET_HOURS) and are stored as UTC.
+Rescore and clinician rows are not rolled up. Live updates assume scores arrive in
+time order; a score landing in an older bucket updates that bucket but not the EWMA
+of later ones. `rebuild` recomputes everything (also needed after changing
+ROLLUP_EWMA_ALPHA or the timezone offset).
+
+On SQLite the rebuild's final swap (delete + reinsert of every bucket) holds the
+database write lock for its whole duration, and the API process only waits
+DB_SQLITE_BUSY_TIMEOUT_MS for it: its write-behind batches, which also carry /chat
+messages, fail if the swap takes longer. `rebuild` reports swap_seconds; run it off-peak
+or with the API stopped when that approaches the busy timeout.
+"""
+import argparse
+import json
+import os
+import time
+from datetime import datetime, timedelta
+from typing import Optional
+
+from sqlalchemy import delete, insert, select, text
+
+from . import db, userstats
+from .models import RiskRollup, RiskScore, User
+
+EWMA_ALPHA = float(os.environ.get("ROLLUP_EWMA_ALPHA", "0.3"))
+MAX_POINTS = int(os.environ.get("ROLLUP_MAX_POINTS", "2000"))
+REBUILD_BATCH = 20000
+ESCALATE_AT = 7  # risk.compute_risk_score escalates at this score (suicidal phrases score >= 9)
+
+GRANULARITIES = {"hour": timedelta(hours=1), "day": timedelta(days=1)}
+DEFAULT_SPAN = {"hour": timedelta(hours=48), "day": timedelta(days=90)}
+
+
+def bucket_start(ts: datetime, granularity: str) -> datetime:
+    """Start (UTC) of the local hour or day containing ts."""
+    offset = timedelta(hours=userstats.TZ_OFFSET_HOURS)
+    local = ts + offset
+    if granularity == "hour":
+        local = local.replace(minute=0, second=0, microsecond=0)
+    else:
+        local = local.replace(hour=0, minute=0, second=0, microsecond=0)
+    return local - offset
+
+
+def is_escalation(score: int, reason: Optional[str]) -> bool:
+    return score >= ESCALATE_AT or "suicidal_phrase" in (reason or "")
+
+
+def _ewma(prev: Optional[float], score: int) -> float:
+    return float(score) if prev is None else (1 - EWMA_ALPHA) * prev + EWMA_ALPHA * score
+
+
+def _targets(user_id: int, college: Optional[str]):
+    yield "student", str(user_id)
+    if college:
+        yield "college", college
+
+
+# --- live updates ---
+
+def apply(session, user_id: int, college: Optional[str], ts: datetime, score: int, escalated: bool):
+    """Fold one stored score into the student's and the college's hour and day buckets."""
+    now = datetime.utcnow()
+    for scope, key in _targets(user_id, college):
+        for granularity in GRANULARITIES:
+            bucket = bucket_start(ts, granularity)
+            row = session.get(RiskRollup, (scope, key, granularity, bucket))
+            if row is None:
+                # ORM query: a previous bucket touched earlier in this batch comes from the
+                # identity map with its unflushed EWMA (the session doesn't autoflush)
+                prev = session.execute(select(RiskRollup).where(
+                    RiskRollup.scope == scope, RiskRollup.key == key, RiskRollup.granularity == granularity,
+                    RiskRollup.bucket < bucket).order_by(RiskRollup.bucket.desc()).limit(1)).scalars().first()
+                row = RiskRollup(scope=scope, key=key, granularity=granularity, bucket=bucket, count=0,
+                                 score_sum=0, score_max=0, ewma=prev.ewma if prev else None, escalations=0)
+                session.add(row)
+                session.flush([row])  # so a later score in the same write-behind batch finds it
+            row.count += 1
+            row.score_sum += score
+            row.score_max = max(row.score_max, score)
+            row.ewma = _ewma(row.ewma, score)
+            row.escalations += 1 if escalated else 0
+            row.updated_at = now
+
+
+# --- queries ---
+
+def resolve_range(granularity: str, start: Optional[datetime], end: Optional[datetime]):
+    """
+    Validated, bucket-aligned [start, end] for a trend query; ValueError if unusable.
+    Naive datetimes are taken as UTC, aware ones are converted.
+    """
+    if granularity not in GRANULARITIES:
+        raise ValueError(f"granularity must be one of {', '.join(GRANULARITIES)}")
+    start, end = db.naive_utc(start), db.naive_utc(end)
+    end = end or datetime.utcnow()
+    start = bucket_start(start or end - DEFAULT_SPAN[granularity], granularity)
+    if start > end:
+        raise ValueError("start is after end")
+    if (end - start) / GRANULARITIES[granularity] > MAX_POINTS:
+        raise ValueError(f"range too long: at most {MAX_POINTS} {granularity} buckets")
+    return start, end
+
+
+def series_query(scope: str, key: str, granularity: str, start: datetime, end: datetime):
+    """Buckets in [start, end], oldest first; a range scan of the primary key."""
+    t = RiskRollup.__table__
+    return select(t).where(t.c.scope == scope, t.c.key == key, t.c.granularity == granularity,
+                           t.c.bucket >= start, t.c.bucket <= end).order_by(t.c.bucket)
+
+
+def prior_query(scope: str, key: str, granularity: str, before: datetime):
+    """EWMA as of the last bucket before `before` (the trend's baseline)."""
+    t = RiskRollup.__table__
+    return select(t.c.ewma).where(t.c.scope == scope, t.c.key == key, t.c.granularity == granularity,
+                                  t.c.bucket < before).order_by(t.c.bucket.desc()).limit(1)
+
+
+def report(rows, prior_ewma: Optional[float], scope: str, key: str, granularity: str,
+           start: datetime, end: datetime) -> dict:
+    """Trend response: the buckets plus a summary over the range."""
+    points = [{
+        "bucket": r.bucket.isoformat(),
+        "count": r.count,
+        "mean": round(r.score_sum / r.count, 3) if r.count else None,
+        "max": r.score_max,
+        "ewma": round(r.ewma, 3) if r.ewma is not None else None,
+        "escalations": r.escalations,
+    } for r in rows]
+    count = sum(r.count for r in rows)
+    ewma_end = rows[-1].ewma if rows else prior_ewma
+    summary = {
+        "count": count,
+        "mean": round(sum(r.score_sum for r in rows) / count, 3) if count else None,
+        "max": max((r.score_max for r in rows), default=None),
+        "escalations": sum(r.escalations for r in rows),
+        "ewma_start": round(prior_ewma, 3) if prior_ewma is not None else None,
+        "ewma_end": round(ewma_end, 3) if ewma_end is not None else None,
+        # > 0: scores trending up (worse) over the range
+        "ewma_change": round(ewma_end - prior_ewma, 3) if rows and prior_ewma is not None else None,
+    }
+    return {"scope": scope, "key": key, "granularity": granularity,
+            "start": start.isoformat(), "end": end.isoformat(), "points": points, "summary": summary}
+
+
+# --- rebuild ---
+
+def _scores_query(after_id: Optional[int] = None):
+    rs, u = RiskScore.__table__, User.__table__
+    q = select(rs.c.id, rs.c.user_id, rs.c.score, rs.c.reason, rs.c.created_at, u.c.college) \
+        .select_from(rs.outerjoin(u, u.c.id == rs.c.user_id)) \
+        .where(rs.c.source == "automated")
+    if after_id is not None:
+        q = q.where(rs.c.id > after_id)
+    return q.order_by(rs.c.created_at, rs.c.id)
+
+
+def rebuild() -> dict:
+    """
+    Recompute all rollups from the automated risk_scores rows, in time order. The
+    history is aggregated outside any write transaction; then, holding the write
+    lock, rows that landed meanwhile are folded in and the table is replaced, so no
+    concurrent live update is lost. On SQLite that swap blocks every other writer
+    (see the module docstring).
+    """
+    t0 = time.time()
+    buckets = {}  # (scope, key, granularity, bucket) -> [count, sum, max, ewma, escalations]
+    last_ewma = {}  # (scope, key, granularity) -> EWMA after the latest score
+    max_id = 0
+    n = 0
+
+    def fold(r):
+        nonlocal max_id, n
+        escalated = is_escalation(r.score, r.reason)
+        for scope, key in _targets(r.user_id, r.college):
+            for granularity in GRANULARITIES:
+                series = (scope, key, granularity)
+                k = series + (bucket_start(r.created_at, granularity),)
+                b = buckets.get(k)
+                if b is None:
+                    b = buckets[k] = [0, 0, 0, last_ewma.get(series), 0]
+                b[0] += 1
+                b[1] += r.score
+                b[2] = max(b[2], r.score)
+                b[3] = last_ewma[series] = _ewma(b[3], r.score)
+                b[4] += 1 if escalated else 0
+        max_id = max(max_id, r.id)
+        n += 1
+
+    with db.engine.connect() as conn:
+        for r in conn.execution_options(yield_per=REBUILD_BATCH).execute(_scores_query()):
+            fold(r)
+
+    now = datetime.utcnow()
+    t_swap = time.time()
+    with db.sync_writer(), db.engine.begin() as conn:
+        if not db.IS_SQLITE:
+            # blocks live apply() until the new table is committed
+            conn.execute(text("LOCK TABLE risk_rollups IN EXCLUSIVE MODE"))
+        conn.execute(delete(RiskRollup))  # on SQLite this takes the write lock
+        for r in conn.execute(_scores_query(max_id)).all():
+            fold(r)
+        rows = [{"scope": k[0], "key": k[1], "granularity": k[2], "bucket": k[3], "count": v[0],
+                 "score_sum": v[1], "score_max": v[2], "ewma": v[3], "escalations": v[4], "updated_at": now}
+                for k, v in buckets.items()]
+        for i in range(0, len(rows), REBUILD_BATCH):
+            conn.execute(insert(RiskRollup), rows[i:i + REBUILD_BATCH])
+    return {"scores": n, "buckets": len(rows), "seconds": round(time.time() - t0, 2),
+            "swap_seconds": round(time.time() - t_swap, 2)}
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Risk trend rollups per student and per college.")
+    sub = ap.add_subparsers(dest="cmd", required=True)
+    sub.add_parser("rebuild", help="recompute all rollups from risk_scores")
+    show = sub.add_parser("show", help="print a trend as JSON")
+    who = show.add_mutually_exclusive_group(required=True)
+    who.add_argument("--student", type=int)
+    who.add_argument("--college")
+    show.add_argument("--granularity", default="day", choices=list(GRANULARITIES))
+    show.add_argument("--start", type=datetime.fromisoformat)
+    show.add_argument("--end", type=datetime.fromisoformat)
+    args = ap.parse_args()
+
+    if args.cmd == "rebuild":
+        print(json.dumps(rebuild()))
+        return
+    scope, key = ("student", str(args.student)) if args.student is not None else ("college", args.college)
+    try:
+        start, end = resolve_range(args.granularity, args.start, args.end)
+    except ValueError as e:
+        ap.error(str(e))
+    with db.engine.connect() as conn:
+        rows = conn.execute(series_query(scope, key, args.granularity, start, end)).all()
+        prior = conn.execute(prior_query(scope, key, args.granularity, start)).scalar()
+    print(json.dumps(report(rows, prior, scope, key, args.granularity, start, end), indent=2))
+
+
+if __name__ == "__main__":
+    main()
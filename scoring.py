@@ -0,0 +1,231 @@
+# backend/scoring.py
+"""
+Durable background risk scoring.
+
+/chat only writes a ScoringJob row in the same transaction as the student's message and
+returns. A pool of worker threads claims pending jobs, runs risk.compute_risk_score,
+writes the RiskScore row (folding it into the trend rollups, see rollups.py) and notifies
+the counsellor. Jobs live in the database, so they survive a restart: jobs left 'running'
+past their lease (crashed process) go back to 'pending' and are picked up again.
+"""
+import logging
+import os
+import threading
+import time
+from datetime import datetime, timedelta
+from typing import Optional
+
+from sqlalchemy import func
+
+from . import db, events, metrics, notify, risk, rollups, userstats, writebehind
+from .models import ChatMessage, RiskScore, ScoringJob, User, UserStats
+
+logger = logging.getLogger("scoring")
+
+WORKERS = int(os.environ.get("SCORING_WORKERS", "2"))
+POLL_SECONDS = float(os.environ.get("SCORING_POLL_SECONDS", "1.0"))
+LEASE_SECONDS = int(os.environ.get("SCORING_LEASE_SECONDS", "300"))
+MAX_ATTEMPTS = int(os.environ.get("SCORING_MAX_ATTEMPTS", "3"))
+STORE_THRESHOLD = 4  # only scores >= this are kept as RiskScore rows
+
+ESCALATIONS = metrics.counter("escalations_total", "Risk scores that escalated to a counsellor.")
+
+
+def make_job(user_id: int, message: ChatMessage) -> ScoringJob:
+    """Scoring job for `message`; persist it in the same transaction as the message."""
+    return ScoringJob(user_id=user_id, message=message)
+
+
+def enqueue(db_session, user_id: int, message: ChatMessage) -> ScoringJob:
+    """Add a scoring job for `message`; committed together with the caller's transaction."""
+    job = make_job(user_id, message)
+    db_session.add(job)
+    return job
+
+
+def score_message(db_session, job: ScoringJob):
+    """Score one job's message. Returns (score_obj, user, RiskScore row or None)."""
+    msg = job.message
+    user = db_session.query(User).filter(User.id == job.user_id).first()
+    # behavioral meta from the student's rolling stats row (no history scan)
+    history_meta = userstats.history_meta(db_session.get(UserStats, job.user_id), msg.timestamp)
+
+    with metrics.stage("risk.compute_risk_score"):
+        score_obj = risk.compute_risk_score(msg.text, user_history_meta=history_meta)
+    rs = None
+    if score_obj["score"] >= STORE_THRESHOLD:
+        rs = RiskScore(user_id=job.user_id, message_id=msg.id, scorer_version=score_obj["version"],
+                       score=score_obj["score"], reason=score_obj.get("reason"))
+    return score_obj, user, rs
+
+
+class ScoringPool:
+    def __init__(self, workers: int = WORKERS, session_factory=None):
+        self.workers = workers
+        self.session_factory = session_factory or db.SessionLocal
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._threads = []
+        self._lock = threading.Lock()
+        self._processed = 0
+        self._failed = 0
+        self._last_lag = None       # seconds from enqueue to finished, last job
+        self._avg_lag = None        # EWMA of the same
+
+    def start(self):
+        if self._threads:
+            return
+        self._stop.clear()
+        self.requeue_stale()
+        for i in range(self.workers):
+            t = threading.Thread(target=self._run, name=f"scoring-worker-{i}", daemon=True)
+            t.start()
+            self._threads.append(t)
+
+    def stop(self, timeout: float = 10.0):
+        self._stop.set()
+        self._wake.set()
+        for t in self._threads:
+            t.join(timeout)
+        self._threads = []
+
+    def wake(self):
+        """Called after enqueue so idle workers don't wait for the next poll."""
+        self._wake.set()
+
+    def requeue_stale(self) -> int:
+        cutoff = datetime.utcnow() - timedelta(seconds=LEASE_SECONDS)
+        s = self.session_factory()
+        try:
+            with db.sync_writer():
+                n = s.query(ScoringJob).filter(ScoringJob.status == "running", ScoringJob.started_at < cutoff) \
+                    .update({"status": "pending"}, synchronize_session=False)
+                s.commit()
+        finally:
+            s.close()
+        if n:
+            logger.warning("requeued %d stale scoring jobs", n)
+        return n
+
+    def _claim(self, s) -> Optional[int]:
+        while True:
+            job_id = s.query(ScoringJob.id).filter(ScoringJob.status == "pending") \
+                .order_by(ScoringJob.id).limit(1).scalar()
+            if job_id is None:
+                return None
+            # conditional update: only one worker (in any process) wins the job; the
+            # UPDATE takes SQLite's write lock, so hold the writer lock from here
+            with db.sync_writer():
+                won = s.query(ScoringJob).filter(ScoringJob.id == job_id, ScoringJob.status == "pending") \
+                    .update({"status": "running", "started_at": datetime.utcnow(),
+                             "attempts": ScoringJob.attempts + 1}, synchronize_session=False)
+                s.commit()
+            if won:
+                return job_id
+
+    def _run(self):
+        last_requeue = time.monotonic()
+        while not self._stop.is_set():
+            s = self.session_factory()
+            try:
+                job_id = self._claim(s)
+                if job_id is not None:
+                    self._process(s, job_id)
+            except Exception:
+                logger.exception("scoring worker error")
+                job_id = None
+            finally:
+                s.close()
+            if time.monotonic() - last_requeue > LEASE_SECONDS:
+                self.requeue_stale()
+                last_requeue = time.monotonic()
+            if job_id is None:
+                self._wake.wait(POLL_SECONDS)
+                self._wake.clear()
+
+    def _process(self, s, job_id: int):
+        job = s.query(ScoringJob).filter(ScoringJob.id == job_id).first()
+        try:
+            score_obj, user, rs = score_message(s, job)
+            created_at = job.created_at
+            msg_ts = job.message.timestamp
+            user_id = job.user_id
+            user_profile = {"email": user.email, "full_name": user.full_name,
+                            "college": user.college, "enrollment": user.enrollment} if user is not None else {}
+            # escalate to counsellor if required; before the write so a crash re-notifies
+            # rather than silently dropping an escalation
+            if score_obj["escalate"] and user is not None:
+                ESCALATIONS.inc()
+                with metrics.stage("notify.enqueue"):
+                    notify.notify_counsellor(score_obj, user_profile)
+            s.rollback()  # end the read transaction; writes go through the write-behind buffer
+            finished_at = datetime.utcnow()
+
+            def complete(session):
+                stored = None
+                if rs is not None:
+                    session.add(rs)
+                    session.flush([rs])
+                    stored = rs.id
+                    rollups.apply(session, user_id, user_profile.get("college"), rs.created_at,
+                                  rs.score, bool(score_obj["escalate"]))
+                    # live counsellor dashboards: same fields as a /counsellor/pending item
+                    events.record(session, "case", {
+                        "risk_id": rs.id, "score": rs.score, "reason": rs.reason,
+                        "created_at": rs.created_at.isoformat(), "escalated": bool(score_obj["escalate"]),
+                        "student_email": user_profile.get("email"), "student_name": user_profile.get("full_name"),
+                        "college": user_profile.get("college"), "enrollment": user_profile.get("enrollment"),
+                    }, college=user_profile.get("college"))
+                    events.bus.prune(session)
+                userstats.apply_message(session, user_id, msg_ts, score_obj["score"])
+                session.query(ScoringJob).filter(ScoringJob.id == job_id).update(
+                    {"status": "done", "finished_at": finished_at, "error": None}, synchronize_session=False)
+                return stored
+
+            # RiskScore insert + job completion are group-committed with concurrent /chat writes
+            with metrics.stage("scoring.db_write"):
+                [stored] = writebehind.buffer.submit(complete).result()
+            if stored is not None:
+                events.bus.notify()
+        except Exception as e:
+            s.rollback()
+            job = s.query(ScoringJob).filter(ScoringJob.id == job_id).first()
+            job.status = "failed" if job.attempts >= MAX_ATTEMPTS else "pending"
+            job.error = str(e)[:500]
+            with db.sync_writer():
+                s.commit()
+            with self._lock:
+                self._failed += 1
+            logger.exception("scoring job %s failed (attempt %s)", job_id, job.attempts)
+            return
+        lag = (finished_at - created_at).total_seconds()
+        metrics.STAGES.observe(lag, stage="scoring.lag")
+        with self._lock:
+            self._processed += 1
+            self._last_lag = lag
+            self._avg_lag = lag if self._avg_lag is None else 0.9 * self._avg_lag + 0.1 * lag
+
+    def stats(self) -> dict:
+        """Queue depth and scoring lag, for /health."""
+        s = self.session_factory()
+        try:
+            counts = dict(s.query(ScoringJob.status, func.count(ScoringJob.id))
+                          .filter(ScoringJob.status != "done").group_by(ScoringJob.status).all())
+            oldest = s.query(func.min(ScoringJob.created_at)).filter(ScoringJob.status == "pending").scalar()
+        finally:
+            s.close()
+        with self._lock:
+            return {
+                "workers": len(self._threads),
+                "pending": counts.get("pending", 0),
+                "running": counts.get("running", 0),
+                "failed": counts.get("failed", 0),
+                "oldest_pending_age_s": round((datetime.utcnow() - oldest).total_seconds(), 3) if oldest else 0.0,
+                "processed": self._processed,
+                "errors": self._failed,
+                "last_lag_s": round(self._last_lag, 3) if self._last_lag is not None else None,
+                "avg_lag_s": round(self._avg_lag, 3) if self._avg_lag is not None else None,
+            }
+
+
+pool = ScoringPool()
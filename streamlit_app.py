@@ -1,7 +1,9 @@
 # frontend/streamlit_app.py
 import streamlit as st
 import requests
+import json
 import os
+from urllib.parse import quote
 
 BACKEND = os.environ.get("BACKEND_URL", "http://localhost:8000")
 
@@ -35,6 +37,84 @@ def api_get(path):
     except:
         return {"error": resp.text}
 
+def auth_headers():
+    return {"Authorization": f"Bearer {st.session_state.token}"} if st.session_state.token else {}
+
+def api_events(cursor):
+    """Dashboard events buffered after `cursor`: one short, non-following read of the SSE feed."""
+    resp = requests.get(BACKEND+"/counsellor/events", params={"last_event_id": cursor or "", "follow": "false"},
+                        headers=auth_headers(), stream=True, timeout=10)
+    resp.raise_for_status()
+    out, eid, event, data = [], None, None, {}
+    for line in resp.iter_lines(decode_unicode=True):
+        if line.startswith("id:"):
+            eid = line[3:].strip()
+        elif line.startswith("event:"):
+            event = line[6:].strip()
+        elif line.startswith("data:"):
+            data = json.loads(line[5:])
+        elif line == "" and event:
+            out.append((eid, event, data))
+            event, data = None, {}
+    return out
+
+# --- counsellor dashboard state: a snapshot of /counsellor/pending kept current by events ---
+def load_cases():
+    q = api_get("/counsellor/pending")
+    if isinstance(q, dict) and (q.get("error") or q.get("detail")):
+        st.session_state.cases_error = q
+        st.session_state.cases, st.session_state.events_cursor = {}, None
+        return
+    st.session_state.cases_error = None
+    st.session_state.cases = {item["risk_id"]: item for item in q["items"]}
+    st.session_state.pending_cursor = q.get("next_cursor")
+    st.session_state.events_cursor = q.get("last_event_id")
+
+def load_older_cases():
+    q = api_get(f"/counsellor/pending?cursor={quote(st.session_state.pending_cursor)}")
+    for item in q.get("items", []):
+        st.session_state.cases.setdefault(item["risk_id"], item)
+    st.session_state.pending_cursor = q.get("next_cursor")
+
+def apply_case_events():
+    """Apply new/acknowledged cases since the last poll instead of refetching the list."""
+    for eid, event, data in api_events(st.session_state.events_cursor):
+        if event == "reset":
+            load_cases()  # cursor too old (or server restarted): start from a fresh snapshot
+            return
+        if event == "case":
+            st.session_state.cases[data["risk_id"]] = data
+        elif event == "ack":
+            st.session_state.cases.pop(data["risk_id"], None)
+        st.session_state.events_cursor = eid
+
+def ack_case(risk_id):
+    api_post(f"/counsellor/ack/{risk_id}")
+    st.session_state.cases.pop(risk_id, None)
+
+# re-run only the case list every few seconds where this Streamlit supports fragments
+_fragment = getattr(st, "fragment", None) or getattr(st, "experimental_fragment", None)
+
+def _live(fn):
+    return _fragment(run_every=5)(fn) if _fragment else fn
+
+@_live
+def case_list():
+    try:
+        apply_case_events()
+    except requests.RequestException as e:
+        st.warning("Live updates unavailable: " + str(e))
+    if st.session_state.cases_error:
+        st.write(st.session_state.cases_error)
+        return
+    cases = sorted(st.session_state.cases.values(), key=lambda c: (c["created_at"], c["risk_id"]), reverse=True)
+    if not cases:
+        st.write("No pending cases.")
+    for item in cases:
+        st.write(item)
+        st.button(f"Acknowledge {item['risk_id']}", key=f"ack-{item['risk_id']}",
+                  on_click=ack_case, args=(item["risk_id"],))
+
 menu = ["Student Sign-up / Login", "Student Chat", "Counsellor Login / Dashboard"]
 choice = st.sidebar.selectbox("Menu", menu)
 
@@ -115,12 +195,10 @@ elif choice == "Counsellor Login / Dashboard":
     st.markdown("---")
     if st.session_state.role == "counsellor":
         st.subheader("Pending risky cases")
-        q = api_get("/counsellor/pending")
-        if isinstance(q, dict) and q.get("error"):
-            st.write(q)
-        else:
-            for item in q:
-                st.write(item)
-                if st.button(f"Acknowledge {item['risk_id']}"):
-                    api_post(f"/counsellor/ack/{item['risk_id']}")
-                    st.experimental_rerun()
+        if "cases" not in st.session_state:
+            load_cases()
+        cols = st.columns(2)
+        cols[0].button("Refresh", on_click=load_cases)
+        if st.session_state.get("pending_cursor"):
+            cols[1].button("Load older cases", on_click=load_older_cases)
+        case_list()
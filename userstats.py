@@ -0,0 +1,94 @@
+# backend/userstats.py
+"""
+Incremental per-student behavioral statistics (models.UserStats).
+
+Each scored message updates the student's row in O(1): message count, short- and
+long-horizon message rates (exponentially decayed, in messages/day), late-night
+ratio, gap since the previous message and a moving average of risk scores.
+history_meta() turns the row into the user_history_meta dict that
+risk.compute_risk_score reads, so scoring never scans chat history.
+"""
+import math
+import os
+from datetime import datetime
+from typing import Optional
+
+from .models import UserStats
+
+RATE_SHORT_TAU_DAYS = float(os.environ.get("STATS_RATE_SHORT_TAU_DAYS", "1"))
+RATE_LONG_TAU_DAYS = float(os.environ.get("STATS_RATE_LONG_TAU_DAYS", "14"))
+LATE_NIGHT_ALPHA = 0.1
+RISK_ALPHA = 0.2
+# timestamps are stored in UTC; shift to the students' local time for the late-night check
+TZ_OFFSET_HOURS = float(os.environ.get("STATS_TZ_OFFSET_HOURS", "5.5"))
+LATE_NIGHT_HOURS = (0, 5)  # [start, end) local hour
+MIN_MESSAGES = 5  # below this the signals are too noisy to use
+
+
+def is_late_night(ts: datetime) -> bool:
+    hour = (ts.hour + ts.minute / 60.0 + TZ_OFFSET_HOURS) % 24
+    return LATE_NIGHT_HOURS[0] <= hour < LATE_NIGHT_HOURS[1]
+
+
+def _decay(rate: float, since: Optional[datetime], now: datetime, tau_days: float) -> float:
+    if since is None:
+        return 0.0
+    dt_days = max(0.0, (now - since).total_seconds() / 86400.0)
+    return rate * math.exp(-dt_days / tau_days)
+
+
+def history_meta(stats: Optional[UserStats], now: datetime = None) -> dict:
+    """user_history_meta for compute_risk_score, from the student's stats row (or None)."""
+    now = now or datetime.utcnow()
+    if stats is None or not stats.total_messages:
+        return {"behavioral_change": 0.0, "total_messages": 0}
+    short = _decay(stats.rate_short or 0.0, stats.last_message_at, now, RATE_SHORT_TAU_DAYS)
+    long_ = _decay(stats.rate_long or 0.0, stats.last_message_at, now, RATE_LONG_TAU_DAYS)
+    gap_hours = max(0.0, (now - stats.last_message_at).total_seconds() / 3600.0) if stats.last_message_at else None
+    late = stats.late_night_ratio or 0.0
+
+    behavioral = 0.0
+    if stats.total_messages >= MIN_MESSAGES:
+        # sudden change in how often the student writes, relative to their own baseline
+        rate_shift = min(1.0, abs(short - long_) / max(long_, 1.0))
+        # returning after a long silence
+        silence = min(1.0, (gap_hours or 0.0) / (24 * 7))
+        behavioral = min(1.0, 0.5 * late + 0.3 * rate_shift + 0.2 * silence)
+    if stats.total_messages >= 10:
+        behavioral = max(behavioral, 0.1)  # previous count-based heuristic as a floor
+    return {
+        "behavioral_change": round(behavioral, 4),
+        "total_messages": stats.total_messages,
+        "messages_per_day": round(short, 3),
+        "messages_per_day_baseline": round(long_, 3),
+        "late_night_ratio": round(late, 4),
+        "gap_hours": round(gap_hours, 2) if gap_hours is not None else None,
+        "avg_risk": round(stats.avg_risk, 2) if stats.avg_risk is not None else None,
+    }
+
+
+def apply_message(session, user_id: int, ts: datetime, score: Optional[int]) -> UserStats:
+    """Fold one scored message into the student's stats row (creating it if needed)."""
+    stats = session.get(UserStats, user_id)
+    if stats is None:
+        stats = UserStats(user_id=user_id, total_messages=0, rate_short=0.0, rate_long=0.0,
+                          late_night_ratio=0.0)
+        session.add(stats)
+        session.flush([stats])  # so a later message in the same write-behind batch finds it
+    prev = stats.last_message_at
+    if prev is not None and ts < prev:
+        ts = prev  # out-of-order scoring: treat as simultaneous
+    stats.rate_short = _decay(stats.rate_short or 0.0, prev, ts, RATE_SHORT_TAU_DAYS) + 1.0 / RATE_SHORT_TAU_DAYS
+    stats.rate_long = _decay(stats.rate_long or 0.0, prev, ts, RATE_LONG_TAU_DAYS) + 1.0 / RATE_LONG_TAU_DAYS
+    late = 1.0 if is_late_night(ts) else 0.0
+    if stats.total_messages:
+        stats.late_night_ratio = (1 - LATE_NIGHT_ALPHA) * (stats.late_night_ratio or 0.0) + LATE_NIGHT_ALPHA * late
+    else:
+        stats.late_night_ratio = late
+    if score is not None:
+        stats.avg_risk = float(score) if stats.avg_risk is None else (1 - RISK_ALPHA) * stats.avg_risk + RISK_ALPHA * score
+    stats.last_gap_hours = (ts - prev).total_seconds() / 3600.0 if prev is not None else None
+    stats.last_message_at = ts
+    stats.total_messages = (stats.total_messages or 0) + 1
+    stats.updated_at = datetime.utcnow()
+    return stats
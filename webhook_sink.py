@@ -0,0 +1,81 @@
+# backend/webhook_sink.py
+"""
+Local stand-in for a counsellor webhook, for testing the notify dispatcher offline.
+
+    python -m backend.webhook_sink --port 9200
+    NOTIFY_WEBHOOK_URL=http://127.0.0.1:9200/hook uvicorn backend.main:app
+
+GET /received lists what arrived. Failures and latency can be injected while it runs:
+
+    curl -X POST localhost:9200/_config -H 'content-type: application/json' -d '{"fail_rate": 1}'
+
+Standalone (no package imports).
+"""
+import argparse
+import asyncio
+import random
+import time
+
+from fastapi import FastAPI
+from fastapi.responses import JSONResponse
+
+CONFIG = {
+    "fail_rate": 0.0,    # fraction of deliveries answered with HTTP 503
+    "latency_ms": 0.0,   # delay before answering
+}
+RECEIVED = []  # (received_at, notification)
+STATS = {"requests": 0, "failed": 0, "notifications": 0}
+
+app = FastAPI(title="Webhook sink")
+
+
+@app.post("/hook")
+async def hook(body: dict):
+    STATS["requests"] += 1
+    if CONFIG["latency_ms"]:
+        await asyncio.sleep(CONFIG["latency_ms"] / 1000.0)
+    if random.random() < CONFIG["fail_rate"]:
+        STATS["failed"] += 1
+        return JSONResponse({"ok": False}, status_code=503)
+    batch = body.get("notifications", [])
+    now = time.time()
+    RECEIVED.extend((now, n) for n in batch)
+    STATS["notifications"] += len(batch)
+    return {"ok": True, "accepted": len(batch)}
+
+
+@app.get("/received")
+async def received(limit: int = 100):
+    return {"stats": STATS, "notifications": [dict(n, received_at=t) for t, n in RECEIVED[-limit:]]}
+
+
+@app.post("/_config")
+async def set_config(update: dict):
+    for k, v in update.items():
+        if k in CONFIG:
+            CONFIG[k] = float(v)
+    return CONFIG
+
+
+@app.post("/_reset")
+async def reset():
+    RECEIVED.clear()
+    for k in STATS:
+        STATS[k] = 0
+    return {"ok": True}
+
+
+def main():
+    import uvicorn
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--host", default="127.0.0.1")
+    ap.add_argument("--port", type=int, default=9200)
+    ap.add_argument("--fail-rate", type=float, default=0.0)
+    ap.add_argument("--latency-ms", type=float, default=0.0)
+    args = ap.parse_args()
+    CONFIG.update(fail_rate=args.fail_rate, latency_ms=args.latency_ms)
+    uvicorn.run(app, host=args.host, port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
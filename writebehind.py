@@ -0,0 +1,196 @@
+# backend/writebehind.py
+"""
+Group-commit write-behind buffer.
+
+Every commit on SQLite is an fsync, which is what caps /chat throughput. Callers
+submit ORM objects (or callables taking the session) and a flusher thread writes
+everything that arrived within one window in a single transaction.
+
+Durability (WRITE_BEHIND_DURABILITY):
+  flush   - submit_async() returns after the batch holding the write has committed
+  enqueue - submit_async() returns once the write is queued; a crash can lose up to
+            one window of writes
+A batch is flushed WRITE_BEHIND_WINDOW_MS after its first write arrived, or earlier
+once WRITE_BEHIND_MAX_BATCH writes are queued. stop() flushes whatever is left.
+"""
+import asyncio
+import collections
+import logging
+import os
+import threading
+import time
+from concurrent.futures import Future
+
+from . import db
+
+logger = logging.getLogger("writebehind")
+
+WINDOW_MS = float(os.environ.get("WRITE_BEHIND_WINDOW_MS", "10"))
+MAX_BATCH = int(os.environ.get("WRITE_BEHIND_MAX_BATCH", "500"))
+DURABILITY = os.environ.get("WRITE_BEHIND_DURABILITY", "flush")  # flush | enqueue
+
+
+class WriteBehindBuffer:
+    def __init__(self, session_factory=None, window_ms: float = WINDOW_MS, max_batch: int = MAX_BATCH,
+                 durability: str = DURABILITY):
+        if durability not in ("flush", "enqueue"):
+            raise ValueError(f"unknown durability mode {durability!r}")
+        self.session_factory = session_factory or db.SessionLocal
+        self.window = window_ms / 1000.0
+        self.max_batch = max_batch
+        self.durability = durability
+        self._queue = collections.deque()  # (ops, future, enqueued_at)
+        self._cond = threading.Condition()
+        self._thread = None
+        self._stopping = False
+        # counters
+        self._batches = 0
+        self._writes = 0
+        self._failed = 0
+        self._max_batch_seen = 0
+        self._flush_total = 0.0
+        self._flush_max = 0.0
+        self._wait_max = 0.0
+
+    def start(self):
+        with self._cond:
+            if self._thread is not None:
+                return
+            self._stopping = False
+            self._thread = threading.Thread(target=self._run, name="write-behind", daemon=True)
+            self._thread.start()
+
+    def stop(self, timeout: float = 10.0):
+        """Flush everything queued, then stop the flusher."""
+        with self._cond:
+            self._stopping = True
+            self._cond.notify_all()
+            thread = self._thread
+        if thread is not None:
+            thread.join(timeout)
+        with self._cond:
+            self._thread = None
+        self._drain()  # anything submitted after the thread exited
+
+    def submit(self, *ops) -> Future:
+        """
+        Queue ORM objects to add and/or callables `fn(session)`, all written in the
+        same transaction. The future resolves after commit with the callables' results.
+        """
+        fut = Future()
+        with self._cond:
+            if self._thread is None:
+                # not started (CLI, tests) or already stopped: write synchronously
+                direct = True
+            else:
+                direct = False
+                self._queue.append((ops, fut, time.monotonic()))
+                self._cond.notify()
+        if direct:
+            self._flush([(ops, fut, time.monotonic())])
+        return fut
+
+    async def submit_async(self, *ops, durability: str = None, on_done=None):
+        """submit() for async handlers; `on_done(future)` runs once the batch is written."""
+        fut = self.submit(*ops)
+        if on_done is not None:
+            fut.add_done_callback(on_done)
+        if (durability or self.durability) == "flush":
+            return await asyncio.wrap_future(fut)
+        return None
+
+    def _next_batch(self):
+        with self._cond:
+            while not self._queue and not self._stopping:
+                self._cond.wait()
+            if not self._queue:
+                return None
+            deadline = self._queue[0][2] + self.window
+            while len(self._queue) < self.max_batch and not self._stopping:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                self._cond.wait(remaining)
+            n = min(len(self._queue), self.max_batch)
+            return [self._queue.popleft() for _ in range(n)]
+
+    def _run(self):
+        while True:
+            batch = self._next_batch()
+            if batch is None:
+                return
+            self._flush(batch)
+
+    def _drain(self):
+        while True:
+            with self._cond:
+                batch = [self._queue.popleft() for _ in range(min(len(self._queue), self.max_batch))]
+            if not batch:
+                return
+            self._flush(batch)
+
+    @staticmethod
+    def _apply(session, ops):
+        results = []
+        for op in ops:
+            if callable(op):
+                results.append(op(session))
+            else:
+                session.add(op)
+        return results
+
+    def _commit(self, entries):
+        s = self.session_factory()
+        try:
+            # ops flush (write) as they go, so the writer lock covers them too
+            with db.sync_writer():
+                results = [self._apply(s, ops) for ops, _, _ in entries]
+                s.commit()
+            return results
+        except Exception:
+            s.rollback()
+            raise
+        finally:
+            s.close()
+
+    def _flush(self, batch):
+        t0 = time.monotonic()
+        try:
+            results = self._commit(batch)
+            for (_, fut, _), res in zip(batch, results):
+                fut.set_result(res)
+        except Exception as e:
+            if len(batch) == 1:
+                logger.exception("write-behind flush failed")
+                batch[0][1].set_exception(e)
+                with self._cond:
+                    self._failed += 1
+            else:
+                # one bad write must not fail its neighbours: retry one by one
+                for entry in batch:
+                    self._flush([entry])
+                return
+        elapsed = time.monotonic() - t0
+        with self._cond:
+            self._batches += 1
+            self._writes += len(batch)
+            self._max_batch_seen = max(self._max_batch_seen, len(batch))
+            self._flush_total += elapsed
+            self._flush_max = max(self._flush_max, elapsed)
+            self._wait_max = max(self._wait_max, t0 - batch[0][2])
+
+    def stats(self) -> dict:
+        with self._cond:
+            b = self._batches
+            return {
+                "durability": self.durability, "window_ms": self.window * 1000, "queued": len(self._queue),
+                "batches": b, "writes": self._writes, "failed": self._failed,
+                "avg_batch_size": round(self._writes / b, 2) if b else 0.0,
+                "max_batch_size": self._max_batch_seen,
+                "avg_flush_ms": round(self._flush_total / b * 1000, 2) if b else 0.0,
+                "max_flush_ms": round(self._flush_max * 1000, 2),
+                "max_queue_wait_ms": round(self._wait_max * 1000, 2),
+            }
+
+
+buffer = WriteBehindBuffer()